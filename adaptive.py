@@ -0,0 +1,150 @@
+import math
+import random
+from typing import List, Dict, Any, Optional, Set
+from config import test_config
+from levels import level_scale
+from questions import Question, QuestionBank
+
+# Сетка значений способности (логиты) для оценки по модели Раша
+GRID = [i / 10 for i in range(-40, 41)]
+
+def item_difficulty(difficulty: int) -> float:
+    """Сложность вопроса 1..5 в логитах модели Раша (-2..2)"""
+    return float(difficulty - 3)
+
+def probability_correct(ability: float, difficulty: int) -> float:
+    """Вероятность правильного ответа при данной способности"""
+    return 1.0 / (1.0 + math.exp(item_difficulty(difficulty) - ability))
+
+class AdaptiveTestEngine:
+    """Адаптивный тест: следующий вопрос подбирается по текущей оценке уровня"""
+
+    def __init__(self, bank: QuestionBank, max_questions: Optional[int] = None,
+                 min_questions: Optional[int] = None, confidence: Optional[float] = None):
+        self.bank = bank
+        self.max_questions = max_questions or test_config.MIN_QUESTIONS
+        self.min_questions = min_questions or test_config.ADAPTIVE_MIN_QUESTIONS
+        self.confidence = confidence or test_config.ADAPTIVE_CONFIDENCE
+
+        # Априорное распределение способности N(0, 1) на сетке
+        prior = [math.exp(-theta * theta / 2) for theta in GRID]
+        total = sum(prior)
+        self.prior = [p / total for p in prior]
+
+        # Таблицы правдоподобия ответа для каждой сложности банка
+        self.likelihood = {
+            difficulty: [probability_correct(theta, difficulty) for theta in GRID]
+            for difficulty in bank.difficulties
+        }
+
+        # Ожидаемый процент правильных ответов по всему банку для каждой точки сетки
+        weights = [len(ids) / len(bank.questions) for ids in bank.ids_by_difficulty]
+        self.expected_percentage = [
+            100 * sum(w * p[i] for w, p in zip(weights, (self.likelihood[d] for d in bank.difficulties)))
+            for i in range(len(GRID))
+        ]
+
+        # Уровень (порог из TestConfig.LEVELS) для каждой точки сетки
+        self.grid_levels = [level_scale.level(percentage).threshold for percentage in self.expected_percentage]
+
+        # Наиболее информативная сложность для каждой точки сетки и порядок запасных сложностей
+        self.best_difficulty = [
+            min(bank.difficulties, key=lambda d: abs(item_difficulty(d) - theta)) for theta in GRID
+        ]
+        self.difficulty_order = {
+            target: sorted(bank.difficulties, key=lambda d: abs(d - target)) for target in bank.difficulties
+        }
+        self.ids_by_difficulty = dict(zip(bank.difficulties, bank.ids_by_difficulty))
+
+    def start(self, rng: Optional[random.Random] = None) -> "AdaptiveSession":
+        """Новая сессия адаптивного теста"""
+        return AdaptiveSession(self, rng or random.Random())
+
+class AdaptiveSession:
+    """Сессия адаптивного теста одного пользователя"""
+
+    def __init__(self, engine: AdaptiveTestEngine, rng: random.Random):
+        self.engine = engine
+        self.rng = rng
+        self.posterior = list(engine.prior)
+        self.question_ids: List[int] = []
+        self.correct = 0
+        self._used: Set[int] = set()
+
+    @property
+    def total(self) -> int:
+        return len(self.question_ids)
+
+    def _estimate_index(self) -> int:
+        """Индекс точки сетки, ближайшей к оценке способности (EAP)"""
+        ability = sum(theta * p for theta, p in zip(GRID, self.posterior))
+        index = round((ability - GRID[0]) * 10)
+        return min(max(index, 0), len(GRID) - 1)
+
+    def _level_mass(self) -> Dict[int, float]:
+        """Апостериорная вероятность каждого уровня"""
+        mass: Dict[int, float] = {}
+        for level, p in zip(self.engine.grid_levels, self.posterior):
+            mass[level] = mass.get(level, 0.0) + p
+        return mass
+
+    def level_confidence(self) -> float:
+        """Вероятность того, что пользователь в наиболее вероятном уровне"""
+        return max(self._level_mass().values())
+
+    @property
+    def finished(self) -> bool:
+        if self.total >= self.engine.max_questions or self.total >= len(self.engine.bank.questions):
+            return True
+        return self.total >= self.engine.min_questions and self.level_confidence() >= self.engine.confidence
+
+    def _pick_unused(self, ids) -> Optional[int]:
+        """Случайный ещё не заданный вопрос из списка"""
+        for _ in range(8):
+            question_id = self.rng.choice(ids)
+            if question_id not in self._used:
+                return question_id
+        unused = [question_id for question_id in ids if question_id not in self._used]
+        return self.rng.choice(unused) if unused else None
+
+    def next_question(self) -> Optional[Question]:
+        """Следующий вопрос или None, если тест завершён"""
+        if self.finished:
+            return None
+
+        # Самая информативная сложность, при исчерпании - ближайшие к ней
+        target = self.engine.best_difficulty[self._estimate_index()]
+        for difficulty in self.engine.difficulty_order[target]:
+            question_id = self._pick_unused(self.engine.ids_by_difficulty[difficulty])
+            if question_id is not None:
+                self._used.add(question_id)
+                self.question_ids.append(question_id)
+                return self.engine.bank.get_question(question_id)
+        return None
+
+    def answer(self, question: Question, is_correct: bool) -> None:
+        """Учёт ответа и пересчёт апостериорного распределения"""
+        likelihood = self.engine.likelihood[question.difficulty]
+        if is_correct:
+            self.correct += 1
+            posterior = [p * l for p, l in zip(self.posterior, likelihood)]
+        else:
+            posterior = [p * (1 - l) for p, l in zip(self.posterior, likelihood)]
+        total = sum(posterior)
+        self.posterior = [p / total for p in posterior]
+
+    @property
+    def percentage(self) -> float:
+        """Оценка процента правильных ответов по всему банку"""
+        return sum(e * p for e, p in zip(self.engine.expected_percentage, self.posterior))
+
+    def results(self) -> Dict[str, Any]:
+        """Результаты в том же формате, что и у обычного теста"""
+        mass = self._level_mass()
+        threshold = max(mass, key=mass.get)
+        return {
+            "correct": self.correct,
+            "total": self.total,
+            "percentage": self.percentage,
+            "level": level_scale.by_threshold[threshold].name
+        }
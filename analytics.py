@@ -0,0 +1,270 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from database import (
+    LEAD_FIELDS, SHEET_HEADERS, StorageBackend, LocalStorage, GoogleSheetsManager, MirroredStorage,
+    create_tables, get_db_connection
+)
+from levels import level_scale
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Размер порции строк при потоковом чтении
+CHUNK_SIZE = 10_000
+
+# Категориальные поля лида, по которым строятся разбивки
+CATEGORICAL_FIELDS = ("level", "goal", "time", "budget", "format", "payment")
+
+# Агрегация по покрывающему индексу idx_conversions_code, затем соединение с небольшой таблицей кодов
+FUNNEL_SQL = """
+    SELECT r.platform, r.theme, c.event_type, SUM(c.n)
+    FROM (SELECT code, event_type, COUNT(*) AS n FROM conversions GROUP BY code, event_type) AS c
+    JOIN referral_codes AS r ON r.code = c.code
+    GROUP BY r.platform, r.theme, c.event_type
+"""
+
+# Где пользователи бросают диалог (события пишет utils.sweeper), по индексу idx_dropoffs_step
+DROPOFF_SQL = """
+    SELECT step, question_index, COUNT(*) FROM dropoffs
+    GROUP BY step, question_index ORDER BY COUNT(*) DESC
+"""
+
+def parse_percentage(value: str) -> float:
+    """Процент из строки таблицы ('75.0%'); нечисловые значения - NaN"""
+    try:
+        return float(value.rstrip("%"))
+    except (ValueError, AttributeError):
+        return float("nan")
+
+class CategoricalColumn:
+    """Столбец со словарным кодированием: каждое значение хранится один раз, строки - коды в array"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.codes = array("I")
+
+    def extend(self, values: Iterable[str]) -> None:
+        index = self._index
+        codes = []
+        for value in values:
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(self.values)
+                self.values.append(value)
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def counts(self) -> Dict[str, int]:
+        """Количество строк по значениям (подсчёт по кодам без обращения к строкам)"""
+        return {self.values[code]: count for code, count in Counter(self.codes).items()}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+class LeadFrame:
+    """Лиды в столбцовом виде: категориальные поля и проценты теста"""
+
+    # Из хранилища читаются только эти поля, в этом порядке
+    FIELDS = CATEGORICAL_FIELDS + ("percentage",)
+
+    def __init__(self):
+        self.columns = {field: CategoricalColumn() for field in CATEGORICAL_FIELDS}
+        self.percentage = array("d")
+
+    def append_rows(self, rows: Sequence[Sequence[str]]) -> None:
+        """Добавление порции строк в порядке FIELDS"""
+        if not rows:
+            return
+        # Транспонирование порции в столбцы выполняется на C-уровне через zip
+        *categorical, percentages = zip(*rows)
+        for column, values in zip(self.columns.values(), categorical):
+            column.extend(values)
+        self.percentage.extend(map(parse_percentage, percentages))
+
+    @classmethod
+    def from_storage(cls, storage: StorageBackend, chunk_size: int = CHUNK_SIZE) -> "LeadFrame":
+        frame = cls()
+        for rows in iter_lead_rows(storage, chunk_size, cls.FIELDS):
+            frame.append_rows(rows)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.percentage)
+
+    def distribution(self, field: str) -> List[Tuple[str, int, float]]:
+        """Значения поля по убыванию частоты: (значение, количество, доля в %)"""
+        total = len(self) or 1
+        counts = self.columns[field].counts()
+        return [(value, count, 100 * count / total) for value, count in sorted(counts.items(), key=lambda item: -item[1])]
+
+    def crosstab(self, row_field: str, col_field: str) -> Tuple[List[str], List[str], List[List[int]]]:
+        """Таблица сопряжённости двух полей: подписи строк, подписи столбцов и счётчики"""
+        rows, cols = self.columns[row_field], self.columns[col_field]
+        width = len(cols.values)
+        # Пара кодов складывается в один код, подсчёт идёт одним проходом Counter
+        pairs = Counter(map(lambda r, c: r * width + c, rows.codes, cols.codes))
+        table = [[0] * width for _ in rows.values]
+        for code, count in pairs.items():
+            table[code // width][code % width] = count
+        return rows.values, cols.values, table
+
+    def mean_percentage_by(self, field: str) -> Dict[str, float]:
+        """Средний процент правильных ответов по значениям поля"""
+        column = self.columns[field]
+        sums = [0.0] * len(column.values)
+        counts = [0] * len(column.values)
+        for code, percentage in zip(column.codes, self.percentage):
+            # NaN (нечисловой процент) не равен сам себе и пропускается
+            if percentage == percentage:
+                sums[code] += percentage
+                counts[code] += 1
+        return {value: sums[code] / counts[code] for code, value in enumerate(column.values) if counts[code]}
+
+def iter_lead_rows(storage: StorageBackend, chunk_size: int = CHUNK_SIZE,
+                   fields: Sequence[str] = tuple(LEAD_FIELDS)) -> Iterator[List[Sequence[str]]]:
+    """Лиды порциями по chunk_size строк, только поля fields (от старых к новым)"""
+    if isinstance(storage, MirroredStorage):
+        storage = storage.local
+    if isinstance(storage, LocalStorage):
+        cursor = storage.pool.connection().execute(f"SELECT {', '.join(fields)} FROM leads ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    elif isinstance(storage, GoogleSheetsManager):
+        # Таблица читается одним запросом, столбцы сверяются со схемой из _ensure_headers
+        values = storage._get_sheet().get_all_values()
+        if values and values[0] != SHEET_HEADERS:
+            logger.warning("⚠️ Заголовки таблицы отличаются от ожидаемых: %s", values[0])
+        width = len(SHEET_HEADERS)
+        positions = [LEAD_FIELDS.index(field) for field in fields]
+        for start in range(1, len(values), chunk_size):
+            chunk = [row + [""] * (width - len(row)) for row in values[start:start + chunk_size]]
+            yield [[row[position] for position in positions] for row in chunk]
+    else:
+        raise ValueError(f"Хранилище {type(storage).__name__} не поддерживает выгрузку лидов")
+
+def conversion_funnel() -> List[Dict[str, Any]]:
+    """Воронка click → start → complete по платформе и теме реферальных ссылок"""
+    create_tables()
+    funnel: Dict[Tuple[str, str], Dict[str, int]] = {}
+    for platform, theme, event_type, count in get_db_connection().execute(FUNNEL_SQL):
+        funnel.setdefault((platform, theme), {})[event_type] = count
+
+    result = []
+    for (platform, theme), events in sorted(funnel.items(), key=lambda item: -item[1].get("click", 0)):
+        clicks, starts, completes = events.get("click", 0), events.get("start", 0), events.get("complete", 0)
+        result.append({
+            "platform": platform,
+            "theme": theme,
+            "clicks": clicks,
+            "starts": starts,
+            "completes": completes,
+            "start_rate": 100 * starts / clicks if clicks else 0.0,
+            "complete_rate": 100 * completes / starts if starts else 0.0
+        })
+    return result
+
+def dropoff_breakdown() -> List[Dict[str, Any]]:
+    """Брошенные диалоги по шагу и номеру вопроса"""
+    create_tables()
+    return [
+        {"step": step, "question_index": question_index, "count": count}
+        for step, question_index, count in get_db_connection().execute(DROPOFF_SQL)
+    ]
+
+def build_report(storage: StorageBackend) -> Dict[str, Any]:
+    """Сводка по лидам и конверсиям"""
+    started = time.perf_counter()
+    frame = LeadFrame.from_storage(storage)
+    budgets, goals, table = frame.crosstab("budget", "goal")
+    return {
+        "leads": len(frame),
+        "levels": frame.distribution("level"),
+        # Уровни, пересчитанные из процентов по текущим порогам TestConfig.LEVELS
+        "rescored_levels": level_scale.counts(frame.percentage),
+        "mean_percentage_by_goal": frame.mean_percentage_by("goal"),
+        "budget_by_goal": {"budgets": budgets, "goals": goals, "counts": table},
+        "funnel": conversion_funnel(),
+        "dropoffs": dropoff_breakdown(),
+        "elapsed": time.perf_counter() - started
+    }
+
+def render_report(report: Dict[str, Any], limit: int = 10) -> str:
+    """Текст сводки для админ-команды /report"""
+    response = f"📊 Аналитика по {report['leads']} лидам\n\n"
+    response += "📚 Уровни:\n"
+    for level, count, share in report["levels"][:limit]:
+        response += f"   {level}: {count} ({share:.1f}%)\n"
+    stored = {level: count for level, count, _ in report["levels"]}
+    if any(stored.get(level, 0) != count for level, count in report["rescored_levels"].items() if count):
+        response += "   по текущим порогам: " + ", ".join(
+            f"{level} {count}" for level, count in report["rescored_levels"].items() if count
+        ) + "\n"
+
+    crosstab = report["budget_by_goal"]
+    response += "\n💰 Бюджет × 🎯 мета (топ):\n"
+    cells = [
+        (count, budget, goal)
+        for budget, row in zip(crosstab["budgets"], crosstab["counts"])
+        for goal, count in zip(crosstab["goals"], row) if count
+    ]
+    for count, budget, goal in sorted(cells, reverse=True)[:limit]:
+        response += f"   {budget} / {goal}: {count}\n"
+
+    if report["funnel"]:
+        response += "\n🔗 Воронка по платформам:\n"
+        for row in report["funnel"][:limit]:
+            response += (
+                f"   {row['platform']} / {row['theme']}: {row['clicks']} → {row['starts']} → {row['completes']} "
+                f"({row['start_rate']:.0f}% / {row['complete_rate']:.0f}%)\n"
+            )
+    if report["dropoffs"]:
+        response += "\n🚪 Где уходят:\n"
+        for row in report["dropoffs"][:limit]:
+            question = f", вопрос {row['question_index'] + 1}" if row["question_index"] else ""
+            response += f"   {row['step'] or 'не указан'}{question}: {row['count']}\n"
+    response += f"\n⏱ {report['elapsed']:.2f} с"
+    return response
+
+def export_csv(storage: StorageBackend, path: str) -> int:
+    """Потоковая выгрузка лидов в CSV со столбцами таблицы; возвращает число строк"""
+    exported = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(SHEET_HEADERS)
+        for rows in iter_lead_rows(storage):
+            writer.writerows(rows)
+            exported += len(rows)
+    return exported
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Командная строка: python -m analytics report | export leads.csv"""
+    parser = argparse.ArgumentParser(description="Аналитика и выгрузка лидов")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="сводка по лидам и конверсиям")
+    report_parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    export_parser = commands.add_parser("export", help="выгрузка лидов в CSV")
+    export_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    from database import db
+    if args.command == "report":
+        report = build_report(db)
+        print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else render_report(report))
+    else:
+        started = time.perf_counter()
+        exported = export_csv(db, args.path)
+        print(f"✅ Выгружено лидов: {exported} в {args.path} за {time.perf_counter() - started:.2f} с")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from telebot import Handler
+from telebot.async_telebot import AsyncTeleBot
+from config import bot_config
+from utils.dedup import update_dedup
+from utils.logger import get_logger
+from webhook import update_chat_id
+
+logger = get_logger(__name__)
+
+# Все типы сообщений, которые может ждать обработчик следующего шага
+ALL_CONTENT_TYPES = [
+    "text", "audio", "document", "photo", "sticker", "video", "video_note",
+    "voice", "location", "contact", "venue", "animation", "dice", "poll"
+]
+
+class DedupAsyncTeleBot(AsyncTeleBot):
+    """AsyncTeleBot без повторно доставленных обновлений, обрабатывающий обновления одного чата по порядку"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Последняя задача обработки каждого чата: следующее обновление чата ждёт её завершения
+        self._chat_tails: Dict[int, asyncio.Task] = {}
+
+    async def process_new_updates(self, updates):
+        # AsyncTeleBot запускает обработчики всех обновлений пакета (и соседних пакетов) одновременно,
+        # поэтому очередь чата выстраивается здесь, синхронно, в порядке получения обновлений
+        tasks = []
+        for update in update_dedup.filter(updates):
+            chat_id = update_chat_id(update)
+            previous = self._chat_tails.get(chat_id) if chat_id else None
+            task = asyncio.ensure_future(self._process_after(previous, update))
+            if chat_id:
+                self._chat_tails[chat_id] = task
+                task.add_done_callback(functools.partial(self._forget_tail, chat_id))
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
+    async def _process_after(self, previous, update) -> None:
+        if previous is not None:
+            # Ошибка предыдущего обновления чата не отменяет обработку следующего
+            await asyncio.wait([previous])
+        await super().process_new_updates([update])
+
+    def _forget_tail(self, chat_id: int, task: asyncio.Task) -> None:
+        if self._chat_tails.get(chat_id) is task:
+            del self._chat_tails[chat_id]
+
+class AsyncBotAdapter:
+    """Синхронный интерфейс TeleBot поверх AsyncTeleBot для существующих обработчиков"""
+
+    def __init__(self, bot: AsyncTeleBot, max_workers: int):
+        self.bot = bot
+        self.loop = None
+        # Обработчики и блокирующие вызовы хранилища выполняются в ограниченном пуле,
+        # а запросы к Bot API из них уходят через асинхронный клиент в цикле событий.
+        # Поток занят на всё время обработчика, включая ожидание Bot API, поэтому одновременно
+        # обрабатывается не больше max_workers чатов: это и есть предел параллельности режима
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="handler")
+        self._next_steps: Dict[int, Handler] = {}
+
+        # Обработчики следующего шага имеют приоритет над обычными, как в TeleBot
+        self.bot.register_message_handler(
+            self._dispatch_next_step,
+            content_types=ALL_CONTENT_TYPES,
+            func=lambda message: message.chat.id in self._next_steps
+        )
+
+    async def _run(self, callback: Callable, *args, **kwargs) -> None:
+        """Выполнение синхронного обработчика в пуле потоков"""
+        try:
+            await self.loop.run_in_executor(self.executor, functools.partial(callback, *args, **kwargs))
+        except Exception as e:
+            handler = getattr(callback, '__name__', str(callback))
+            logger.error("❌ Ошибка в обработчике %s: %s", handler, e, exc_info=True, extra={"handler": handler})
+
+    async def _dispatch_next_step(self, message) -> None:
+        """Передача сообщения зарегистрированному обработчику следующего шага"""
+        step = self._next_steps.pop(message.chat.id, None)
+        if step is None:
+            return
+        await self._run(step.callback, message, *step.args, **step.kwargs)
+
+    def message_handler(self, commands=None, regexp=None, func=None, content_types=None, chat_types=None, **kwargs):
+        """Аналог TeleBot.message_handler для синхронной функции"""
+        def decorator(handler: Callable) -> Callable:
+            async def wrapper(message):
+                await self._run(handler, message)
+
+            self.bot.register_message_handler(
+                wrapper,
+                commands=commands,
+                regexp=regexp,
+                func=func,
+                content_types=content_types,
+                chat_types=chat_types,
+                **kwargs
+            )
+            return handler
+        return decorator
+
+    def callback_query_handler(self, func, **kwargs):
+        """Аналог TeleBot.callback_query_handler для синхронной функции"""
+        def decorator(handler: Callable) -> Callable:
+            async def wrapper(call):
+                await self._run(handler, call)
+
+            self.bot.register_callback_query_handler(wrapper, func, **kwargs)
+            return handler
+        return decorator
+
+    def register_next_step_handler_by_chat_id(self, chat_id: int, callback: Callable, *args, **kwargs) -> None:
+        self._next_steps[chat_id] = Handler(callback, *args, **kwargs)
+
+    def pending_next_steps(self) -> Dict[int, List[Handler]]:
+        """Ожидающие обработчики следующего шага по чатам (каждая регистрация - свой объект Handler)"""
+        return {chat_id: [handler] for chat_id, handler in list(self._next_steps.items())}
+
+    def register_next_step_handler(self, message, callback: Callable, *args, **kwargs) -> None:
+        self.register_next_step_handler_by_chat_id(message.chat.id, callback, *args, **kwargs)
+
+    def clear_step_handler_by_chat_id(self, chat_id: int) -> None:
+        self._next_steps.pop(chat_id, None)
+
+    def clear_step_handler(self, message) -> None:
+        self.clear_step_handler_by_chat_id(message.chat.id)
+
+    def __getattr__(self, name: str) -> Any:
+        """Методы Bot API (send_message, reply_to, ...) в синхронном виде для потоков пула"""
+        attr = getattr(self.bot, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self.loop).result()
+        return call
+
+    async def run(self) -> None:
+        """Запуск long polling в текущем цикле событий"""
+        self.loop = asyncio.get_running_loop()
+        try:
+            await self.bot.infinity_polling(timeout=60, request_timeout=60)
+        finally:
+            self.executor.shutdown(wait=True)
+            await self.bot.close_session()
+
+def run_async(register_handlers: Callable[[Any], None]) -> None:
+    """Точка входа асинхронного режима"""
+    bot = AsyncBotAdapter(DedupAsyncTeleBot(bot_config.TOKEN), max_workers=bot_config.ASYNC_HANDLER_WORKERS)
+    register_handlers(bot)
+    logger.info("🤖 Бот запущен в асинхронном режиме!")
+    asyncio.run(bot.run())
@@ -0,0 +1,68 @@
+"""Симуляция: фиксированный тест против адаптивного при одинаковой точности определения уровня.
+
+Запуск: python -m benchmarks.bench_adaptive
+"""
+import time
+import random
+from adaptive import AdaptiveTestEngine, probability_correct
+from config import test_config
+from levels import level_scale
+from questions import Question, QuestionBank
+
+USERS = 5000
+BANK_SIZE = 500
+# Доли сложностей как в questions.jsonl
+DIFFICULTY_WEIGHTS = {1: 1, 2: 1, 3: 2, 4: 2, 5: 3}
+
+def make_bank(rng: random.Random) -> QuestionBank:
+    difficulties = list(DIFFICULTY_WEIGHTS)
+    weights = list(DIFFICULTY_WEIGHTS.values())
+    return QuestionBank([
+        Question(text=f"q{i}", correct_answer="a", wrong_answers=["b", "c", "d"],
+                 difficulty=rng.choices(difficulties, weights)[0])
+        for i in range(BANK_SIZE)
+    ])
+
+def true_level(engine: AdaptiveTestEngine, ability: float) -> int:
+    """Истинный уровень: порог для ожидаемого процента по всему банку"""
+    weights = [len(ids) / len(engine.bank.questions) for ids in engine.bank.ids_by_difficulty]
+    percentage = 100 * sum(w * probability_correct(ability, d) for w, d in zip(weights, engine.bank.difficulties))
+    return level_scale.level(percentage).threshold
+
+def simulate_fixed(engine: AdaptiveTestEngine, ability: float, rng: random.Random):
+    questions = engine.bank.get_questions(test_config.MIN_QUESTIONS, rng)
+    correct = sum(rng.random() < probability_correct(ability, q.difficulty) for q in questions)
+    return len(questions), level_scale.level(correct / len(questions) * 100).threshold
+
+def simulate_adaptive(engine: AdaptiveTestEngine, ability: float, rng: random.Random):
+    session = engine.start(rng)
+    question = session.next_question()
+    while question is not None:
+        session.answer(question, rng.random() < probability_correct(ability, question.difficulty))
+        question = session.next_question()
+    results = session.results()
+    level = level_scale.by_name[results["level"]].threshold
+    return session.total, level
+
+def run(simulate, engine: AdaptiveTestEngine, seed: int):
+    rng = random.Random(seed)
+    questions = hits = 0
+    started = time.perf_counter()
+    for _ in range(USERS):
+        ability = rng.gauss(0, 1)
+        asked, level = simulate(engine, ability, rng)
+        questions += asked
+        hits += level == true_level(engine, ability)
+    elapsed = time.perf_counter() - started
+    return questions / USERS, hits / USERS, elapsed / questions
+
+def main() -> None:
+    engine = AdaptiveTestEngine(make_bank(random.Random(0)))
+    print(f"Пользователей: {USERS}, вопросов в банке: {BANK_SIZE}")
+    for name, simulate in (("фиксированный", simulate_fixed), ("адаптивный", simulate_adaptive)):
+        per_session, accuracy, per_step = run(simulate, engine, seed=1)
+        print(f"{name:>14}: {per_session:5.2f} вопросов/сессия, точность уровня {accuracy:6.1%}, "
+              f"{per_step * 1e6:6.1f} мкс/шаг")
+
+if __name__ == "__main__":
+    main()
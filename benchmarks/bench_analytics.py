@@ -0,0 +1,72 @@
+"""Сводка analytics.build_report и выгрузка CSV по миллиону лидов и миллиону конверсий.
+
+Запуск: python -m benchmarks.bench_analytics [--leads 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+def populate(path: str, leads: int, conversions: int) -> None:
+    """Синтетические лиды и конверсии в локальной базе"""
+    from database import LocalStorage, build_lead_row, create_tables, get_db_connection
+    from levels import level_scale
+    rng = random.Random(1)
+    goals = ["Для роботи", "Для подорожей", "Для переїзду", "Для навчання", "Інше"]
+    budgets = ["100-300 грн", "300-500 грн", "500-700 грн", "Я поки не знаю, хочу розібратися"]
+    storage = LocalStorage(path)
+    conn = storage.pool.connection()
+    template = build_lead_row({"name": "User"}, {"correct": 0, "total": 10, "percentage": 0.0, "level": ""})
+    rows = []
+    for i in range(leads):
+        row = list(template)
+        percentage = rng.random() * 100
+        row[4] = f"{percentage:.1f}%"
+        row[5] = level_scale.level(percentage).name
+        row[6] = rng.choice(goals)
+        row[8] = rng.choice(budgets)
+        rows.append(row)
+    with conn:
+        conn.executemany(storage.INSERT_SQL, rows)
+
+    create_tables()
+    conn = get_db_connection()
+    codes = [(partner, f"code{partner}", platform, theme)
+             for partner, (platform, theme) in enumerate(
+                 (p, t) for p in ("tiktok", "instagram", "youtube") for t in ("crypto", "travel", "career"))]
+    events = [("click", 0.6), ("start", 0.3), ("complete", 0.1)]
+    with conn:
+        conn.executemany("INSERT INTO referral_codes (partner_id, code, platform, theme) VALUES (?, ?, ?, ?)", codes)
+        conn.executemany(
+            "INSERT INTO conversions (partner_id, code, platform, event_type) VALUES (?, ?, ?, ?)",
+            ((partner, code, platform, rng.choices([e for e, _ in events], [w for _, w in events])[0])
+             for partner, code, platform, _ in (rng.choice(codes) for _ in range(conversions)))
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--conversions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bot-analytics-")
+    os.environ["DB_PATH"] = os.path.join(tmp, "bot.db")
+    os.environ["STORAGE_MODE"] = "local"
+
+    started = time.perf_counter()
+    populate(os.environ["DB_PATH"], args.leads, args.conversions)
+    print(f"подготовка данных: {time.perf_counter() - started:.1f} с")
+
+    import analytics
+    from database import db
+    report = analytics.build_report(db)
+    print(f"сводка по {report['leads']} лидам и {args.conversions} конверсиям: {report['elapsed']:.2f} с")
+    started = time.perf_counter()
+    exported = analytics.export_csv(db, os.path.join(tmp, "leads.csv"))
+    print(f"выгрузка CSV ({exported} строк): {time.perf_counter() - started:.2f} с")
+    print()
+    print(analytics.render_report(report, limit=5))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Стоимость подготовки клавиатуры к отправке: построение и сериализация против кэша.
+
+Запуск: python -m benchmarks.bench_keyboards
+"""
+import random
+import timeit
+from keyboards import Keyboard, MainMenuKeyboard, TestKeyboard, SurveyKeyboard
+
+ROUNDS = 20_000
+
+def bench(name: str, func) -> None:
+    seconds = timeit.timeit(func, number=ROUNDS) / ROUNDS
+    print(f"{name:<40} {seconds * 1e6:8.2f} мкс/сообщение")
+
+def main() -> None:
+    answers = ["had known", "knew", "would know", "have known"]
+    shuffles = [random.sample(answers, len(answers)) for _ in range(24)]
+
+    bench("главное меню: построение + to_json", lambda: Keyboard.create_reply_keyboard(MainMenuKeyboard.BUTTONS, row_width=1).to_json())
+    bench("главное меню: реестр", lambda: MainMenuKeyboard.get_keyboard().to_json())
+    bench("опрос (бюджет): построение + to_json", lambda: Keyboard.create_reply_keyboard(
+        ["100-300 грн", "300-500 грн", "500-700 грн", "Я поки не знаю, хочу розібратися"]).to_json())
+    bench("опрос (бюджет): реестр", lambda: SurveyKeyboard.get_budget_keyboard().to_json())
+    bench("ответы теста: построение + to_json", lambda: Keyboard.create_reply_keyboard(random.choice(shuffles), row_width=1).to_json())
+    bench("ответы теста: LRU-кэш", lambda: TestKeyboard.get_answer_keyboard(random.choice(shuffles)).to_json())
+
+if __name__ == "__main__":
+    main()
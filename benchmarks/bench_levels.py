@@ -0,0 +1,47 @@
+"""Определение уровня по проценту: цепочка порогов против бинарного поиска, пакетный пересчёт и кэш текста результата.
+
+Запуск: python -m benchmarks.bench_levels
+"""
+import random
+import time
+import timeit
+from config import test_config
+from levels import LevelScale, level_scale
+
+ROUNDS = 200_000
+HISTORY = 1_000_000
+
+def ladder(percentage: float) -> str:
+    """Прежний способ: проход по всем порогам LEVELS при каждом вызове"""
+    result = min(test_config.LEVELS)
+    for threshold in sorted(test_config.LEVELS):
+        if percentage >= threshold:
+            result = threshold
+    return test_config.LEVELS[result]["name"]
+
+def bench(name: str, func) -> None:
+    seconds = timeit.timeit(func, number=ROUNDS) / ROUNDS
+    print(f"{name:<40} {seconds * 1e6:8.3f} мкс/вызов")
+
+def main() -> None:
+    rng = random.Random(1)
+    percentages = [rng.random() * 100 for _ in range(HISTORY)]
+    assert all(ladder(p) == level_scale.level(p).name for p in percentages[:10_000])
+
+    bench("цепочка порогов", lambda: ladder(73.3))
+    bench("bisect по скомпилированным порогам", lambda: level_scale.level(73.3).name)
+
+    started = time.perf_counter()
+    [ladder(p) for p in percentages]
+    ladder_time = time.perf_counter() - started
+    started = time.perf_counter()
+    level_scale.classify(percentages)
+    classify_time = time.perf_counter() - started
+    print(f"пересчёт {HISTORY} результатов: цепочка {ladder_time:.2f} с, classify {classify_time:.2f} с")
+
+    uncached = LevelScale(test_config.LEVELS)
+    bench("текст результата без кэша", lambda: (uncached.result_message.cache_clear(), uncached.result_message(7, 10)))
+    bench("текст результата из кэша", lambda: level_scale.result_message(7, 10))
+
+if __name__ == "__main__":
+    main()
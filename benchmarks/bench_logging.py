@@ -0,0 +1,51 @@
+"""Стоимость вызова логгера в потоке обработчика: синхронный FileHandler против очереди.
+
+Запуск: python -m benchmarks.bench_logging
+"""
+import logging
+import os
+import queue
+import tempfile
+import timeit
+from logging.handlers import QueueListener
+from utils.logger import JsonFormatter, NonBlockingQueueHandler, _create_file_handler
+
+ROUNDS = 50_000
+
+def bench(name: str, func) -> None:
+    seconds = timeit.timeit(func, number=ROUNDS) / ROUNDS
+    print(f"{name:<45} {seconds * 1e6:8.2f} мкс/вызов")
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_handler = logging.FileHandler(os.path.join(tmp, "sync.jsonl"), encoding="utf-8")
+        sync_handler.setFormatter(JsonFormatter())
+        sync_logger = make_logger("bench.sync", sync_handler)
+
+        log_queue = queue.Queue(maxsize=ROUNDS * 3)
+        listener = QueueListener(log_queue, _create_file_handler(os.path.join(tmp, "queued.jsonl")))
+        listener.start()
+        queued_logger = make_logger("bench.queued", NonBlockingQueueHandler(log_queue))
+
+        extra = {"chat_id": 123456789, "handler": "handle_answer", "latency_ms": 1.25}
+        bench("FileHandler (синхронно): info",
+              lambda: sync_logger.info("Ответ пользователя %s", 123456789, extra=extra))
+        bench("очередь: info",
+              lambda: queued_logger.info("Ответ пользователя %s", 123456789, extra=extra))
+        bench("очередь: debug при уровне INFO (подавлен)",
+              lambda: queued_logger.debug("Ответ пользователя %s", 123456789, extra=extra))
+
+        listener.stop()
+        sync_handler.close()
+        for handler in listener.handlers:
+            handler.close()
+
+if __name__ == "__main__":
+    main()
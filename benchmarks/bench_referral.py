@@ -0,0 +1,90 @@
+"""Поток переходов по реферальным ссылкам: клики в секунду из нескольких потоков.
+
+Сравниваются синхронная запись каждого клика (INSERT ... SELECT по referral_codes, как было раньше)
+и ReferralSystem с кэшем кодов и пакетной записью. В конце проверяется, что после flush
+в conversion_stats попали все принятые клики, и выводится время одного сброса пакета.
+
+Запуск: python -m benchmarks.bench_referral [--threads 8] [--seconds 5] [--codes 1000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Настройки окружения должны быть заданы до импорта модулей бота
+os.environ.setdefault("STORAGE_MODE", "local")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-referral-"), "bot.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(os.path.dirname(os.environ["DB_PATH"]), "bot_log.jsonl"))
+os.environ.setdefault("BOT_USERNAME", "bench_bot")
+
+from database import get_db_connection
+from utils.metrics import Histogram, metrics
+from utils.referral import ReferralSystem, ref_system
+
+# Прежний путь записи: каждый клик - отдельная транзакция с поиском кода в базе
+DIRECT_SQL = """
+    INSERT INTO conversions (partner_id, code, platform, event_type)
+    SELECT partner_id, code, platform, ? FROM referral_codes WHERE code = ?
+"""
+
+def direct_click(code: str) -> None:
+    conn = get_db_connection()
+    with conn:
+        conn.execute(DIRECT_SQL, ("click", code))
+
+def run(name: str, click, codes, threads: int, seconds: float) -> int:
+    """Клики из нескольких потоков в течение заданного времени; возвращает их число"""
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int) -> None:
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            click(rng.choice(codes))
+            counts[index] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    total = sum(counts)
+    print(f"{name:<28} {total:>9} кликов за {seconds:.0f} с ({total / seconds:,.0f} кликов/с)")
+    return total
+
+def conversions_count() -> int:
+    return get_db_connection().execute("SELECT COALESCE(SUM(count), 0) FROM conversion_stats").fetchone()[0]
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--codes", type=int, default=1000)
+    args = parser.parse_args()
+
+    codes = []
+    for i in range(args.codes):
+        _, link = ref_system.create_referral_link(None, random.choice(["tiktok", "instagram", "youtube"]), "bench")
+        codes.append(link.rsplit("=", 1)[1])
+    print(f"кодов: {len(codes)}, потоков: {args.threads}")
+
+    direct = run("синхронная запись", direct_click, codes, args.threads, args.seconds)
+
+    system = ReferralSystem(flush_interval=1.0, batch_size=500)
+    system.warm_up()
+    before = conversions_count()
+    buffered = run("кэш кодов + пакетная запись", lambda code: system.track_conversion(code, "click"),
+                   codes, args.threads, args.seconds)
+    system.close()
+    written = conversions_count() - before
+    print(f"ускорение: x{buffered / max(direct, 1):.1f}; записано {written} из {buffered} принятых кликов")
+
+    counts, total, count, _ = metrics.histogram("call", "referral.flush").snapshot()
+    if count:
+        p95 = Histogram.quantile(counts, count, 0.95)
+        print(f"сброс пакета: {count} раз, в среднем {total / count * 1000:.1f} мс, p95 ≤ {p95 * 1000:g} мс")
+
+if __name__ == "__main__":
+    main()
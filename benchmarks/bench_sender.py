@@ -0,0 +1,57 @@
+"""Отправка ответов на вопросы теста: прямые вызовы send_message против MessageScheduler.
+
+Бот ходит в локальный FakeBotAPI, который отвечает 429 на каждый 20-й запрос.
+Запуск: python -m benchmarks.bench_sender
+"""
+import time
+import telebot
+from telebot import apihelper
+from benchmarks.fakes import FakeBotAPI
+from utils.sender import MessageScheduler, configure_http_pool
+
+CHATS = 50
+LATENCY = 0.005
+# Сообщения на один ответ пользователя, как в старом потоке теста
+ANSWER_MESSAGES = ["✨ Правильно!", "⏳ Наступне питання...", "Question 2: She ___ to school every day."]
+
+def run_direct(bot) -> float:
+    """Обработчик сам отправляет каждое сообщение и ждёт ответа API"""
+    started = time.perf_counter()
+    for chat_id in range(1, CHATS + 1):
+        for text in ANSWER_MESSAGES:
+            try:
+                bot.send_message(chat_id, text)
+            except apihelper.ApiTelegramException:
+                pass
+    return time.perf_counter() - started
+
+def run_scheduled(bot):
+    """Обработчик ставит сообщения в очередь; возвращает время обработчика и время до полной отправки"""
+    scheduler = MessageScheduler(bot, global_rate=1000, chat_rate=10, chat_burst=3, workers=8)
+    started = time.perf_counter()
+    for chat_id in range(1, CHATS + 1):
+        for text in ANSWER_MESSAGES:
+            scheduler.send(chat_id, text)
+    enqueued = time.perf_counter() - started
+    scheduler.close()
+    return enqueued, time.perf_counter() - started, scheduler.stats()
+
+def main() -> None:
+    configure_http_pool(16)
+    for name in ("direct", "scheduled"):
+        api = FakeBotAPI(latency=LATENCY, rate_limit_every=20).start()
+        apihelper.API_URL = api.api_url
+        bot = telebot.TeleBot("123:TEST", threaded=False)
+        if name == "direct":
+            seconds = run_direct(bot)
+            print(f"прямая отправка:   обработчики {seconds * 1000:8.1f} мс, "
+                  f"запросов {api.calls['sendMessage']}, 429: {api.calls['429']} (сообщения потеряны)")
+        else:
+            enqueued, total, stats = run_scheduled(bot)
+            print(f"через планировщик: обработчики {enqueued * 1000:8.1f} мс, отправка {total * 1000:8.1f} мс, "
+                  f"запросов {api.calls['sendMessage']}, 429: {api.calls['429']} (повторено {stats['retried']}), "
+                  f"доставлено {len(api.messages)} из {CHATS}")
+        api.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Пропускная способность многопроцессного режима: одни и те же обновления на 1, 2, 4 ... воркерах.
+
+Обновления раздаёт ShardSupervisor из FakeUpdateSource, воркеры выполняют обработчики main
+и отправляют ответы в FakeBotAPI. Время считается от готовности всех воркеров до подтверждения
+последнего обновления. --kill-after N завершает один воркер после N обновлений и проверяет перезапуск.
+
+Запуск: python -m benchmarks.bench_sharded --workers 1 2 4 --chats 200 --messages 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Настройки окружения должны быть заданы до импорта модулей бота (воркеры наследуют их при запуске)
+os.environ.setdefault("STORAGE_MODE", "local")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-sharded-"), "bot.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(os.path.dirname(os.environ["DB_PATH"]), "bot_log.jsonl"))
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TOKEN", "123456:SHARDED")
+
+from telebot import apihelper
+from benchmarks.fakes import FakeBotAPI, FakeUpdateSource
+from sharded import ShardSupervisor
+
+def run(workers: int, args: argparse.Namespace) -> dict:
+    source = FakeUpdateSource(args.chats, args.messages)
+    supervisor = ShardSupervisor(workers, queue_size=len(source.updates))
+    supervisor.start()
+    deadline = time.monotonic() + args.start_timeout
+    while not all(shard.ready for shard in supervisor.shards):
+        if time.monotonic() > deadline:
+            # Воркер, который падает при запуске (например, нет пакета handlers), перезапускался бы бесконечно
+            restarts = supervisor.stats()["restarts"]
+            supervisor.stop(timeout=1)
+            raise RuntimeError(f"воркеры не запустились за {args.start_timeout:.0f} с "
+                               f"(перезапусков: {restarts}), трейсбек воркера - выше в stderr")
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    poller = threading.Thread(target=supervisor.run, args=(source,), daemon=True)
+    poller.start()
+    killed = False
+    total = len(source.updates)
+    while supervisor.stats()["processed"] + supervisor.stats()["lost"] < total:
+        if args.kill_after and not killed and supervisor.stats()["processed"] >= args.kill_after:
+            supervisor.shards[0].process.kill()
+            killed = True
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    supervisor.stop()
+    return {**supervisor.stats(), "elapsed": elapsed, "total": total}
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--kill-after", type=int, default=0)
+    parser.add_argument("--start-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(latency=args.api_latency).start()
+    apihelper.API_URL = api.api_url
+    try:
+        for workers in args.workers:
+            try:
+                result = run(workers, args)
+            except RuntimeError as e:
+                print(f"❌ Не удалось запустить воркеры: {e}", file=sys.stderr)
+                return 1
+            print(f"воркеров: {workers}: {result['processed']} из {result['total']} обновлений за "
+                  f"{result['elapsed']:.2f} с ({result['processed'] / result['elapsed']:.0f} обн/с), "
+                  f"по воркерам {result['per_worker']}, перезапусков {result['restarts']}, потеряно {result['lost']}")
+    finally:
+        api.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
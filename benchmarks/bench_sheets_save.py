@@ -0,0 +1,47 @@
+"""Сравнение стоимости сохранения строки при 100k строк в таблице.
+
+Запуск: python -m benchmarks.bench_sheets_save
+"""
+import os
+import tempfile
+import time
+from database import GoogleSheetsManager, SHEET_HEADERS
+from benchmarks.fakes import FakeSpreadsheet
+
+PREFILLED_ROWS = 100_000
+SAVES = 200
+
+def _rows(count: int):
+    return [[f"lead{i}"] + [""] * 11 for i in range(count)]
+
+def bench_full_scan() -> float:
+    """Старый способ: append_row + len(get_all_values()) на каждое сохранение"""
+    sheet = FakeSpreadsheet().sheet1
+    sheet.prefill(PREFILLED_ROWS)
+    started = time.perf_counter()
+    for row in _rows(SAVES):
+        sheet.append_row(row)
+        last_row = len(sheet.get_all_values())
+        sheet.format(f"A{last_row}:L{last_row}", {})
+    return (time.perf_counter() - started) / SAVES
+
+def bench_tracked(prefilled: int) -> float:
+    """Новый способ: номер строки из ответа append_rows"""
+    sheet = FakeSpreadsheet().sheet1
+    sheet.rows.append(list(SHEET_HEADERS))
+    sheet.prefill(prefilled)
+    manager = GoogleSheetsManager(sheet=sheet, outbox_path=os.path.join(tempfile.mkdtemp(), "outbox.db"))
+    manager.writer.close()
+    started = time.perf_counter()
+    for row in _rows(SAVES):
+        manager._append_rows([row])
+    return (time.perf_counter() - started) / SAVES
+
+def main() -> None:
+    print(f"Строк в таблице: {PREFILLED_ROWS}, сохранений: {SAVES}")
+    print(f"get_all_values на каждое сохранение: {bench_full_scan() * 1e6:10.1f} мкс/строка")
+    print(f"кэш номера строки (1k строк):        {bench_tracked(1_000) * 1e6:10.1f} мкс/строка")
+    print(f"кэш номера строки (100k строк):      {bench_tracked(PREFILLED_ROWS) * 1e6:10.1f} мкс/строка")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Холодный старт: время от запуска интерпретатора до готовности бота принимать обновления.
+
+Каждый замер - отдельный процесс: импорт main, создание TeleBot, регистрация админ-команд и
+фоновый warm_up хранилища (файла google_sheets.json нет, сеть не нужна).
+Запуск: python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 7
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import telebot
+import main
+bot = telebot.TeleBot("123456:STARTUP", threaded=False)
+main.register_admin_handlers(main.prepare_bot(bot))
+import sys
+loaded = [int(name in sys.modules) for name in ("gspread", "oauth2client")]
+main.db.warm_up()
+ready = time.perf_counter() - started
+print(ready, *loaded)
+"""
+
+GOOGLE_IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+print(time.perf_counter() - started)
+"""
+
+def run(script: str, env: dict) -> list:
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return result.stdout.split()
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "STORAGE_MODE": "mirror",
+            "DB_PATH": os.path.join(tmp, "bot.db"),
+            "LOG_FILE": os.path.join(tmp, "bot_log.jsonl"),
+            "METRICS_PORT": "0"
+        }
+        samples = [run(STARTUP_SCRIPT, env) for _ in range(RUNS)]
+        google = [float(run(GOOGLE_IMPORT_SCRIPT, env)[0]) for _ in range(RUNS)]
+
+    ready = [float(sample[0]) for sample in samples]
+    print(f"до готовности к приёму обновлений: медиана {statistics.median(ready) * 1000:.0f} мс, "
+          f"макс {max(ready) * 1000:.0f} мс ({RUNS} запусков)")
+    print(f"gspread загружен при старте: {'да' if samples[-1][1] == '1' else 'нет'}, "
+          f"oauth2client: {'да' if samples[-1][2] == '1' else 'нет'}")
+    print(f"отложенный импорт gspread + oauth2client: медиана {statistics.median(google) * 1000:.0f} мс")
+
+if __name__ == "__main__":
+    main()
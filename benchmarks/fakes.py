@@ -0,0 +1,219 @@
+import json
+import time
+import queue
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+from urllib.parse import parse_qsl, urlsplit
+
+class FakeSpreadsheet:
+    """Таблица в памяти с интерфейсом gspread.Spreadsheet"""
+
+    def __init__(self, title: str = "Stats", latency: float = 0.0):
+        self.title = title
+        self.latency = latency
+        self.calls = Counter()
+        self.requests: List[Dict[str, Any]] = []
+        self.sheet1 = FakeWorksheet(self)
+
+    def _call(self, name: str) -> None:
+        """Учёт вызова API и имитация сетевой задержки"""
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def batch_update(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self._call("batch_update")
+        self.requests.extend(body.get("requests", []))
+        for request in body.get("requests", []):
+            update = request.get("updateCells")
+            if update and "start" in update:
+                self.sheet1._write_rows(update["start"]["rowIndex"], [
+                    [cell["userEnteredValue"]["stringValue"] for cell in row["values"]]
+                    for row in update["rows"]
+                ])
+        return {"spreadsheetId": self.title, "replies": [{} for _ in body.get("requests", [])]}
+
+class FakeWorksheet:
+    """Лист в памяти с теми методами gspread.Worksheet, которые использует бот"""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet, title: str = "Sheet1"):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = 0
+        self.rows: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def prefill(self, count: int, width: int = 12) -> None:
+        """Заполнить лист строками-заглушками (без учёта вызовов)"""
+        self.rows.extend([f"r{i}c{j}" for j in range(width)] for i in range(count))
+
+    def _write_rows(self, start_index: int, rows: List[List[str]]) -> None:
+        with self._lock:
+            while len(self.rows) < start_index + len(rows):
+                self.rows.append([])
+            for offset, row in enumerate(rows):
+                self.rows[start_index + offset] = list(row)
+
+    def row_values(self, row: int) -> List[str]:
+        self.spreadsheet._call("row_values")
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col: int) -> List[str]:
+        self.spreadsheet._call("col_values")
+        return [row[col - 1] for row in self.rows if len(row) >= col]
+
+    def get_all_values(self) -> List[List[str]]:
+        self.spreadsheet._call("get_all_values")
+        return [list(row) for row in self.rows]
+
+    def append_row(self, values: List[str], **kwargs) -> Dict[str, Any]:
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values: List[List[str]], **kwargs) -> Dict[str, Any]:
+        self.spreadsheet._call("append_rows")
+        with self._lock:
+            first_row = len(self.rows) + 1
+            self.rows.extend(list(row) for row in values)
+            last_row = len(self.rows)
+        return {
+            "spreadsheetId": self.spreadsheet.title,
+            "updates": {
+                "updatedRange": f"'{self.title}'!A{first_row}:L{last_row}",
+                "updatedRows": len(values)
+            }
+        }
+
+    def format(self, ranges: str, cell_format: Dict[str, Any]) -> Dict[str, Any]:
+        return self.spreadsheet.batch_update({"requests": [{"repeatCell": {"range": ranges, "cell": cell_format}}]})
+
+class FakeBotAPI:
+    """Локальный HTTP-сервер с подмножеством Bot API (send*) для проверки отправки без сети"""
+
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: int = 1):
+        self.latency = latency
+        # Каждый rate_limit_every-й запрос получает 429 с retry_after (0 - без ограничений)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.messages: List[Dict[str, Any]] = []
+        self._inboxes: Dict[int, "queue.Queue[Dict[str, Any]]"] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        """Шаблон для telebot.apihelper.API_URL"""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    # Загрузки файлов (multipart) не разбираем: параметры сообщения остаются в строке запроса
+                    params.update(parse_qsl(self.rfile.read(length).decode(errors="replace")))
+                status, body = api.handle(url.path.rsplit("/", 1)[-1], params)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def inbox(self, chat_id: int) -> "queue.Queue[Dict[str, Any]]":
+        """Очередь сообщений, которые бот отправил в чат (для имитации пользователя)"""
+        with self._lock:
+            inbox = self._inboxes.get(chat_id)
+            if inbox is None:
+                inbox = self._inboxes[chat_id] = queue.Queue()
+            return inbox
+
+    def handle(self, method: str, params: Dict[str, str]):
+        """Ответ на вызов метода API: (HTTP-статус, JSON)"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            if self.rate_limit_every and self.calls[method] % self.rate_limit_every == 0:
+                self.calls["429"] += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                }
+            if method == "getMe":
+                return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bot"}}
+            if not method.startswith("send"):
+                return 200, {"ok": True, "result": True}
+            self.messages.append(params)
+            message_id = len(self.messages)
+        chat_id = int(params.get("chat_id", 0))
+        # Служебные поля для имитации пользователя: id сообщения и момент его получения
+        self.inbox(chat_id).put({**params, "_message_id": message_id, "_received": time.perf_counter()})
+        return 200, {"ok": True, "result": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", "")
+        }}
+
+    def start(self) -> "FakeBotAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+class FakeUpdateSource:
+    """Источник обновлений для супервизора sharded: chats чатов по messages текстовых сообщений"""
+
+    def __init__(self, chats: int, messages: int, start_chat_id: int = 100_000_000, batch: int = 100):
+        self.batch = batch
+        self.updates: List[Dict[str, Any]] = []
+        for step in range(messages):
+            for index in range(chats):
+                chat_id = start_chat_id + index
+                user = {"id": chat_id, "is_bot": False, "first_name": f"User{index}"}
+                self.updates.append({
+                    "update_id": len(self.updates) + 1,
+                    "message": {
+                        "message_id": step + 1,
+                        "date": int(time.time()),
+                        "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+                        "from": user,
+                        "text": "/start" if step == 0 else f"message {step}",
+                        **({"entities": [{"type": "bot_command", "offset": 0, "length": 6}]} if step == 0 else {})
+                    }
+                })
+        self.done = threading.Event()
+
+    def get_updates(self, offset: int) -> List[Dict[str, Any]]:
+        """Следующая порция после offset; когда обновления кончились - пустой ответ, как у long polling"""
+        start = max(offset - 1, 0)
+        updates = self.updates[start:start + self.batch]
+        if not updates:
+            self.done.set()
+            time.sleep(0.05)
+        return updates
@@ -0,0 +1,275 @@
+"""Нагрузочный тест без сети: N синтетических пользователей проходят /start, тест уровня и опрос.
+
+Бот собирается так же, как в main.main (prepare_bot + register_handlers), обновления раздаёт
+пул воркеров WebhookServer, Bot API заменён на FakeBotAPI, Google Sheets - на FakeSpreadsheet.
+Пользователь отвечает на то, что прислал бот: нажимает кнопку клавиатуры, делится контактом
+или вводит текст, пока бот не вернёт главное меню или не закончится лимит шагов.
+
+Запуск: python -m benchmarks.load_test --users 200 --think 0.2 --api-latency 0.05
+"""
+import argparse
+import gc
+import json
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows: модуля resource нет, память считается только через tracemalloc
+    resource = None
+
+# Настройки окружения должны быть заданы до импорта модулей бота
+os.environ.setdefault("STORAGE_MODE", "local")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-load-"), "bot.db"))
+os.environ.setdefault("METRICS_PORT", "0")
+
+from telebot import apihelper
+import database
+from benchmarks.fakes import FakeBotAPI, FakeSpreadsheet
+from keyboards import MainMenuKeyboard
+from webhook import WebhookServer
+
+START_CHAT_ID = 100_000_000
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def buttons(markup: Optional[str]) -> List[Dict[str, Any]]:
+    """Кнопки клавиатуры из параметра reply_markup отправленного сообщения"""
+    if not markup:
+        return []
+    data = json.loads(markup)
+    rows = data.get("keyboard") or data.get("inline_keyboard") or []
+    return [button if isinstance(button, dict) else {"text": button} for row in rows for button in row]
+
+class SyntheticUser:
+    """Пользователь, который проходит диалог с ботом и замеряет задержку каждого шага"""
+
+    def __init__(self, harness: "LoadTest", index: int):
+        self.harness = harness
+        self.index = index
+        self.chat_id = START_CHAT_ID + index
+        self.rng = random.Random(index)
+        self.inbox = harness.api.inbox(self.chat_id)
+        self.latencies: List[float] = []
+        self.steps = 0
+        self.completed = False
+        self.stalled = False
+        self._update_id = 0
+
+    def _update(self, payload: Dict[str, Any]) -> None:
+        self._update_id += 1
+        body = json.dumps({"update_id": self.chat_id * 1000 + self._update_id, **payload}).encode()
+        self.harness.server.submit(body)
+
+    def _message(self, **fields) -> Dict[str, Any]:
+        user = {"id": self.chat_id, "is_bot": False, "first_name": f"User{self.index}"}
+        return {"message": {
+            "message_id": self._update_id + 1,
+            "date": int(time.time()),
+            "chat": {"id": self.chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            **fields
+        }}
+
+    def send_text(self, text: str) -> None:
+        fields: Dict[str, Any] = {"text": text}
+        if text.startswith("/"):
+            fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._update(self._message(**fields))
+
+    def send_contact(self) -> None:
+        self._update(self._message(contact={
+            "phone_number": f"+380{self.chat_id % 1_000_000_000:09d}",
+            "first_name": f"User{self.index}",
+            "user_id": self.chat_id
+        }))
+
+    def press_inline(self, button: Dict[str, Any], message_id: int) -> None:
+        message = self._message(text="")["message"]
+        message["message_id"] = message_id
+        self._update({"callback_query": {
+            "id": str(self._update_id),
+            "from": message["from"],
+            "message": message,
+            "chat_instance": str(self.chat_id),
+            "data": button.get("callback_data", "")
+        }})
+
+    def _receive(self) -> List[Dict[str, Any]]:
+        """Ответ бота на шаг: первое сообщение по таймауту, затем всё, что пришло следом"""
+        settle = self.harness.args.settle
+        messages = [self.inbox.get(timeout=self.harness.args.reply_timeout)]
+        while True:
+            try:
+                messages.append(self.inbox.get(timeout=settle))
+            except queue.Empty:
+                return messages
+
+    def step(self, action) -> Optional[List[Dict[str, Any]]]:
+        started = time.perf_counter()
+        action()
+        try:
+            messages = self._receive()
+        except queue.Empty:
+            self.stalled = True
+            return None
+        # Задержка шага - до получения первого ответа фейковым API; ожидание хвоста ответа в неё не входит
+        self.latencies.append(messages[0]["_received"] - started)
+        self.steps += 1
+        return messages
+
+    def run(self) -> None:
+        main_menu = set(MainMenuKeyboard.BUTTONS)
+        messages = self.step(lambda: self.send_text("/start"))
+        in_test = False
+        while messages is not None and self.steps < self.harness.args.max_steps:
+            if self.harness.args.think:
+                time.sleep(self.rng.uniform(0, self.harness.args.think))
+
+            last = messages[-1]
+            options = buttons(last.get("reply_markup"))
+            labels = {button.get("text") for button in options}
+            if labels and labels <= main_menu:
+                if in_test:
+                    self.completed = True
+                    return
+                in_test = True
+                button = next((b for b in options if b["text"] == MainMenuKeyboard.BUTTONS[0]), options[0])
+                messages = self.step(lambda: self.send_text(button["text"]))
+            elif any(button.get("request_contact") for button in options):
+                messages = self.step(self.send_contact)
+            elif options and "callback_data" in options[0]:
+                button = self.rng.choice(options)
+                message_id = int(last.get("_message_id", 0))
+                messages = self.step(lambda: self.press_inline(button, message_id))
+            elif options:
+                button = self.rng.choice(options)
+                messages = self.step(lambda: self.send_text(button["text"]))
+            else:
+                in_test = True
+                messages = self.step(lambda: self.send_text(f"Load Test User {self.index}"))
+        self.completed = messages is not None
+
+class LoadTest:
+    """Сборка бота на фейковых Bot API и Google Sheets и запуск пользователей"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.api = FakeBotAPI(latency=args.api_latency).start()
+        apihelper.API_URL = self.api.api_url
+
+        # Хранилище: локальная SQLite и зеркало в таблицу в памяти с задержкой API
+        self.spreadsheet = FakeSpreadsheet(latency=args.sheets_latency)
+        self.spreadsheet.sheet1.append_rows([database.SHEET_HEADERS])
+        database.db = database.MirroredStorage(
+            database.LocalStorage(database.bot_config.DB_PATH),
+            database.GoogleSheetsManager(sheet=self.spreadsheet.sheet1)
+        )
+
+        # Модули обработчиков импортируются после подмены хранилища
+        import main
+        from utils.dedup import DedupTeleBot
+        from utils.sender import configure_http_pool
+        configure_http_pool(database.bot_config.HTTP_POOL_SIZE)
+        self.bot = DedupTeleBot("123456:LOAD-TEST", threaded=False)
+        main.register_handlers(main.prepare_bot(self.bot))
+        self.server = WebhookServer(
+            self.bot, "127.0.0.1", 0,
+            workers=database.bot_config.WEBHOOK_WORKERS,
+            queue_size=database.bot_config.WEBHOOK_QUEUE_SIZE
+        )
+        self.server.start()
+
+    def run(self) -> Dict[str, Any]:
+        users = [SyntheticUser(self, i) for i in range(self.args.users)]
+        threads = [threading.Thread(target=user.run, name=f"user-{user.index}", daemon=True) for user in users]
+
+        gc.collect()
+        trace = self.args.tracemalloc or resource is None
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        traced = tracemalloc.get_traced_memory()[1] if trace else 0
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+
+        latencies = [latency for user in users for latency in user.latencies]
+        steps = sum(user.steps for user in users)
+        return {
+            "users": len(users),
+            "completed": sum(user.completed for user in users),
+            "stalled": sum(user.stalled for user in users),
+            "steps": steps,
+            "elapsed": elapsed,
+            "steps_per_sec": steps / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            # ru_maxrss в Linux - в килобайтах
+            "rss_per_session_kb": (rss_after - rss_before) / len(users) if users and resource else None,
+            "traced_per_session_kb": traced / 1024 / len(users) if traced else None,
+            "api_calls": dict(self.api.calls),
+            "sheets_calls": dict(self.spreadsheet.calls)
+        }
+
+    def close(self) -> None:
+        self.server.stop()
+        database.db.close()
+        self.api.stop()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота без сети")
+    parser.add_argument("--users", type=int, default=100, help="число одновременных пользователей")
+    parser.add_argument("--think", type=float, default=0.0, help="максимальная пауза пользователя между шагами, с")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа фейкового Bot API, с")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="задержка вызовов фейкового Google Sheets, с")
+    parser.add_argument("--max-steps", type=int, default=60, help="лимит шагов одного пользователя")
+    parser.add_argument("--reply-timeout", type=float, default=10.0, help="сколько ждать ответа бота, с")
+    parser.add_argument("--settle", type=float, default=0.05, help="ожидание остальных сообщений ответа, с")
+    parser.add_argument("--tracemalloc", action="store_true", help="точный учёт памяти (заметно замедляет бота; в Windows включён всегда)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        harness = LoadTest(args)
+    except ImportError as e:
+        print(f"❌ Не удалось собрать бота: {e}", file=sys.stderr)
+        return 1
+    try:
+        result = harness.run()
+    finally:
+        harness.close()
+
+    print(f"пользователей: {result['users']}, завершили: {result['completed']}, зависли: {result['stalled']}")
+    print(f"шагов: {result['steps']} за {result['elapsed']:.2f} с ({result['steps_per_sec']:.1f} шаг/с)")
+    print(f"задержка шага: p50 {result['p50_ms']:.1f} мс, p95 {result['p95_ms']:.1f} мс, p99 {result['p99_ms']:.1f} мс")
+    memory = []
+    if result["rss_per_session_kb"] is not None:
+        memory.append(f"{result['rss_per_session_kb']:.1f} КБ RSS")
+    if result["traced_per_session_kb"]:
+        memory.append(f"{result['traced_per_session_kb']:.1f} КБ tracemalloc")
+    print(f"память на сессию: {', '.join(memory) or 'нет данных'}")
+    print(f"вызовы Bot API: {result['api_calls']}")
+    print(f"вызовы Google Sheets: {result['sheets_calls']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
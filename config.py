@@ -10,14 +10,68 @@ class BotConfig:
     """Конфигурация бота"""
     TOKEN: str = os.getenv("TOKEN", "")
     ADMIN_ID: str = os.getenv("ADMIN_ID", "")
+    BOT_USERNAME: str = os.getenv("BOT_USERNAME", "")
     GOOGLE_SHEETS_CREDS_FILE: str = "google_sheets.json"
     SPREADSHEET_NAME: str = "Stats"
+    # Хранилище лидов: local (только SQLite), sheets (только Google Sheets), mirror (SQLite + зеркало в Sheets)
+    STORAGE_MODE: str = os.getenv("STORAGE_MODE", "mirror")
+    DB_PATH: str = os.getenv("DB_PATH", "bot.db")
+    # Хранилище состояний диалогов: memory (LRU + TTL в памяти) или sqlite (переживает перезапуск)
+    STATE_STORE: str = os.getenv("STATE_STORE", "memory")
+    STATE_TTL: float = float(os.getenv("STATE_TTL", str(24 * 60 * 60)))
+    STATE_MAX_CHATS: int = int(os.getenv("STATE_MAX_CHATS", "100000"))
+    # Как часто (с) искать брошенные диалоги: состояние старше STATE_TTL и забытые обработчики следующего шага
+    SESSION_SWEEP_INTERVAL: float = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+    # Размер пула потоков для обработчиков в асинхронном режиме: столько чатов обрабатывается одновременно
+    ASYNC_HANDLER_WORKERS: int = int(os.getenv("ASYNC_HANDLER_WORKERS", "32"))
+    # Режим webhook
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "8"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    # Защита от повторной доставки: сколько последних обновлений помнить
+    DEDUP_SIZE: int = int(os.getenv("DEDUP_SIZE", "10000"))
+    # Многопроцессный режим: число процессов-воркеров (0 - один процесс) и очередь обновлений на воркер
+    SHARD_WORKERS: int = int(os.getenv("SHARD_WORKERS", "0"))
+    SHARD_QUEUE_SIZE: int = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+    # Отложенная запись в Google Sheets
+    SHEETS_FLUSH_INTERVAL: float = float(os.getenv("SHEETS_FLUSH_INTERVAL", "2.0"))
+    SHEETS_BATCH_SIZE: int = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+    SHEETS_ROW_RESYNC_EVERY: int = int(os.getenv("SHEETS_ROW_RESYNC_EVERY", "100"))
+    # Повторы доставки в Google Sheets: экспоненциальная пауза (с) и число попыток до dead-letter
+    OUTBOX_BACKOFF_BASE: float = float(os.getenv("OUTBOX_BACKOFF_BASE", "2.0"))
+    OUTBOX_BACKOFF_MAX: float = float(os.getenv("OUTBOX_BACKOFF_MAX", "600"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+    # Сколько дней хранить ключи доставленных строк для защиты от дублей
+    OUTBOX_RETENTION_DAYS: float = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+    # Очередь исходящих сообщений: лимиты Telegram (сообщений в секунду) и пул HTTP-соединений
+    OUTBOUND_SCHEDULER: bool = os.getenv("OUTBOUND_SCHEDULER", "0") == "1"
+    SEND_GLOBAL_RATE: float = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+    SEND_CHAT_RATE: float = float(os.getenv("SEND_CHAT_RATE", "1"))
+    SEND_CHAT_BURST: float = float(os.getenv("SEND_CHAT_BURST", "3"))
+    SEND_WORKERS: int = int(os.getenv("SEND_WORKERS", "4"))
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "16"))
+    # Учёт переходов по реферальным ссылкам: период (с) и размер пакета записи конверсий
+    REFERRAL_FLUSH_INTERVAL: float = float(os.getenv("REFERRAL_FLUSH_INTERVAL", "1.0"))
+    REFERRAL_BATCH_SIZE: int = int(os.getenv("REFERRAL_BATCH_SIZE", "500"))
+    # Эндпоинт метрик Prometheus (0 - не запускать)
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
 
 @dataclass
 class TestConfig:
     """Конфигурация теста"""
     MIN_QUESTIONS: int = 10
     PASS_PERCENTAGE: float = 50.0
+    # Адаптивный тест: минимум вопросов и уверенность в уровне для досрочного завершения
+    ADAPTIVE_MIN_QUESTIONS: int = 4
+    ADAPTIVE_CONFIDENCE: float = 0.85
+    QUESTIONS_FILE: str = os.getenv("QUESTIONS_FILE", "questions.jsonl")
+    # Период проверки изменений файла вопросов в секундах (0 - не отслеживать)
+    QUESTIONS_RELOAD_INTERVAL: float = float(os.getenv("QUESTIONS_RELOAD_INTERVAL", "0"))
     LEVELS: dict = None
 
     def __post_init__(self):
@@ -54,7 +108,20 @@ class UIConfig:
         "level": "📚"
     }
 
+@dataclass
+class LogConfig:
+    """Конфигурация логирования"""
+    # События пишутся в JSONL фоновым потоком; при ротации старые файлы сжимаются в .gz
+    FILE: str = os.getenv("LOG_FILE", "bot_log.jsonl")
+    LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # Событие на каждый вызов обработчика: chat_id, handler, latency_ms (для разбора задержек по логу)
+    HANDLER_EVENTS: bool = os.getenv("LOG_HANDLER_EVENTS", "0") == "1"
+
 # Создаем экземпляры конфигураций
 bot_config = BotConfig()
 test_config = TestConfig()
 ui_config = UIConfig()
+log_config = LogConfig()
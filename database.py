@@ -1,17 +1,444 @@
+import re
+import abc
 import json
-from typing import List, Dict, Any
+import time
+import random
+import sqlite3
+import atexit
+import threading
+import uuid
+from typing import List, Dict, Any, Optional
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from config import bot_config
+from levels import level_scale
 from utils.logger import get_logger
+from utils.metrics import metrics
 
 logger = get_logger(__name__)
 
-class GoogleSheetsManager:
+# Заголовки таблицы лидов и ширина столбцов (в пикселях)
+SHEET_HEADERS = [
+    "Дата та час",
+    "Ім'я",
+    "Telegram",
+    "Результат тесту",
+    "Відсоток",
+    "Рівень",
+    "Мета",
+    "Час на навчання",
+    "Бюджет",
+    "Формат",
+    "Спосіб оплати",
+    "Телефон"
+]
+
+COLUMN_WIDTHS = [150, 100, 120, 100, 80, 150, 200, 120, 100, 150, 120, 120]
+
+# Поля лида в локальном хранилище (в том же порядке, что и столбцы таблицы)
+LEAD_FIELDS = [
+    "created_at",
+    "name",
+    "telegram",
+    "result",
+    "percentage",
+    "level",
+    "goal",
+    "time",
+    "budget",
+    "format",
+    "payment",
+    "phone"
+]
+
+def build_lead_row(user_data: Dict[str, Any], test_results: Dict[str, Any]) -> List[str]:
+    """Подготовка строки лида из данных пользователя и результатов теста"""
+    return [
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        user_data.get('name', ''),
+        f"@{user_data.get('username', '')}" if user_data.get('username') else "Не вказано",
+        f"{test_results['correct']}/{test_results['total']}",
+        f"{test_results['percentage']:.1f}%",
+        test_results.get('level') or level_scale.level(test_results['percentage']).name,
+        user_data.get('goal', 'Не вказано'),
+        user_data.get('time', 'Не вказано'),
+        user_data.get('budget', 'Не вказано'),
+        user_data.get('format', 'Не вказано'),
+        user_data.get('payment', 'Не вказано'),
+        user_data.get('phone', 'Не вказано')
+    ]
+
+def lead_key(user_data: Dict[str, Any]) -> Optional[str]:
+    """Ключ идемпотентности лида: явный или по чату и прохождению теста (chat_id, session_id)"""
+    key = user_data.get("idempotency_key")
+    if key is None and user_data.get("chat_id") and user_data.get("session_id"):
+        # Отложенный импорт: utils.dedup сам импортирует database
+        from utils.dedup import idempotency_key
+        key = idempotency_key("complete", user_data["chat_id"], user_data["session_id"])
+    return key
+
+class SQLitePool:
+    """Пул соединений SQLite: одно соединение на поток, режим WAL"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (создаётся при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Кэш скомпилированных запросов переиспользует подготовленные выражения
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Закрытие всех соединений пула"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error("❌ Ошибка закрытия соединения SQLite: %s", e)
+            self._connections.clear()
+        self._local = threading.local()
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path: Optional[str] = None) -> SQLitePool:
+    """Общий пул соединений для файла базы"""
+    path = path or bot_config.DB_PATH
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = SQLitePool(path)
+        return _pools[path]
+
+def get_db_connection() -> sqlite3.Connection:
+    """Соединение с локальной базой для текущего потока"""
+    return get_pool().connection()
+
+class StorageBackend(abc.ABC):
+    """Базовый интерфейс хранилища лидов"""
+
+    @abc.abstractmethod
+    def save_user_data(self, user_data: Dict[str, Any], test_results: Dict[str, Any]) -> None:
+        """Сохранение данных пользователя"""
+
+    @abc.abstractmethod
+    def get_leads(self, limit: int = 100, offset: int = 0) -> List[Dict[str, str]]:
+        """Последние лиды, от новых к старым"""
+
+    @abc.abstractmethod
+    def count_leads(self) -> int:
+        """Общее количество лидов"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики для мониторинга"""
+        return {}
+
+    @property
+    def ready(self) -> bool:
+        """Подключено ли хранилище (запись принимается и до готовности)"""
+        return True
+
+    def warm_up(self) -> None:
+        """Подключение к внешним сервисам в фоне, не задерживая запуск бота"""
+
+    @property
+    def outbox(self) -> Optional["SheetsOutbox"]:
+        """Очередь доставки в Google Sheets, если хранилище её использует"""
+        return None
+
+    def close(self) -> None:
+        """Освобождение ресурсов при остановке"""
+
+class SheetsOutbox:
+    """Надёжная очередь записи в Google Sheets: строка сначала фиксируется в SQLite, затем доставляется в фоне"""
+
+    CREATE_SQL = """
+        CREATE TABLE IF NOT EXISTS sheets_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            row TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            delivered_at REAL
+        )
+    """
+    # Недоставленные строки, от которых очередь отказалась после OUTBOX_MAX_ATTEMPTS попыток
+    CREATE_DEAD_VIEW_SQL = """
+        CREATE VIEW IF NOT EXISTS sheets_outbox_dead AS
+        SELECT id, idempotency_key, attempts, last_error, created_at, row
+        FROM sheets_outbox WHERE status = 'dead'
+    """
+    INSERT_SQL = """
+        INSERT OR IGNORE INTO sheets_outbox (idempotency_key, row, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?)
+    """
+    DUE_SQL = """
+        SELECT id, row, attempts FROM sheets_outbox
+        WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?
+    """
+    # Время, на которое пакет закрепляется за процессом, который его отправляет
+    LEASE = 300
+
+    def __init__(self, manager: "GoogleSheetsManager", path: str, flush_interval: float, batch_size: int):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pool = get_pool(path)
+        conn = self.pool.connection()
+        conn.execute(self.CREATE_SQL)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sheets_outbox_due ON sheets_outbox (status, next_attempt_at)")
+        conn.execute(self.CREATE_DEAD_VIEW_SQL)
+        conn.commit()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending_since_flush = 0
+        # После неудачной доставки пауза общая для всей очереди: новые строки не долбят недоступный API
+        self._consecutive_failures = 0
+        self._paused_until = 0.0
+
+        # Счётчики для мониторинга
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_written = 0
+        self.duplicates = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+
+        self._thread = None
+        metrics.gauge("bot_sheets_queue_depth", "Строки в очереди записи в Google Sheets", self.pending_count)
+        metrics.gauge("bot_sheets_dead_letters", "Строки, от доставки которых очередь отказалась", self.dead_count)
+
+    def start(self) -> None:
+        """Запуск фоновой доставки"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def put(self, row: List[str], key: Optional[str] = None) -> bool:
+        """Зафиксировать строку в очереди; False, если строка с таким ключом уже есть.
+
+        Повторы отсеиваются только по ключу лида (lead_key): одинаковые строки
+        разных пользователей, сохранённые в одну секунду, - разные лиды, и без ключа каждая получает свой.
+        """
+        conn = self.pool.connection()
+        with conn:
+            is_new = self.insert(conn, row, key)
+        self.accepted(is_new)
+        return is_new
+
+    def insert(self, conn: sqlite3.Connection, row: List[str], key: Optional[str] = None) -> bool:
+        """Вставка строки в транзакции вызывающего (фиксирует он же, затем вызывает accepted)"""
+        if self._stop.is_set():
+            raise RuntimeError("Очередь записи в Google Sheets уже остановлена")
+        now = time.time()
+        cursor = conn.execute(self.INSERT_SQL, (
+            key or uuid.uuid4().hex, json.dumps(row, ensure_ascii=False), now, now
+        ))
+        return bool(cursor.rowcount)
+
+    def accepted(self, is_new: bool) -> None:
+        """Учёт зафиксированной строки: полный пакет будит поток доставки"""
+        if not is_new:
+            self.duplicates += 1
+            return
+        self._pending_since_flush += 1
+        if self._pending_since_flush >= self.batch_size:
+            self._wake.set()
+
+    def _claim(self) -> List[tuple]:
+        """Пакет строк, срок которых подошёл, с арендой на LEASE секунд"""
+        # База может быть общей для нескольких процессов (воркеры sharded): срок следующей попытки
+        # сдвигается в той же транзакции, и другой процесс не отправит эти строки повторно.
+        # Если процесс упадёт посреди записи, строки вернутся в доставку по истечении аренды
+        conn = self.pool.connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            batch = conn.execute(self.DUE_SQL, (now, self.batch_size)).fetchall()
+            if batch:
+                conn.execute(
+                    f"UPDATE sheets_outbox SET next_attempt_at = ? WHERE id IN ({', '.join('?' for _ in batch)})",
+                    (now + self.LEASE, *(row_id for row_id, _, _ in batch))
+                )
+        return batch
+
+    def _backoff(self, attempts: int) -> float:
+        """Пауза перед следующей попыткой: экспоненциальная с разбросом, не больше OUTBOX_BACKOFF_MAX"""
+        delay = min(bot_config.OUTBOX_BACKOFF_MAX, bot_config.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _wait_time(self) -> float:
+        """Сколько ждать до следующей строки, которую пора доставлять"""
+        pause = self._paused_until - time.time()
+        if pause > 0:
+            return pause
+        next_attempt = self.pool.connection().execute(
+            "SELECT MIN(next_attempt_at) FROM sheets_outbox WHERE status = 'pending'"
+        ).fetchone()[0]
+        if next_attempt is None:
+            return self.flush_interval
+        return min(max(next_attempt - time.time(), 0.0), self.flush_interval)
+
+    def _run(self) -> None:
+        """Фоновый цикл доставки"""
+        last_purge = 0.0
+        while not self._stop.is_set():
+            # Пока ждём, новые строки набираются в пакет; полный пакет будит поток сразу
+            wait = self._wait_time()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            try:
+                self.flush()
+                if time.time() - last_purge > 3600:
+                    self.purge_delivered(bot_config.OUTBOX_RETENTION_DAYS * 24 * 60 * 60)
+                    last_purge = time.time()
+            except sqlite3.Error as e:
+                logger.error("❌ Ошибка очереди записи в Google Sheets: %s", e)
+                self._stop.wait(self.flush_interval)
+
+    def flush(self) -> int:
+        """Доставка одного пакета строк, срок которых подошёл; возвращает число записанных строк"""
+        batch = self._claim()
+        self._pending_since_flush = 0
+        if not batch:
+            return 0
+
+        ids = [row_id for row_id, _, _ in batch]
+        started = time.perf_counter()
+        conn = self.pool.connection()
+        try:
+            self.manager._append_rows([json.loads(row) for _, row, _ in batch])
+        except Exception as e:
+            self.failed_flushes += 1
+            self._consecutive_failures += 1
+            self._paused_until = time.time() + self._backoff(self._consecutive_failures)
+            # Клиент и учётные данные сохраняются, при следующей попытке заново открывается только таблица
+            self.manager.reset()
+            now = time.time()
+            updates = []
+            for row_id, _, attempts in batch:
+                attempts += 1
+                status = "dead" if attempts >= bot_config.OUTBOX_MAX_ATTEMPTS else "pending"
+                updates.append((status, attempts, now + self._backoff(attempts), str(e)[:500], row_id))
+            with conn:
+                conn.executemany(
+                    "UPDATE sheets_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    updates
+                )
+            dead = sum(1 for update in updates if update[0] == "dead")
+            logger.error("❌ Ошибка пакетной записи (%s строк), повтор позже, в dead-letter: %s: %s",
+                         len(batch), dead, e)
+            return 0
+
+        with conn:
+            conn.execute(
+                f"UPDATE sheets_outbox SET status = 'delivered', delivered_at = ? "
+                f"WHERE id IN ({', '.join('?' for _ in ids)})",
+                (time.time(), *ids)
+            )
+        latency = time.perf_counter() - started
+        self._consecutive_failures = 0
+        self.flushes += 1
+        self.rows_written += len(batch)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._total_flush_latency += latency
+        logger.info("✅ Записано строк в Google Sheets: %s за %.0f мс", len(batch), latency * 1000)
+        return len(batch)
+
+    def purge_delivered(self, older_than: float) -> int:
+        """Удаление доставленных строк старше older_than секунд (ключи нужны только для защиты от дублей)"""
+        conn = self.pool.connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM sheets_outbox WHERE status = 'delivered' AND delivered_at < ?",
+                (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def pending_count(self) -> int:
+        return self.pool.connection().execute(
+            "SELECT COUNT(*) FROM sheets_outbox WHERE status = 'pending'"
+        ).fetchone()[0]
+
+    def dead_count(self) -> int:
+        return self.pool.connection().execute("SELECT COUNT(*) FROM sheets_outbox_dead").fetchone()[0]
+
+    def dead_letters(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние строки из dead-letter с причиной отказа"""
+        rows = self.pool.connection().execute(
+            "SELECT id, attempts, last_error, created_at, row FROM sheets_outbox_dead ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [
+            {"id": row_id, "attempts": attempts, "last_error": error, "created_at": created_at, "row": json.loads(row)}
+            for row_id, attempts, error, created_at, row in rows
+        ]
+
+    def retry_dead(self) -> int:
+        """Вернуть строки из dead-letter в очередь доставки"""
+        conn = self.pool.connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE sheets_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'",
+                (time.time(),)
+            )
+        self._paused_until = 0.0
+        self._wake.set()
+        return cursor.rowcount
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Остановить фоновую доставку; недоставленные строки остаются в базе до следующего запуска"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Последняя попытка без ожидания, если таблица доступна
+        if self.manager.ready:
+            try:
+                while self.flush():
+                    pass
+            except Exception as e:
+                logger.error("❌ Ошибка записи в Google Sheets при остановке: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики очереди и задержки записи"""
+        return {
+            "queue_depth": self.pending_count(),
+            "dead_letters": self.dead_count(),
+            "duplicates": self.duplicates,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_latency * 1000,
+            "avg_flush_ms": self._total_flush_latency / self.flushes * 1000 if self.flushes else 0.0,
+            "max_flush_ms": self.max_flush_latency * 1000,
+        }
+
+class GoogleSheetsManager(StorageBackend):
     """Менеджер для работы с Google Sheets"""
     
-    def __init__(self):
+    def __init__(self, sheet=None, outbox_path: Optional[str] = None):
         self.scope = [
             "https://spreadsheets.google.com/feeds",
             "https://www.googleapis.com/auth/spreadsheets",
@@ -19,181 +446,442 @@ class GoogleSheetsManager:
             "https://www.googleapis.com/auth/drive"
         ]
         self.client = None
+        self.creds = None
         self.sheet = None
-        self._connect()
+        # Номер последней заполненной строки (кэш вместо чтения всей таблицы)
+        self._last_row = None
+        self._appends_since_sync = 0
+        self._headers_ready = False
+        # Состояние подключения: cold, connecting, ready или failed; подключаемся при первой записи или в warm_up
+        self.state = "cold"
+        self._connect_lock = threading.Lock()
+        if sheet is not None:
+            self.sheet = sheet
+            self._ensure_headers()
+            self.state = "ready"
+        self.writer = SheetsOutbox(
+            self,
+            path=outbox_path or bot_config.DB_PATH,
+            flush_interval=bot_config.SHEETS_FLUSH_INTERVAL,
+            batch_size=bot_config.SHEETS_BATCH_SIZE
+        )
+        self.writer.start()
+        metrics.gauge("bot_sheets_ready", "Подключение к Google Sheets установлено", lambda: self.ready)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def outbox(self) -> "SheetsOutbox":
+        return self.writer
     
     def _connect(self) -> None:
         """Подключение к Google Sheets"""
+        # Клиенты Google импортируются только при подключении: они заметно замедляют запуск
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        self.state = "connecting"
         try:
-            with open(bot_config.GOOGLE_SHEETS_CREDS_FILE, "r") as file:
-                creds_dict = json.load(file)
-            
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, self.scope)
-            self.client = gspread.authorize(creds)
+            # Учётные данные и авторизованный клиент создаются один раз, токен обновляется сам
+            if self.client is None:
+                with open(bot_config.GOOGLE_SHEETS_CREDS_FILE, "r") as file:
+                    creds_dict = json.load(file)
+                
+                self.creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, self.scope)
+                self.client = gspread.authorize(self.creds)
             self.sheet = self.client.open(bot_config.SPREADSHEET_NAME).sheet1
+            self._last_row = None
             
             logger.info("✅ Подключение к Google Sheets успешно установлено")
+
+            self._ensure_headers()
+            self.state = "ready"
         except Exception as e:
-            logger.error(f"❌ Ошибка подключения к Google Sheets: {e}")
+            self.state = "failed"
+            logger.error("❌ Ошибка подключения к Google Sheets: %s", e)
             raise
+
+    def _get_sheet(self):
+        """Лист таблицы; подключение при первом обращении"""
+        if self.sheet is None:
+            with self._connect_lock:
+                if self.sheet is None:
+                    self._connect()
+        return self.sheet
+
+    def warm_up(self) -> None:
+        def connect():
+            try:
+                self._get_sheet()
+            except Exception:
+                # Ошибка уже записана в лог; очередь записи подключится повторно при сбросе пакета
+                pass
+
+        threading.Thread(target=connect, name="sheets-warm-up", daemon=True).start()
+
+    def reset(self) -> None:
+        """Сброс открытой таблицы после ошибки (клиент и учётные данные переиспользуются)"""
+        with self._connect_lock:
+            if self.client is not None:
+                self.sheet = None
+                self._last_row = None
+                # Таблицу могли очистить или пересоздать: заголовки проверяются заново при переподключении
+                self._headers_ready = False
+                self.state = "cold"
     
     def _ensure_headers(self) -> None:
-        """Проверка и создание заголовков таблицы"""
-        headers = [
-            "Дата та час",
-            "Ім'я",
-            "Telegram",
-            "Результат тесту",
-            "Відсоток",
-            "Рівень",
-            "Мета",
-            "Час на навчання",
-            "Бюджет",
-            "Формат",
-            "Спосіб оплати",
-            "Телефон"
-        ]
-        
+        """Проверка и создание заголовков таблицы (один раз при подключении)"""
+        if self._headers_ready:
+            return
+
         try:
             existing_headers = self.sheet.row_values(1)
             if not existing_headers:
-                self.sheet.append_row(headers)
-                self._format_headers()
+                self._create_headers()
+            elif existing_headers != SHEET_HEADERS:
+                logger.warning("⚠️ Заголовки таблицы отличаются от ожидаемых: %s", existing_headers)
+            self._headers_ready = True
         except Exception as e:
-            logger.error(f"❌ Ошибка при проверке заголовков: {e}")
+            logger.error("❌ Ошибка при проверке заголовков: %s", e)
             raise
     
-    def _format_headers(self) -> None:
-        """Форматирование заголовков таблицы"""
-        try:
+    def _create_headers(self) -> None:
+        """Создание и форматирование заголовков таблицы одним batch-update"""
+        sheet_id = self.sheet.id
+        header_format = {
+            "backgroundColor": {"red": 0.2, "green": 0.2, "blue": 0.2},
+            "textFormat": {"foregroundColor": {"red": 1, "green": 1, "blue": 1}, "bold": True},
+            "horizontalAlignment": "CENTER"
+        }
+
+        requests = [
+            # Текст заголовков
+            {
+                "updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": header}} for header in SHEET_HEADERS]}],
+                    "fields": "userEnteredValue"
+                }
+            },
             # Форматирование заголовков
-            header_format = {
-                "backgroundColor": {"red": 0.2, "green": 0.2, "blue": 0.2},
-                "textFormat": {"foregroundColor": {"red": 1, "green": 1, "blue": 1}, "bold": True},
-                "horizontalAlignment": "CENTER"
+            {
+                "repeatCell": {
+                    "range": {
+                        "sheetId": sheet_id,
+                        "startRowIndex": 0,
+                        "endRowIndex": 1,
+                        "startColumnIndex": 0,
+                        "endColumnIndex": len(SHEET_HEADERS)
+                    },
+                    "cell": {"userEnteredFormat": header_format},
+                    "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)"
+                }
             }
-            
-            self.sheet.format("A1:L1", header_format)
-            
-            # Установка ширины столбцов
-            column_widths = {
-                "A": 150,  # Дата та час
-                "B": 100,  # Ім'я
-                "C": 120,  # Telegram
-                "D": 100,  # Результат тесту
-                "E": 80,   # Відсоток
-                "F": 150,  # Рівень
-                "G": 200,  # Мета
-                "H": 120,  # Час на навчання
-                "I": 100,  # Бюджет
-                "J": 150,  # Формат
-                "K": 120,  # Спосіб оплати
-                "L": 120   # Телефон
-            }
-            
-            for col, width in column_widths.items():
-                self.sheet.set_column_width(col, width)
-                
+        ]
+
+        # Ширина столбцов
+        for index, width in enumerate(COLUMN_WIDTHS):
+            requests.append({
+                "updateDimensionProperties": {
+                    "range": {"sheetId": sheet_id, "dimension": "COLUMNS", "startIndex": index, "endIndex": index + 1},
+                    "properties": {"pixelSize": width},
+                    "fields": "pixelSize"
+                }
+            })
+
+        try:
+            self.sheet.spreadsheet.batch_update({"requests": requests})
+            logger.info("✅ Заголовки таблицы созданы")
         except Exception as e:
-            logger.error(f"❌ Ошибка форматирования заголовков: {e}")
+            logger.error("❌ Ошибка создания заголовков: %s", e)
             raise
     
+    @metrics.timed("call", "sheets.append_rows")
+    def _append_rows(self, rows: List[List[str]]) -> None:
+        """Запись пакета строк одним запросом и форматирование одним batch-update"""
+        self._get_sheet()
+        # Обычно уже проверено при подключении, повторно только после ошибки
+        self._ensure_headers()
+
+        # Добавление данных
+        response = self.sheet.append_rows(rows)
+
+        # Форматирование новых строк
+        last_row = self._track_last_row(response, len(rows))
+        first_row = last_row - len(rows) + 1
+        row_format = {
+            "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.95},
+            "horizontalAlignment": "CENTER",
+            "textFormat": {"foregroundColor": {"red": 0, "green": 0, "blue": 0}}
+        }
+
+        self.sheet.format(f"A{first_row}:L{last_row}", row_format)
+
+    @staticmethod
+    def _parse_last_row(response: Any) -> Any:
+        """Номер последней строки из ответа append (updates.updatedRange, например 'Stats'!A5:L7)"""
+        try:
+            updated_range = response["updates"]["updatedRange"]
+        except (TypeError, KeyError):
+            return None
+        match = re.search(r"(\d+)$", updated_range)
+        return int(match.group(1)) if match else None
+
+    def _track_last_row(self, response: Any, appended: int) -> int:
+        """Обновить кэш номера последней строки после добавления строк"""
+        last_row = self._parse_last_row(response)
+        if last_row is not None:
+            self._last_row = last_row
+            self._appends_since_sync = 0
+            return last_row
+
+        # Ответ без диапазона: ведём счётчик сами и периодически сверяемся с таблицей
+        if self._last_row is None or self._appends_since_sync >= bot_config.SHEETS_ROW_RESYNC_EVERY:
+            self._last_row = len(self.sheet.col_values(1))
+            self._appends_since_sync = 0
+        else:
+            self._last_row += appended
+            self._appends_since_sync += 1
+        return self._last_row
+
+    @metrics.timed("call", "sheets.save_user_data")
     def save_user_data(self, user_data: Dict[str, Any], test_results: Dict[str, Any]) -> None:
-        """Сохранение данных пользователя в таблицу"""
+        """Сохранение данных пользователя в таблицу (через очередь отложенной записи)"""
+        row_data = build_lead_row(user_data, test_results)
+        self.writer.put(row_data, lead_key(user_data))
+        logger.info("✅ Данные поставлены в очередь записи для пользователя %s", user_data.get('name', 'Unknown'))
+
+    def get_leads(self, limit: int = 100, offset: int = 0) -> List[Dict[str, str]]:
+        """Последние лиды из таблицы (читает весь лист, только для отладки)"""
+        rows = self._get_sheet().get_all_values()[1:]
+        rows.reverse()
+        return [dict(zip(LEAD_FIELDS, row)) for row in rows[offset:offset + limit]]
+
+    def count_leads(self) -> int:
+        """Количество строк с данными (без заголовка)"""
+        return max(len(self._get_sheet().col_values(1)) - 1, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики очереди записи в Google Sheets"""
+        return self.writer.stats()
+
+    def close(self) -> None:
+        """Дописать очередь и остановить фоновую запись"""
+        self.writer.close()
+
+class LocalStorage(StorageBackend):
+    """Локальное хранилище лидов в SQLite (режим WAL)"""
+
+    INSERT_SQL = f"INSERT INTO leads ({', '.join(LEAD_FIELDS)}) VALUES ({', '.join('?' for _ in LEAD_FIELDS)})"
+    SELECT_SQL = f"SELECT {', '.join(LEAD_FIELDS)} FROM leads ORDER BY id DESC LIMIT ? OFFSET ?"
+
+    def __init__(self, path: str):
+        self.pool = get_pool(path)
+        columns = ", ".join(f"{field} TEXT" for field in LEAD_FIELDS)
+        conn = self.pool.connection()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        conn.commit()
+        self.rows_written = 0
+
+    def save_row(self, row: List[str]) -> None:
+        """Запись готовой строки лида"""
+        conn = self.pool.connection()
+        with conn:
+            self.insert(conn, row)
+        self.rows_written += 1
+
+    def insert(self, conn: sqlite3.Connection, row: List[str]) -> None:
+        """Вставка строки лида в транзакции вызывающего"""
+        conn.execute(self.INSERT_SQL, row)
+
+    @metrics.timed("call", "local.save_user_data")
+    def save_user_data(self, user_data: Dict[str, Any], test_results: Dict[str, Any]) -> None:
+        """Сохранение данных пользователя в локальную базу"""
+        self.save_row(build_lead_row(user_data, test_results))
+        logger.info("✅ Данные сохранены локально для пользователя %s", user_data.get('name', 'Unknown'))
+
+    def get_leads(self, limit: int = 100, offset: int = 0) -> List[Dict[str, str]]:
+        """Последние лиды, от новых к старым"""
+        rows = self.pool.connection().execute(self.SELECT_SQL, (limit, offset)).fetchall()
+        return [dict(zip(LEAD_FIELDS, row)) for row in rows]
+
+    def count_leads(self) -> int:
+        """Общее количество лидов"""
+        return self.pool.connection().execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики локального хранилища"""
+        return {"rows_written": self.rows_written}
+
+    def close(self) -> None:
+        """Закрытие соединений с базой"""
+        self.pool.close()
+
+class MirroredStorage(StorageBackend):
+    """Локальное хранилище с асинхронным зеркалом в Google Sheets"""
+
+    def __init__(self, local: LocalStorage, mirror: GoogleSheetsManager):
+        # Лид и строка очереди пишутся одной транзакцией, поэтому обе таблицы в одном файле
+        if local.pool is not mirror.writer.pool:
+            raise ValueError("Локальная база и очередь Google Sheets должны быть в одном файле")
+        self.local = local
+        self.mirror = mirror
+
+    @metrics.timed("call", "mirror.save_user_data")
+    def save_user_data(self, user_data: Dict[str, Any], test_results: Dict[str, Any]) -> None:
+        """Запись в локальную базу и постановка строки в очередь зеркала одной транзакцией"""
+        row_data = build_lead_row(user_data, test_results)
+        writer = self.mirror.writer
+        conn = self.local.pool.connection()
         try:
-            self._ensure_headers()
-            
-            # Подготовка данных
-            row_data = [
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                user_data.get('name', ''),
-                f"@{user_data.get('username', '')}" if user_data.get('username') else "Не вказано",
-                f"{test_results['correct']}/{test_results['total']}",
-                f"{test_results['percentage']:.1f}%",
-                test_results['level'],
-                user_data.get('goal', 'Не вказано'),
-                user_data.get('time', 'Не вказано'),
-                user_data.get('budget', 'Не вказано'),
-                user_data.get('format', 'Не вказано'),
-                user_data.get('payment', 'Не вказано'),
-                user_data.get('phone', 'Не вказано')
-            ]
-            
-            # Добавление данных
-            self.sheet.append_row(row_data)
-            
-            # Форматирование новой строки
-            last_row = len(self.sheet.get_all_values())
-            row_format = {
-                "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.95},
-                "horizontalAlignment": "CENTER",
-                "textFormat": {"foregroundColor": {"red": 0, "green": 0, "blue": 0}}
-            }
-            
-            self.sheet.format(f"A{last_row}:L{last_row}", row_format)
-            
-            logger.info(f"✅ Данные успешно сохранены для пользователя {user_data.get('name', 'Unknown')}")
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения данных: {e}")
-            # Пробуем переподключиться и повторить
-            self._connect()
-            try:
-                self.sheet.append_row(row_data)
-                logger.info("✅ Данные успешно сохранены после переподключения")
-            except Exception as e:
-                logger.error(f"❌ Повторная ошибка сохранения данных: {e}")
-                raise
-
-    def create_tables(self):
-        """Создание необходимых таблиц в базе данных"""
-        create_tables_queries = [
-            # Существующие таблицы
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE,
-                username TEXT,
-                first_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            
-            # Новые таблицы для реферальной системы
-            """
-            CREATE TABLE IF NOT EXISTS referral_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                partner_id INTEGER NOT NULL,
-                code TEXT UNIQUE NOT NULL,
-                platform TEXT NOT NULL,
-                theme TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            
-            """
-            CREATE TABLE IF NOT EXISTS conversions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                partner_id INTEGER NOT NULL,
-                code TEXT NOT NULL,
-                platform TEXT NOT NULL,
-                event_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (code) REFERENCES referral_codes(code)
-            )
-            """
-        ]
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
+            with conn:
+                is_new = writer.insert(conn, row_data, lead_key(user_data))
+                if is_new:
+                    self.local.insert(conn, row_data)
+        except RuntimeError as e:
+            # Очередь уже остановлена (завершение работы): лид сохраняется хотя бы локально
+            logger.error("❌ Не удалось поставить строку в очередь Google Sheets: %s", e)
+            self.local.save_row(row_data)
+            return
+        writer.accepted(is_new)
+        if not is_new:
+            logger.info("✅ Повторное сохранение лида пропущено для пользователя %s", user_data.get('name', 'Unknown'))
+            return
+        self.local.rows_written += 1
+        logger.info("✅ Данные сохранены для пользователя %s", user_data.get('name', 'Unknown'))
+
+    def get_leads(self, limit: int = 100, offset: int = 0) -> List[Dict[str, str]]:
+        return self.local.get_leads(limit, offset)
+
+    def count_leads(self) -> int:
+        return self.local.count_leads()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"local": self.local.stats(), "sheets": self.mirror.stats()}
+
+    def warm_up(self) -> None:
+        self.mirror.warm_up()
+
+    @property
+    def outbox(self) -> "SheetsOutbox":
+        return self.mirror.writer
+
+    def close(self) -> None:
+        self.mirror.close()
+        self.local.close()
+
+def create_tables() -> None:
+    """Создание необходимых таблиц в базе данных"""
+    create_tables_queries = [
+        # Существующие таблицы
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE,
+            username TEXT,
+            first_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
         
-        for query in create_tables_queries:
-            try:
-                cursor.execute(query)
-            except Exception as e:
-                logger.error(f"Ошибка при создании таблицы: {e}")
+        # Новые таблицы для реферальной системы
+        """
+        CREATE TABLE IF NOT EXISTS referral_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            partner_id INTEGER NOT NULL,
+            code TEXT UNIQUE NOT NULL,
+            platform TEXT NOT NULL,
+            theme TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
         
-        conn.commit()
-        conn.close()
+        """
+        CREATE TABLE IF NOT EXISTS conversions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            partner_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (code) REFERENCES referral_codes(code)
+        )
+        """,
+
+        # Индексы для выборок по партнеру и коду
+        "CREATE INDEX IF NOT EXISTS idx_referral_codes_partner ON referral_codes (partner_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversions_partner ON conversions (partner_id, platform, event_type)",
+        "CREATE INDEX IF NOT EXISTS idx_conversions_code ON conversions (code, event_type)",
+
+        # Агрегаты конверсий по партнеру, платформе, событию и дню
+        """
+        CREATE TABLE IF NOT EXISTS conversion_stats (
+            partner_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (partner_id, platform, event_type, day)
+        ) WITHOUT ROWID
+        """,
+
+        # Агрегаты обновляются при каждой вставке конверсии, в той же транзакции
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_conversions_rollup AFTER INSERT ON conversions
+        BEGIN
+            INSERT INTO conversion_stats (partner_id, platform, event_type, day, count)
+            VALUES (NEW.partner_id, NEW.platform, NEW.event_type, date(NEW.created_at), 1)
+            ON CONFLICT (partner_id, platform, event_type, day) DO UPDATE SET count = count + 1;
+        END
+        """,
+
+        # Первичное заполнение агрегатов из уже накопленной истории
+        """
+        INSERT INTO conversion_stats (partner_id, platform, event_type, day, count)
+        SELECT partner_id, platform, event_type, date(created_at), COUNT(*) FROM conversions
+        WHERE NOT EXISTS (SELECT 1 FROM conversion_stats)
+        GROUP BY partner_id, platform, event_type, date(created_at)
+        """,
+
+        # Брошенные диалоги: на каком шаге пользователь ушёл (пишет utils.sweeper)
+        """
+        CREATE TABLE IF NOT EXISTS dropoffs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            step TEXT NOT NULL,
+            question_index INTEGER NOT NULL DEFAULT 0,
+            referral_code TEXT NOT NULL DEFAULT '',
+            session_id TEXT NOT NULL DEFAULT '',
+            last_active_at REAL NOT NULL,
+            expired_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_dropoffs_step ON dropoffs (step, question_index)"
+    ]
+    
+    # Соединение из пула не закрываем: оно переиспользуется потоком
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    for query in create_tables_queries:
+        try:
+            cursor.execute(query)
+        except Exception as e:
+            logger.error("Ошибка при создании таблицы: %s", e)
+    
+    conn.commit()
+
+def create_storage(mode: str) -> StorageBackend:
+    """Создание хранилища лидов по режиму: local, sheets или mirror"""
+    if mode == "local":
+        return LocalStorage(bot_config.DB_PATH)
+    if mode == "sheets":
+        return GoogleSheetsManager()
+    if mode == "mirror":
+        return MirroredStorage(LocalStorage(bot_config.DB_PATH), GoogleSheetsManager(outbox_path=bot_config.DB_PATH))
+    raise ValueError(f"Неизвестный режим хранилища: {mode}")
 
-# Создаем глобальный экземпляр менеджера
-db = GoogleSheetsManager()
+# Создаем глобальный экземпляр хранилища
+db = create_storage(bot_config.STORAGE_MODE)
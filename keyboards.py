@@ -1,7 +1,36 @@
-from typing import List
-from telebot.types import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+from telebot.types import JsonSerializable, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton
 from config import ui_config
 
+class FrozenMarkup(JsonSerializable):
+    """Готовая клавиатура с JSON, сериализованным один раз (общая для всех чатов, не изменяется)"""
+
+    def __init__(self, markup: JsonSerializable):
+        self.keyboard = getattr(markup, "keyboard", None)
+        self._json = markup.to_json()
+
+    def to_json(self) -> str:
+        return self._json
+
+class KeyboardRegistry:
+    """Реестр статических клавиатур: каждая строится и сериализуется один раз"""
+
+    def __init__(self):
+        self._markups: Dict[str, FrozenMarkup] = {}
+
+    def get(self, name: str, builder: Callable[[], JsonSerializable]) -> FrozenMarkup:
+        markup = self._markups.get(name)
+        if markup is None:
+            markup = FrozenMarkup(builder())
+            self._markups[name] = markup
+        return markup
+
+    def clear(self) -> None:
+        self._markups.clear()
+
+keyboard_registry = KeyboardRegistry()
+
 class Keyboard:
     """Базовый класс для клавиатур"""
     
@@ -25,74 +54,86 @@ class Keyboard:
         return markup
 
     @staticmethod
-    def get_phone_keyboard() -> ReplyKeyboardMarkup:
+    def build_phone_keyboard() -> ReplyKeyboardMarkup:
         """Создает клавиатуру с кнопкой запроса номера телефона"""
         keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
         button = KeyboardButton("📞 Поделиться номером", request_contact=True)
         keyboard.add(button)
         return keyboard
 
+    @classmethod
+    def get_phone_keyboard(cls) -> FrozenMarkup:
+        return keyboard_registry.get("phone", cls.build_phone_keyboard)
+
 class MainMenuKeyboard(Keyboard):
     """Клавиатура главного меню"""
     
+    BUTTONS = [
+        f"{ui_config.EMOJIS['level']} Дізнатися рівень англійської",
+        f"{ui_config.EMOJIS['money']} Купити курс",
+        f"{ui_config.EMOJIS['calendar']} Записатись на пробний урок",
+        f"{ui_config.EMOJIS['phone']} Зв'язатись з менеджером"
+    ]
+    
     @classmethod
-    def get_keyboard(cls) -> ReplyKeyboardMarkup:
-        buttons = [
-            f"{ui_config.EMOJIS['level']} Дізнатися рівень англійської",
-            f"{ui_config.EMOJIS['money']} Купити курс",
-            f"{ui_config.EMOJIS['calendar']} Записатись на пробний урок",
-            f"{ui_config.EMOJIS['phone']} Зв'язатись з менеджером"
-        ]
-        return cls.create_reply_keyboard(buttons, row_width=1)
+    def get_keyboard(cls) -> FrozenMarkup:
+        return keyboard_registry.get("main_menu", lambda: cls.create_reply_keyboard(cls.BUTTONS, row_width=1))
 
 class LevelSelectionKeyboard(Keyboard):
     """Клавиатура выбора уровня"""
     
+    BUTTONS = [
+        f"A1 (Початковий) {ui_config.EMOJIS['level']}", 
+        f"A2 (Елементарний) {ui_config.EMOJIS['level']}",
+        f"B1 (Середній) {ui_config.EMOJIS['level']}", 
+        f"B2+ (Вище середнього) {ui_config.EMOJIS['level']}",
+        f"C1 (Просунутий) {ui_config.EMOJIS['level']}", 
+        f"C2 (Вільне володіння) {ui_config.EMOJIS['level']}",
+        f"{ui_config.EMOJIS['test']} Дізнатися рівень англійської"
+    ]
+    
     @classmethod
-    def get_keyboard(cls) -> ReplyKeyboardMarkup:
-        buttons = [
-            f"A1 (Початковий) {ui_config.EMOJIS['level']}", 
-            f"A2 (Елементарний) {ui_config.EMOJIS['level']}",
-            f"B1 (Середній) {ui_config.EMOJIS['level']}", 
-            f"B2+ (Вище середнього) {ui_config.EMOJIS['level']}",
-            f"C1 (Просунутий) {ui_config.EMOJIS['level']}", 
-            f"C2 (Вільне володіння) {ui_config.EMOJIS['level']}",
-            f"{ui_config.EMOJIS['test']} Дізнатися рівень англійської"
-        ]
-        return cls.create_reply_keyboard(buttons, row_width=2)
+    def get_keyboard(cls) -> FrozenMarkup:
+        return keyboard_registry.get("level_selection", lambda: cls.create_reply_keyboard(cls.BUTTONS, row_width=2))
 
 class TestKeyboard(Keyboard):
     """Клавиатура для тестирования"""
     
     @classmethod
-    def get_answer_keyboard(cls, answers: List[str]) -> ReplyKeyboardMarkup:
-        return cls.create_reply_keyboard(answers, row_width=1)
+    def get_answer_keyboard(cls, answers: List[str]) -> FrozenMarkup:
+        return cls._answer_keyboard(tuple(answers))
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _answer_keyboard(answers: Tuple[str, ...]) -> FrozenMarkup:
+        """Клавиатура ответов; кэш по перемешанному набору вариантов"""
+        return FrozenMarkup(Keyboard.create_reply_keyboard(list(answers), row_width=1))
 
 class SurveyKeyboard(Keyboard):
     """Клавиатуры для опроса"""
     
     @staticmethod
-    def get_motivation_keyboard() -> ReplyKeyboardMarkup:
+    def get_motivation_keyboard() -> FrozenMarkup:
         buttons = ["1", "2", "3", "4", "5"]
-        return Keyboard.create_reply_keyboard(buttons)
+        return keyboard_registry.get("motivation", lambda: Keyboard.create_reply_keyboard(buttons))
     
     @staticmethod
-    def get_time_keyboard() -> ReplyKeyboardMarkup:
+    def get_time_keyboard() -> FrozenMarkup:
         buttons = ["1-2 години", "3-4 години", "5-7 годин"]
-        return Keyboard.create_reply_keyboard(buttons)
+        return keyboard_registry.get("time", lambda: Keyboard.create_reply_keyboard(buttons))
     
     @staticmethod
-    def get_budget_keyboard() -> ReplyKeyboardMarkup:
+    def get_budget_keyboard() -> FrozenMarkup:
         buttons = [
             "100-300 грн",
             "300-500 грн",
             "500-700 грн",
             "Я поки не знаю, хочу розібратися"
         ]
-        return Keyboard.create_reply_keyboard(buttons)
+        return keyboard_registry.get("budget", lambda: Keyboard.create_reply_keyboard(buttons))
     
     @staticmethod
-    def get_goal_keyboard() -> ReplyKeyboardMarkup:
+    def get_goal_keyboard() -> FrozenMarkup:
         buttons = [
             "Для роботи",
             "Для подорожей",
@@ -101,17 +142,21 @@ class SurveyKeyboard(Keyboard):
             "Для розвитку особистих навичок",
             "Інше"
         ]
-        return Keyboard.create_reply_keyboard(buttons, row_width=2)
+        return keyboard_registry.get("goal", lambda: Keyboard.create_reply_keyboard(buttons, row_width=2))
     
     @staticmethod
-    def get_start_preference_keyboard() -> ReplyKeyboardMarkup:
+    def build_start_preference_keyboard() -> ReplyKeyboardMarkup:
         keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
         keyboard.add("Хочу почати відразу")
         keyboard.add("Спочатку пробне заняття")
         return keyboard
     
     @staticmethod
-    def get_payment_keyboard() -> ReplyKeyboardMarkup:
+    def get_start_preference_keyboard() -> FrozenMarkup:
+        return keyboard_registry.get("start_preference", SurveyKeyboard.build_start_preference_keyboard)
+    
+    @staticmethod
+    def build_payment_keyboard() -> ReplyKeyboardMarkup:
         keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
         keyboard.add("Оплата одразу за курс")
         keyboard.add("Оплата частинами")
@@ -119,17 +164,21 @@ class SurveyKeyboard(Keyboard):
         return keyboard
     
     @staticmethod
-    def get_start_choice_keyboard() -> ReplyKeyboardMarkup:
+    def get_payment_keyboard() -> FrozenMarkup:
+        return keyboard_registry.get("payment", SurveyKeyboard.build_payment_keyboard)
+    
+    @staticmethod
+    def get_start_choice_keyboard() -> FrozenMarkup:
         buttons = [
             "Так, я готовий розпочати навчання негайно",
             "Ні, хочу спочатку пройти пробне заняття"
         ]
-        return Keyboard.create_reply_keyboard(buttons)
+        return keyboard_registry.get("start_choice", lambda: Keyboard.create_reply_keyboard(buttons))
     
     @staticmethod
-    def get_ninth_question_keyboard() -> ReplyKeyboardMarkup:
+    def get_ninth_question_keyboard() -> FrozenMarkup:
         buttons = [
             "Так, мені потрібна допомога",
             "Ні, я впевнений у своїх знаннях"
         ]
-        return Keyboard.create_reply_keyboard(buttons)
+        return keyboard_registry.get("ninth_question", lambda: Keyboard.create_reply_keyboard(buttons))
\ No newline at end of file
@@ -0,0 +1,69 @@
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple
+from config import test_config
+
+class Level(NamedTuple):
+    """Уровень владения языком: нижний порог процента, название и описание"""
+    threshold: int
+    name: str
+    description: str
+
+class LevelScale:
+    """Уровни из TestConfig.LEVELS, один раз скомпилированные в отсортированные пороги"""
+
+    def __init__(self, levels: Dict[int, Dict[str, str]]):
+        self.levels: List[Level] = [
+            Level(threshold, level["name"], level["description"]) for threshold, level in sorted(levels.items())
+        ]
+        # Нижний порог не нужен для поиска: процент ниже второго порога - это первый уровень
+        self._bounds = [level.threshold for level in self.levels[1:]]
+        self.by_threshold = {level.threshold: level for level in self.levels}
+        self.by_name = {level.name: level for level in self.levels}
+
+    def index(self, percentage: float) -> int:
+        """Номер уровня (по возрастанию) для процента; NaN - первый уровень"""
+        return bisect_right(self._bounds, percentage) if percentage == percentage else 0
+
+    def level(self, percentage: float) -> Level:
+        """Уровень для процента правильных ответов"""
+        return self.levels[self.index(percentage)]
+
+    def classify(self, percentages: Iterable[float]) -> array:
+        """Номера уровней для множества процентов сразу (например, при пересчёте истории)"""
+        bounds = self._bounds
+        return array("B", [bisect_right(bounds, p) if p == p else 0 for p in percentages])
+
+    def counts(self, percentages: Iterable[float]) -> Dict[str, int]:
+        """Количество результатов по уровням (NaN не учитываются), от младшего уровня к старшему"""
+        bounds = self._bounds
+        counts = Counter(bisect_right(bounds, p) for p in percentages if p == p)
+        return {level.name: counts.get(index, 0) for index, level in enumerate(self.levels)}
+
+    @lru_cache(maxsize=1024)
+    def _results(self, correct: int, total: int) -> tuple:
+        percentage = correct / total * 100 if total else 0.0
+        return (("correct", correct), ("total", total), ("percentage", percentage), ("level", self.level(percentage).name))
+
+    def results(self, correct: int, total: int) -> Dict[str, Any]:
+        """Результаты теста в формате build_lead_row (уровень считается один раз на пару correct/total)"""
+        return dict(self._results(correct, total))
+
+    @lru_cache(maxsize=1024)
+    def result_message(self, correct: int, total: int) -> str:
+        """Текст с результатом теста (кэш по паре correct/total)"""
+        percentage = correct / total * 100 if total else 0.0
+        level = self.level(percentage)
+        return (
+            f"🎉 Тест завершено! 🎉\n\n"
+            f"📊 Ваш результат: {correct}/{total} правильних відповідей\n"
+            f"📈 Відсоток: {percentage:.1f}%\n"
+            f"🎓 Ваш приблизний рівень: {level.name}\n"
+            f"{level.description}\n\n"
+            f"💫 Дякуємо за проходження тесту!"
+        )
+
+# Создаем глобальный экземпляр шкалы уровней
+level_scale = LevelScale(test_config.LEVELS)
@@ -1,9 +1,15 @@
-import telebot
-from config import bot_config
-from handlers import start, test, survey
+import argparse
+import threading
+from config import bot_config, test_config
 from utils.logger import get_logger
 from utils.referral import ref_system
-import random
+from utils.sender import configure_http_pool, schedule_outbound
+from utils.metrics import metrics, InstrumentedBot, MetricsServer
+from utils.dedup import DedupTeleBot
+from utils.states import state_store
+from utils.sweeper import session_sweeper
+from questions import question_bank
+from database import db
 
 # Инициализация логгера
 logger = get_logger(__name__)
@@ -24,12 +30,9 @@ def register_admin_handlers(bot):
                 
             platform, theme = args
             
-            # Создаём новый ID для партнера
-            partner_id = random.randint(1000, 9999)
-            
-            # Создаём ссылку
-            link = ref_system.create_referral_link(
-                partner_id=partner_id,
+            # Создаём ссылку; ID нового партнера выдаётся в той же транзакции и не повторяется
+            partner_id, link = ref_system.create_referral_link(
+                partner_id=None,
                 platform=platform,
                 theme=theme
             )
@@ -47,7 +50,7 @@ def register_admin_handlers(bot):
         except (ValueError, IndexError) as e:
             bot.reply_to(message, "❌ Использование: /create_link platform theme\n"
                                  "Например: /create_link tiktok crypto")
-            logger.error(f"Ошибка создания ссылки: {e}")
+            logger.error("Ошибка создания ссылки: %s", e)
     
     @bot.message_handler(commands=['stats'])
     def handle_stats(message):
@@ -87,23 +90,183 @@ def register_admin_handlers(bot):
             bot.reply_to(message, "❌ Использование:\n"
                                  "/stats - общая статистика\n"
                                  "/stats partner_id - статистика партнера")
-            logger.error(f"Ошибка получения статистики: {e}")
+            logger.error("Ошибка получения статистики: %s", e)
+
+    @bot.message_handler(commands=['reload_questions'])
+    def handle_reload_questions(message):
+        """Перезагрузка банка вопросов из файла"""
+        if str(message.from_user.id) != bot_config.ADMIN_ID:
+            return
+            
+        try:
+            bank = question_bank.reload()
+            bot.reply_to(message, f"✅ Банк вопросов обновлён до версии {bank.version}\n"
+                                  f"📝 Вопросов: {len(bank.questions)}")
+        except Exception as e:
+            bot.reply_to(message, f"❌ Не удалось загрузить банк вопросов: {e}")
+            logger.error("Ошибка перезагрузки банка вопросов: %s", e)
+
+    @bot.message_handler(commands=['outbox'])
+    def handle_outbox(message):
+        """Очередь доставки в Google Sheets и dead-letter"""
+        if str(message.from_user.id) != bot_config.ADMIN_ID:
+            return
+            
+        outbox = db.outbox
+        if outbox is None:
+            bot.reply_to(message, "ℹ️ Google Sheets не используется (STORAGE_MODE=local)")
+            return
+        
+        args = message.text.split()[1:]
+        if args and args[0] == "retry":
+            bot.reply_to(message, f"🔁 Возвращено в очередь: {outbox.retry_dead()}")
+            return
+        
+        stats = outbox.stats()
+        response = "📤 Очередь Google Sheets:\n\n"
+        response += f"⏳ Ожидают доставки: {stats['queue_depth']}\n"
+        response += f"✅ Записано: {stats['rows_written']}\n"
+        response += f"❌ Неудачных попыток: {stats['failed_flushes']}\n"
+        response += f"☠️ Dead-letter: {stats['dead_letters']}\n"
+        for letter in outbox.dead_letters(limit=5):
+            response += f"\n#{letter['id']} ({letter['row'][1]}, попыток {letter['attempts']}): {letter['last_error']}"
+        if stats['dead_letters']:
+            response += "\n\n/outbox retry - повторить доставку"
+        bot.reply_to(message, response)
+
+    @bot.message_handler(commands=['metrics'])
+    def handle_metrics(message):
+        """Задержки обработчиков и вызовов, глубины очередей"""
+        if str(message.from_user.id) != bot_config.ADMIN_ID:
+            return
+            
+        bot.reply_to(message, metrics.render_summary())
+
+    @bot.message_handler(commands=['report'])
+    def handle_report(message):
+        """Аналитика по всей истории лидов и конверсий"""
+        if str(message.from_user.id) != bot_config.ADMIN_ID:
+            return
+            
+        def send_report():
+            try:
+                from analytics import build_report, render_report
+                # Накопленные в памяти конверсии дописываются, чтобы воронка учла последние переходы
+                ref_system.flush()
+                bot.reply_to(message, render_report(build_report(db)))
+            except Exception as e:
+                bot.reply_to(message, "❌ Ошибка построения отчёта")
+                logger.error("Ошибка построения отчёта: %s", e)
+        
+        # Отчёт читает всю историю лидов: строим его в отдельном потоке, не занимая поток обработки обновлений
+        threading.Thread(target=send_report, name="admin-report", daemon=True).start()
+
+def register_handlers(bot):
+    """Регистрация всех обработчиков бота"""
+    # Модули обработчиков импортируются при регистрации, а не при импорте main
+    from handlers import start, test, survey
+    
+    register_admin_handlers(bot)
+    start.register_handlers(bot)
+    test.register_handlers(bot)
+    survey.register_handlers(bot)
+
+def prepare_bot(bot):
+    """Бот для обработчиков: с очередью исходящих сообщений, если она включена, и замером каждого обработчика"""
+    if bot_config.OUTBOUND_SCHEDULER:
+        bot = schedule_outbound(bot)
+    return InstrumentedBot(bot, metrics)
+
+def setup_bot(bot) -> None:
+    """Регистрация обработчиков, прогрев кэша реферальных кодов и подключение бота к очистке брошенных диалогов"""
+    register_handlers(prepare_bot(bot))
+    ref_system.resolve_bot_username(bot_config.TOKEN)
+    ref_system.warm_up()
+    session_sweeper.start(bot)
+
+def start_metrics_server() -> None:
+    """Запуск локального эндпоинта метрик Prometheus"""
+    metrics.gauge("bot_active_chats", "Чаты с сохранённым состоянием диалога", lambda: len(state_store))
+    if bot_config.METRICS_PORT:
+        MetricsServer(metrics, bot_config.METRICS_HOST, bot_config.METRICS_PORT).start()
+
+def parse_args():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="English Learning Bot")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="запуск на AsyncTeleBot вместо синхронного TeleBot")
+    parser.add_argument("--webhook", action="store_true",
+                        help="приём обновлений через webhook вместо long polling")
+    parser.add_argument("--shards", type=int, default=bot_config.SHARD_WORKERS,
+                        help="число процессов-воркеров, между которыми чаты делятся по chat_id (0 - один процесс; только long polling)")
+    return parser.parse_args()
 
 def main():
     """Основная функция запуска бота"""
+    args = parse_args()
+
     # Проверка наличия токена
     if not bot_config.TOKEN:
         logger.error("Ошибка! Токен не установлен в файле .env")
         return
     
-    # Создание экземпляра бота
-    bot = telebot.TeleBot(bot_config.TOKEN)
+    if test_config.QUESTIONS_RELOAD_INTERVAL > 0:
+        question_bank.start_watching(test_config.QUESTIONS_RELOAD_INTERVAL)
+    
+    start_metrics_server()
+    
+    # Подключение к Google Sheets идёт в фоне: бот начинает принимать обновления сразу,
+    # а лиды до готовности таблицы копятся в очереди записи
+    db.warm_up()
+    
+    # Воркеры получают обновления только от long polling супервизора
+    if args.shards > 0 and (args.webhook or args.use_async):
+        logger.error("Ошибка! --shards работает только с long polling, без --webhook и --async")
+        return
+    
+    if args.use_async:
+        from async_bot import run_async
+        run_async(setup_bot)
+        return
+    
+    # Обновления получает этот процесс, а обработчики выполняются в процессах-воркерах
+    if args.shards > 0:
+        from sharded import run_sharded
+        logger.info("🤖 Бот запущен в многопроцессном режиме (%s воркеров)!", args.shards)
+        run_sharded(bot_config.TOKEN, args.shards, bot_config.SHARD_QUEUE_SIZE)
+        return
+    
+    # Общий пул HTTP-соединений к Bot API для всех потоков
+    configure_http_pool(bot_config.HTTP_POOL_SIZE)
+    
+    # Создание экземпляра бота (в режиме webhook обновления раздаёт пул воркеров сервера)
+    bot = DedupTeleBot(bot_config.TOKEN, threaded=not args.webhook)
     
     # Регистрация обработчиков
-    register_admin_handlers(bot)
-    start.register_handlers(bot)
-    test.register_handlers(bot)
-    survey.register_handlers(bot)
+    setup_bot(bot)
+    
+    # При постоянном хранилище состояний сохраняем и ожидающие обработчики следующего шага
+    if bot_config.STATE_STORE == "sqlite":
+        bot.enable_save_next_step_handlers(delay=2)
+        bot.load_next_step_handlers()
+    
+    if args.webhook:
+        if not bot_config.WEBHOOK_URL:
+            logger.error("Ошибка! WEBHOOK_URL не установлен в файле .env")
+            return
+        from webhook import run_webhook
+        logger.info("🤖 Бот запущен в режиме webhook!")
+        run_webhook(
+            bot,
+            url=bot_config.WEBHOOK_URL,
+            host=bot_config.WEBHOOK_HOST,
+            port=bot_config.WEBHOOK_PORT,
+            path=bot_config.WEBHOOK_PATH,
+            secret=bot_config.WEBHOOK_SECRET,
+            workers=bot_config.WEBHOOK_WORKERS,
+            queue_size=bot_config.WEBHOOK_QUEUE_SIZE
+        )
+        return
     
     # Запуск бота
     logger.info("🤖 Бот запущен!")
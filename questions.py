@@ -1,129 +1,303 @@
+import os
+import re
+import json
+import time
+import hashlib
 import random
-from typing import List, Dict
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Sequence, Set
 from dataclasses import dataclass
+from config import test_config
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+DIFFICULTY_PATTERN = re.compile(rb'"difficulty"\s*:\s*(\d+)')
 
 @dataclass
 class Question:
     """Класс для представления вопроса"""
+    __slots__ = ("text", "correct_answer", "wrong_answers", "difficulty")
+
     text: str
     correct_answer: str
     wrong_answers: List[str]
     difficulty: int
     
-    def get_shuffled_answers(self) -> List[str]:
+    def get_shuffled_answers(self, rng: Optional[random.Random] = None) -> List[str]:
         """Получить перемешанные варианты ответов"""
         answers = [self.correct_answer] + self.wrong_answers
-        random.shuffle(answers)
+        (rng or random).shuffle(answers)
         return answers
     
     def check_answer(self, answer: str) -> bool:
         """Проверить правильность ответа"""
         return answer.strip() == self.correct_answer.strip()
 
+class QuestionFile:
+    """Вопросы из JSONL-файла, прочитанного целиком в неизменяемый буфер; каждый разбирается при первом обращении"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = None
+        self.offsets = array("Q")
+        self.difficulties = array("B")
+        self._cache: Dict[int, Question] = {}
+
+        # Копия в памяти, а не mmap: открытое отображение не даёт заменить файл в Windows,
+        # а правка файла на месте меняла бы вопросы уже загруженных версий банка
+        with open(path, "rb") as file:
+            self._data = file.read()
+        self.digest = hashlib.sha1(self._data).hexdigest()
+
+        # Один проход по файлу: смещения строк и сложность, без разбора JSON
+        position = 0
+        size = len(self._data)
+        while position < size:
+            end = self._data.find(b"\n", position)
+            if end == -1:
+                end = size
+            line = self._data[position:end]
+            match = DIFFICULTY_PATTERN.search(line)
+            if match:
+                self.offsets.append(position)
+                self.difficulties.append(int(match.group(1)))
+            elif line.strip():
+                if self.version is not None or self.offsets:
+                    raise ValueError(f"{path}, строка {self._line_number(position)}: у вопроса нет поля difficulty")
+                # Первая строка без вопроса - заголовок с версией банка
+                self.version = str(json.loads(line).get("version", ""))
+            position = end + 1
+
+        if self.version is None:
+            self.version = str(os.stat(path).st_mtime_ns)
+
+    def _line_number(self, position: int) -> int:
+        return self._data.count(b"\n", 0, position) + 1
+
+    def validate(self) -> None:
+        """Разбор и проверка всех вопросов сразу (ValueError с номером строки при первой ошибке)"""
+        for question_id, position in enumerate(self.offsets):
+            try:
+                question = self[question_id]
+                if not (isinstance(question.text, str) and isinstance(question.correct_answer, str)
+                        and isinstance(question.wrong_answers, list) and question.wrong_answers
+                        and all(isinstance(answer, str) for answer in question.wrong_answers)):
+                    raise ValueError("text, correct_answer и wrong_answers должны быть строками")
+                if question.difficulty != self.difficulties[question_id]:
+                    raise ValueError("difficulty не совпадает с найденным при индексации")
+            except (ValueError, KeyError, TypeError) as e:
+                self._cache.pop(question_id, None)
+                raise ValueError(f"{self.path}, строка {self._line_number(position)}: {e!r}") from e
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, question_id: int) -> Question:
+        question = self._cache.get(question_id)
+        if question is None:
+            start = self.offsets[question_id]
+            end = self._data.find(b"\n", start)
+            data = json.loads(self._data[start:end if end != -1 else len(self._data)])
+            question = Question(
+                text=data["text"],
+                correct_answer=data["correct_answer"],
+                wrong_answers=data["wrong_answers"],
+                difficulty=data["difficulty"]
+            )
+            self._cache[question_id] = question
+        return question
+
 class QuestionBank:
     """Банк вопросов"""
     
-    def __init__(self):
-        self.questions = [
-            # A1-A2 (2 вопроса)
-            Question(
-                text="Translate 'книга' into English:",
-                correct_answer="book",
-                wrong_answers=["magazine", "newspaper", "letter"],
-                difficulty=1
-            ),
-            Question(
-                text="Choose the correct form: She ___ to school every day.",
-                correct_answer="goes",
-                wrong_answers=["go", "going", "went"],
-                difficulty=2
-            ),
-            
-            # B1 (2 вопроса)
-            Question(
-                text="What is the meaning of the phrase 'to give up'?",
-                correct_answer="to stop doing something",
-                wrong_answers=["to start something", "to continue doing", "to finish quickly"],
-                difficulty=3
-            ),
-            Question(
-                text="Complete the sentence: She has been learning English ___ 2010.",
-                correct_answer="since",
-                wrong_answers=["for", "from", "in"],
-                difficulty=3
-            ),
-            
-            # B2 (2 вопроса)
-            Question(
-                text="Translate the sentence: 'Я би хотів покращити свою англійську'",
-                correct_answer="I would like to improve my English",
-                wrong_answers=["I will improve my English", "I want improve my English", "I like to improve my English"],
-                difficulty=4
-            ),
-            Question(
-                text="Complete the sentence: I wish I ___ harder for my exams last year.",
-                correct_answer="had studied",
-                wrong_answers=["studied", "have studied", "would study"],
-                difficulty=4
-            ),
-            
-            # C1-C2 (3 вопроса)
-            Question(
-                text="What does 'to beat around the bush' mean?",
-                correct_answer="to avoid talking about something directly",
-                wrong_answers=["to talk too much", "to speak very fast", "to be very direct"],
-                difficulty=5
-            ),
-            Question(
-                text="Translate: 'Чим більше я практикую, тим краще стаю'",
-                correct_answer="The more I practice, the better I become",
-                wrong_answers=["More I practice, better I become", "As more I practice, I become better", "When I practice more, I become better"],
-                difficulty=5
-            ),
-            Question(
-                text="Complete: If I ___ about the meeting earlier, I would have attended it.",
-                correct_answer="had known",
-                wrong_answers=["knew", "would know", "have known"],
-                difficulty=5
-            )
-        ]
+    def __init__(self, questions: Sequence[Question], version: str = ""):
+        self.questions = questions
+        self.version = version
+        self._build_index()
     
-    def get_questions(self, count: int = 10) -> List[Question]:
-        """Получить случайные вопросы с сохранением пропорций по сложности"""
-        if count > len(self.questions):
-            count = len(self.questions)
-            
-        # Группируем вопросы по сложности
-        questions_by_difficulty = {}
-        for q in self.questions:
-            if q.difficulty not in questions_by_difficulty:
-                questions_by_difficulty[q.difficulty] = []
-            questions_by_difficulty[q.difficulty].append(q)
-        
-        # Определяем количество вопросов для каждого уровня сложности
-        total_difficulties = sum(len(qs) for qs in questions_by_difficulty.values())
-        selected_questions = []
-        
-        for difficulty, questions in questions_by_difficulty.items():
-            # Пропорционально выбираем количество вопросов для каждой сложности
-            n_questions = round(count * len(questions) / total_difficulties)
-            if n_questions == 0 and questions:
-                n_questions = 1
-            selected_questions.extend(random.sample(questions, min(n_questions, len(questions))))
-        
-        # Если получилось меньше вопросов, чем нужно, добавляем случайные
-        while len(selected_questions) < count:
-            remaining = random.choice(self.questions)
-            if remaining not in selected_questions:
-                selected_questions.append(remaining)
-        
-        # Если получилось больше вопросов, чем нужно, убираем случайные
-        while len(selected_questions) > count:
-            selected_questions.pop(random.randrange(len(selected_questions)))
-        
+    @classmethod
+    def from_file(cls, path: str) -> "QuestionBank":
+        """Загрузка банка из JSONL-файла (вопросы читаются лениво)"""
+        questions = QuestionFile(path)
+        return cls(questions, version=questions.version)
+    
+    def _build_index(self) -> None:
+        """Индекс номеров вопросов по сложности (строится один раз при загрузке банка)"""
+        difficulties = getattr(self.questions, "difficulties", None)
+        if difficulties is None:
+            difficulties = [question.difficulty for question in self.questions]
+
+        by_difficulty: Dict[int, array] = {}
+        for question_id, difficulty in enumerate(difficulties):
+            by_difficulty.setdefault(difficulty, array("I")).append(question_id)
+        self.difficulties = sorted(by_difficulty)
+        self.ids_by_difficulty = [by_difficulty[d] for d in self.difficulties]
+        self._quotas: Dict[int, List[int]] = {}
+    
+    def _get_quotas(self, count: int) -> List[int]:
+        """Сколько вопросов брать из каждой сложности (пропорционально, сумма ровно count)"""
+        quotas = self._quotas.get(count)
+        if quotas is not None:
+            return quotas
+
+        sizes = [len(ids) for ids in self.ids_by_difficulty]
+        total = len(self.questions)
+        quotas = [count * size // total for size in sizes]
+
+        # Остаток распределяем по наибольшим дробным частям
+        by_remainder = sorted(range(len(sizes)), key=lambda i: count * sizes[i] % total, reverse=True)
+        for i in by_remainder[:count - sum(quotas)]:
+            quotas[i] += 1
+
+        # Каждая сложность представлена хотя бы одним вопросом, если вопросов хватает
+        if count >= len(sizes):
+            for i, quota in enumerate(quotas):
+                if quota == 0:
+                    donor = max(range(len(quotas)), key=lambda j: quotas[j])
+                    quotas[donor] -= 1
+                    quotas[i] = 1
+
+        self._quotas[count] = quotas
+        return quotas
+    
+    def get_question_ids(self, count: int = 10, rng: Optional[random.Random] = None) -> List[int]:
+        """Получить номера случайных вопросов с сохранением пропорций по сложности"""
+        rng = rng or random
+        count = min(count, len(self.questions))
+
+        selected: List[int] = []
+        for ids, quota in zip(self.ids_by_difficulty, self._get_quotas(count)):
+            if quota:
+                # Выборка по позициям: random.sample до Python 3.10 не принимает array
+                selected.extend(ids[i] for i in rng.sample(range(len(ids)), quota))
+
         # Перемешиваем итоговый список
-        random.shuffle(selected_questions)
-        return selected_questions
+        rng.shuffle(selected)
+        return selected
+    
+    def get_question(self, question_id: int) -> Question:
+        """Вопрос по номеру"""
+        return self.questions[question_id]
+    
+    def get_questions(self, count: int = 10, rng: Optional[random.Random] = None) -> List[Question]:
+        """Получить случайные вопросы с сохранением пропорций по сложности"""
+        return [self.questions[i] for i in self.get_question_ids(count, rng)]
+
+class QuestionBankRegistry:
+    """Текущий банк вопросов с атомарной горячей заменой"""
+
+    def __init__(self, path: str, keep_versions: int = 3,
+                 versions_in_use: Optional[Callable[[], Set[str]]] = None):
+        self.path = path
+        self.keep_versions = keep_versions
+        # Версии, на которых ещё идут сессии (ChatState.bank_version): они не выгружаются
+        self.versions_in_use = versions_in_use
+        self._bank: Optional[QuestionBank] = None
+        self._versions: "OrderedDict[str, QuestionBank]" = OrderedDict()
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    # Сессия запоминает версию current() в ChatState.bank_version и дальше берёт банк через get(),
+    # даже если файл перезагрузили. Каждая версия держит свою копию файла, поэтому замена или правка
+    # файла старые версии не затрагивает.
+    def current(self) -> QuestionBank:
+        """Актуальный банк (загружается при первом обращении)"""
+        bank = self._bank
+        if bank is None:
+            with self._lock:
+                if self._bank is None:
+                    self._load()
+                bank = self._bank
+        return bank
+
+    def get(self, version: str) -> Optional[QuestionBank]:
+        """Банк версии, на которой начата сессия; None, если версия уже выгружена (например, после перезапуска)"""
+        return self._versions.get(version)
+
+    def _load(self, validate: bool = False) -> QuestionBank:
+        """Загрузка файла и подмена текущего банка (вызывается под блокировкой)"""
+        mtime = os.stat(self.path).st_mtime_ns
+        try:
+            bank = QuestionBank.from_file(self.path)
+            if validate:
+                bank.questions.validate()
+            known = self._versions.get(bank.version)
+            if known is not None:
+                if known.questions.digest != bank.questions.digest:
+                    raise ValueError(f"Файл {self.path} изменён без смены версии {bank.version}")
+                # Тот же файл: сессии этой версии продолжают работать с уже загруженным банком
+                bank = known
+        finally:
+            # Файл учтён и при ошибке: наблюдатель не перечитывает его на каждом шаге
+            self._mtime = mtime
+        self._versions[bank.version] = bank
+        self._versions.move_to_end(bank.version)
+        self._bank = bank
+        self._evict()
+        logger.info("✅ Загружен банк вопросов версии %s: %s вопросов", bank.version, len(bank.questions))
+        return bank
+
+    def _evict(self) -> None:
+        """Выгрузка старых версий сверх keep_versions, на которых не идёт ни одна сессия"""
+        if len(self._versions) <= self.keep_versions:
+            return
+        try:
+            in_use = self.versions_in_use() if self.versions_in_use is not None else set()
+        except Exception as e:
+            logger.error("❌ Не удалось узнать версии банка в работе, старые версии сохранены: %s", e)
+            return
+        for version in list(self._versions):
+            if len(self._versions) <= self.keep_versions:
+                break
+            if version != self._bank.version and version not in in_use:
+                del self._versions[version]
+
+    def reload(self) -> QuestionBank:
+        """Перезагрузка банка из файла с проверкой каждого вопроса; при ошибке остаётся прежний банк"""
+        with self._lock:
+            return self._load(validate=True)
+
+    def _watch(self, interval: float) -> None:
+        """Проверка изменения файла и перезагрузка"""
+        while True:
+            time.sleep(interval)
+            try:
+                if os.stat(self.path).st_mtime_ns != self._mtime:
+                    self.reload()
+            except Exception as e:
+                logger.error("❌ Ошибка перезагрузки банка вопросов: %s", e)
+
+    def start_watching(self, interval: float) -> None:
+        """Фоновое отслеживание изменений файла банка"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="questions-watcher", daemon=True)
+        self._watcher.start()
+
+    @property
+    def questions(self) -> Sequence[Question]:
+        return self.current().questions
+
+    @metrics.timed("call", "questions.get_question_ids")
+    def get_question_ids(self, count: int = 10, rng: Optional[random.Random] = None) -> List[int]:
+        return self.current().get_question_ids(count, rng)
+
+    def get_question(self, question_id: int) -> Question:
+        return self.current().get_question(question_id)
+
+    @metrics.timed("call", "questions.get_questions")
+    def get_questions(self, count: int = 10, rng: Optional[random.Random] = None) -> List[Question]:
+        return self.current().get_questions(count, rng)
+
+def _versions_in_use() -> Set[str]:
+    """Версии банка из сохранённых состояний диалогов"""
+    from utils.states import state_store
+    return state_store.bank_versions()
 
 # Создаем глобальный экземпляр банка вопросов
-question_bank = QuestionBank()
+question_bank = QuestionBankRegistry(test_config.QUESTIONS_FILE, versions_in_use=_versions_in_use)
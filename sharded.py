@@ -0,0 +1,282 @@
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from telebot import apihelper
+from config import bot_config, log_config, test_config
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Воркер, проживший меньше этого времени (с), считается упавшим сразу после запуска
+RESTART_WINDOW = 10.0
+# Предельная пауза перед перезапуском воркера, который падает снова и снова (с)
+MAX_RESTART_DELAY = 30.0
+
+def raw_chat_id(update: Dict[str, Any]) -> int:
+    """Идентификатор чата из необработанного обновления (0, если чата нет)"""
+    for name in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = update.get(name)
+        if message:
+            return message["chat"]["id"]
+    callback_query = update.get("callback_query")
+    if callback_query:
+        if callback_query.get("message"):
+            return callback_query["message"]["chat"]["id"]
+        return callback_query["from"]["id"]
+    # Остальные типы обновлений: участники чата, заявки, inline-запросы, платежи
+    for value in update.values():
+        if isinstance(value, dict):
+            if "chat" in value:
+                return value["chat"]["id"]
+            if "from" in value:
+                return value["from"]["id"]
+    return 0
+
+class PollingSource:
+    """Источник обновлений: long polling Bot API"""
+
+    def __init__(self, token: str, timeout: int = 60):
+        self.token = token
+        self.timeout = timeout
+
+    def get_updates(self, offset: int) -> List[Dict[str, Any]]:
+        return apihelper.get_updates(self.token, offset=offset, timeout=self.timeout, long_polling_timeout=self.timeout)
+
+def _worker_main(index: int, conn, workers: int, api_url: str) -> None:
+    """Процесс-воркер: свой TeleBot с обработчиками main, обновления своей доли чатов строго по порядку"""
+    # Ctrl+C получает вся группа процессов; останавливает воркеры супервизор, дав дообработать очереди
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from utils.logger import redirect
+    root, ext = os.path.splitext(log_config.FILE)
+    redirect(f"{root}.shard{index}{ext}")
+
+    from telebot.types import Update
+    import main
+    from questions import question_bank
+    from utils.dedup import DedupTeleBot
+    from utils.metrics import MetricsServer
+    from utils.sender import configure_http_pool
+    from webhook import update_chat_id
+
+    apihelper.API_URL = api_url
+    # Лимит Telegram на отправку общий для бота, поэтому делится между воркерами
+    bot_config.SEND_GLOBAL_RATE = bot_config.SEND_GLOBAL_RATE / workers
+    configure_http_pool(bot_config.HTTP_POOL_SIZE)
+    bot = DedupTeleBot(bot_config.TOKEN, threaded=False)
+    main.setup_bot(bot)
+    if bot_config.STATE_STORE == "sqlite":
+        filename = f"./.handler-saves/step.shard{index}.save"
+        bot.enable_save_next_step_handlers(delay=2, filename=filename)
+        bot.load_next_step_handlers(filename=filename)
+    if test_config.QUESTIONS_RELOAD_INTERVAL > 0:
+        question_bank.start_watching(test_config.QUESTIONS_RELOAD_INTERVAL)
+    # Метрики воркера - на следующих за METRICS_PORT портах
+    if bot_config.METRICS_PORT:
+        MetricsServer(metrics, bot_config.METRICS_HOST, bot_config.METRICS_PORT + 1 + index).start()
+    logger.info("✅ Воркер %s запущен (pid %s)", index, os.getpid())
+    conn.send_bytes(b"")
+
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except EOFError:
+            return
+        if not data:
+            return
+        update = Update.de_json(data.decode("utf-8"))
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            logger.error("❌ Ошибка обработки обновления %s: %s", update.update_id, e,
+                         exc_info=True, extra={"chat_id": update_chat_id(update), "shard": index})
+        # Подтверждение: супервизор отправляет следующее обновление только после него
+        conn.send_bytes(b"")
+
+class ShardWorker:
+    """Процесс-воркер и очередь его обновлений на стороне супервизора"""
+
+    def __init__(self, supervisor: "ShardSupervisor", index: int, queue_size: int):
+        self.supervisor = supervisor
+        self.index = index
+        self.queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=queue_size)
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restarts = 0
+        self.processed = 0
+        self.lost = 0
+        self._thread = threading.Thread(target=self._feed, name=f"shard-feeder-{index}", daemon=True)
+
+    def _spawn(self) -> None:
+        context = self.supervisor.context
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=self.supervisor.target,
+            args=(self.index, child_conn, self.supervisor.workers, apihelper.API_URL),
+            name=f"shard-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        # Конец канала воркера закрывается в супервизоре, иначе его смерть не даст EOF
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+        self.started_at = time.monotonic()
+
+    def _handshake(self) -> bool:
+        """Ожидание сигнала готовности от запущенного воркера"""
+        try:
+            self.conn.recv_bytes()
+        except (EOFError, OSError):
+            return False
+        self.ready = True
+        return True
+
+    def _restart(self) -> None:
+        """Перезапуск упавшего воркера; при частых падениях пауза растёт"""
+        exitcode = self.process.exitcode if self.process is not None else None
+        self.conn.close()
+        if self.process is not None:
+            self.process.join(1)
+        uptime = time.monotonic() - self.started_at
+        self.crashes = self.crashes + 1 if uptime < RESTART_WINDOW else 1
+        delay = min(MAX_RESTART_DELAY, 0.5 * 2 ** (self.crashes - 1))
+        logger.error("❌ Воркер %s завершился (код %s), перезапуск через %.1f с", self.index, exitcode, delay)
+        if self.supervisor.stopped.wait(delay):
+            return
+        self.restarts += 1
+        self._spawn()
+
+    def _feed(self) -> None:
+        """Передача обновлений воркеру по одному с подтверждением"""
+        while True:
+            # Воркер, упавший при запуске (например, на импорте обработчиков), перезапускается без потери обновлений
+            if not self.ready and not self.supervisor.stopped.is_set():
+                if not self._handshake():
+                    self._restart()
+                continue
+            try:
+                data = self.queue.get(timeout=1)
+            except queue.Empty:
+                # Простаивающий воркер тоже проверяем, чтобы перезапустить его до следующего обновления
+                if not self.process.is_alive() and not self.supervisor.stopped.is_set():
+                    self._restart()
+                continue
+            if data is None:
+                try:
+                    self.conn.send_bytes(b"")
+                except OSError:
+                    pass
+                return
+
+            while True:
+                try:
+                    if not self.ready and not self._handshake():
+                        raise OSError("воркер не запустился")
+                    self.conn.send_bytes(data)
+                except OSError:
+                    # Обновление не дошло до воркера: отправим его новому процессу
+                    self._restart()
+                    if self.supervisor.stopped.is_set():
+                        return
+                    continue
+                try:
+                    self.conn.recv_bytes()
+                    self.processed += 1
+                except (EOFError, OSError):
+                    # Воркер упал во время обработки: повтор того же обновления мог бы снова его уронить
+                    self.lost += 1
+                    logger.error("❌ Обновление потеряно при падении воркера %s", self.index,
+                                 extra={"shard": self.index})
+                    self._restart()
+                break
+
+    def start(self) -> None:
+        self._spawn()
+        self._thread.start()
+
+    def stop(self, timeout: float) -> None:
+        self.queue.put(None)
+        self._thread.join(timeout)
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+class ShardSupervisor:
+    """Получение обновлений в одном процессе и раздача их N процессам-воркерам по chat_id"""
+
+    def __init__(self, workers: int, queue_size: int = 1000, target: Callable = _worker_main):
+        # spawn, а не fork: потоки родителя (очереди логов, отправки, записи в Sheets) не копируются
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        # Точка входа процесса-воркера (функция уровня модуля, её передаёт spawn)
+        self.target = target
+        self.stopped = threading.Event()
+        self.dispatched = 0
+        self.shards = [ShardWorker(self, i, queue_size) for i in range(workers)]
+        metrics.gauge("bot_shard_queue_depth", "Обновления в очередях процессов-воркеров",
+                      lambda: sum(shard.queue.qsize() for shard in self.shards))
+        metrics.gauge("bot_shard_restarts", "Перезапуски процессов-воркеров",
+                      lambda: sum(shard.restarts for shard in self.shards))
+
+    def start(self) -> None:
+        for shard in self.shards:
+            shard.start()
+        logger.info("✅ Запущено процессов-воркеров: %s", self.workers)
+
+    def dispatch(self, update: Dict[str, Any]) -> None:
+        """Постановка обновления в очередь воркера его чата (ждёт, если очередь заполнена)"""
+        shard = self.shards[raw_chat_id(update) % self.workers]
+        shard.queue.put(json.dumps(update, ensure_ascii=False).encode("utf-8"))
+        self.dispatched += 1
+
+    def run(self, source) -> None:
+        """Цикл получения обновлений до вызова stop"""
+        offset = 0
+        while not self.stopped.is_set():
+            try:
+                updates = source.get_updates(offset)
+            except Exception as e:
+                logger.error("❌ Ошибка получения обновлений: %s", e)
+                self.stopped.wait(3)
+                continue
+            for update in updates:
+                self.dispatch(update)
+                offset = update["update_id"] + 1
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Остановка: воркеры дообрабатывают свои очереди и завершаются"""
+        self.stopped.set()
+        for shard in self.shards:
+            shard.stop(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики раздачи и обработки по воркерам"""
+        return {
+            "dispatched": self.dispatched,
+            "processed": sum(shard.processed for shard in self.shards),
+            "lost": sum(shard.lost for shard in self.shards),
+            "restarts": sum(shard.restarts for shard in self.shards),
+            "queue_depth": sum(shard.queue.qsize() for shard in self.shards),
+            "per_worker": [shard.processed for shard in self.shards]
+        }
+
+def run_sharded(token: str, workers: int, queue_size: int) -> None:
+    """Запуск супервизора с long polling"""
+    supervisor = ShardSupervisor(workers, queue_size)
+    supervisor.start()
+    try:
+        supervisor.run(PollingSource(token))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# Окружение задаётся до импорта модулей бота: config читает его при импорте
+_TMP = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["STORAGE_MODE"] = "local"
+os.environ["DB_PATH"] = os.path.join(_TMP, "bot.db")
+os.environ["LOG_FILE"] = os.path.join(_TMP, "bot_log.jsonl")
+os.environ["METRICS_PORT"] = "0"
+os.environ["SESSION_SWEEP_INTERVAL"] = "0"
+os.environ.setdefault("TOKEN", "123456:TEST")
+
+import pytest
+from telebot import apihelper
+from benchmarks.fakes import FakeBotAPI
+
+@pytest.fixture
+def bot_api():
+    """FakeBotAPI, на который переключён telebot; после теста прежний адрес возвращается"""
+    api = FakeBotAPI().start()
+    api_url = apihelper.API_URL
+    apihelper.API_URL = api.api_url
+    yield api
+    apihelper.API_URL = api_url
+    api.stop()
@@ -0,0 +1,51 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from config import bot_config
+from utils.referral import ref_system
+
+ADMIN_ID = "42"
+
+class RecordingBot:
+    """Бот, который запоминает обработчики команд и ответы на них"""
+
+    def __init__(self):
+        self.commands = {}
+        self.replies = []
+        self.replied = threading.Event()
+
+    def message_handler(self, commands=None, **kwargs):
+        def decorator(handler):
+            for command in commands or []:
+                self.commands[command] = handler
+            return handler
+        return decorator
+
+    def reply_to(self, message, text):
+        self.replies.append((threading.current_thread().name, text))
+        self.replied.set()
+
+@pytest.fixture
+def bot(monkeypatch):
+    monkeypatch.setattr(bot_config, "ADMIN_ID", ADMIN_ID)
+    monkeypatch.setattr(ref_system, "bot_username", "test_bot")
+    bot = RecordingBot()
+    main.register_admin_handlers(bot)
+    return bot
+
+def command(text):
+    return SimpleNamespace(text=text, from_user=SimpleNamespace(id=int(ADMIN_ID)), chat=SimpleNamespace(id=int(ADMIN_ID)))
+
+def test_report_counts_buffered_clicks_and_is_sent_from_another_thread(bot):
+    _, link = ref_system.create_referral_link(None, "report-platform", "ads")
+    ref_system.track_conversions([(link.rsplit("=", 1)[1], "click")] * 2)
+
+    bot.commands["report"](command("/report"))
+
+    assert bot.replied.wait(10)
+    thread_name, text = bot.replies[0]
+    assert thread_name != threading.current_thread().name
+    assert "report-platform / ads: 2 →" in text
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+from telebot import types
+
+from async_bot import AsyncBotAdapter, DedupAsyncTeleBot
+
+def message_update(update_id, chat_id, text):
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Ann"},
+            "text": text
+        }
+    })
+
+def process(updates, max_workers=4):
+    """Обработать пакеты обновлений адаптером, как их отдаёт polling (пакеты не ждут друг друга)"""
+    handled = []
+    lock = threading.Lock()
+    adapter = AsyncBotAdapter(DedupAsyncTeleBot("123456:TEST"), max_workers=max_workers)
+
+    @adapter.message_handler(func=lambda message: True)
+    def record(message):
+        if message.text.startswith("slow"):
+            time.sleep(0.2)
+        with lock:
+            handled.append((message.chat.id, message.text))
+
+    async def run():
+        adapter.loop = asyncio.get_running_loop()
+        await asyncio.gather(*(adapter.bot.process_new_updates(batch) for batch in updates))
+        adapter.executor.shutdown(wait=True)
+
+    asyncio.run(run())
+    return handled
+
+def test_messages_of_one_chat_are_handled_in_order():
+    handled = process([
+        [message_update(7001, 1, "slow-a"), message_update(7002, 1, "b")],
+        [message_update(7003, 1, "c")]
+    ])
+
+    assert handled == [(1, "slow-a"), (1, "b"), (1, "c")]
+
+def test_other_chats_are_not_blocked_by_a_slow_chat():
+    handled = process([[message_update(7101, 1, "slow-a"), message_update(7102, 2, "b")]])
+
+    assert handled == [(2, "b"), (1, "slow-a")]
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from telebot import types
+
+from database import lead_key
+from utils.dedup import ActionClaims, DedupTeleBot, UpdateDeduplicator, claim_action, idempotency_key
+
+def message_update(update_id, chat_id, message_id, text="/start"):
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Ann"},
+            "text": text
+        }
+    })
+
+@pytest.fixture
+def claims(tmp_path):
+    return ActionClaims(str(tmp_path / "claims.db"))
+
+@pytest.fixture
+def dedup(claims):
+    return UpdateDeduplicator(100, claims)
+
+def test_filter_drops_repeated_update_id_and_message(dedup):
+    first = message_update(1, chat_id=10, message_id=1)
+
+    fresh = dedup.filter([first, message_update(1, chat_id=10, message_id=1), message_update(2, chat_id=10, message_id=1)])
+
+    assert fresh == [first]
+    assert dedup.duplicates == 2
+
+def test_repeated_start_from_new_message_is_processed(dedup):
+    updates = [message_update(1, chat_id=10, message_id=1), message_update(2, chat_id=10, message_id=2)]
+
+    assert dedup.filter(updates) == updates
+
+def test_claims_survive_a_new_instance(tmp_path, claims):
+    key = idempotency_key("complete", 10, "s1")
+    assert claims.claim(key)
+    assert not claims.claim(key)
+
+    restarted = ActionClaims(str(tmp_path / "claims.db"))
+
+    assert not restarted.claim(key)
+    restarted.release(key)
+    assert claims.claim(key)
+
+def test_claim_expires_after_ttl(claims):
+    assert claims.claim("reminder:10:s1", ttl=0.05)
+    assert not claims.claim("reminder:10:s1", ttl=0.05)
+    time.sleep(0.1)
+
+    assert claims.claim("reminder:10:s1", ttl=0.05)
+
+def test_claim_action_returns_key_once():
+    assert claim_action("complete", 20, "claim-once") == "complete:20:claim-once"
+    assert claim_action("complete", 20, "claim-once") is None
+
+def test_lead_key_is_derived_from_chat_and_session():
+    assert lead_key({"chat_id": 10, "session_id": "s1"}) == idempotency_key("complete", 10, "s1")
+    assert lead_key({"idempotency_key": "lead-1", "chat_id": 10, "session_id": "s1"}) == "lead-1"
+    assert lead_key({"name": "Ann"}) is None
+
+def test_polling_offset_moves_past_dropped_duplicates():
+    bot = DedupTeleBot("123456:TEST", threaded=False)
+    bot.process_new_updates([message_update(9001, chat_id=30, message_id=1)])
+
+    # Повтор того же сообщения с новым update_id отбрасывается, но смещение двигается за него
+    bot.process_new_updates([message_update(9002, chat_id=30, message_id=1)])
+
+    assert bot.last_update_id == 9002
@@ -0,0 +1,36 @@
+import pytest
+
+from config import test_config
+from levels import LevelScale
+
+@pytest.fixture
+def scale():
+    return LevelScale(test_config.LEVELS)
+
+@pytest.mark.parametrize("percentage, threshold", [
+    (0, 0), (49.9, 0), (50, 50), (69.9, 60), (70, 70), (89.9, 80), (90, 90), (100, 90)
+])
+def test_level_by_percentage(scale, percentage, threshold):
+    assert scale.level(percentage).threshold == threshold
+
+def test_nan_is_lowest_level_and_not_counted(scale):
+    nan = float("nan")
+
+    assert scale.level(nan).threshold == 0
+    assert list(scale.classify([nan, 55, 95])) == [0, 1, 5]
+    assert sum(scale.counts([nan, 55, 95]).values()) == 2
+
+def test_counts_are_ordered_from_lowest_level(scale):
+    counts = scale.counts([10, 20, 65, 95])
+
+    assert list(counts) == [level.name for level in scale.levels]
+    assert list(counts.values()) == [2, 0, 1, 0, 0, 1]
+
+def test_results_and_message(scale):
+    assert scale.results(7, 10) == {
+        "correct": 7, "total": 10, "percentage": 70.0, "level": test_config.LEVELS[70]["name"]
+    }
+    assert scale.results(0, 0)["percentage"] == 0.0
+    message = scale.result_message(7, 10)
+    assert "7/10" in message and test_config.LEVELS[70]["description"] in message
+    assert scale.result_message(7, 10) is message
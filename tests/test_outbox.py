@@ -0,0 +1,153 @@
+import sqlite3
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeSpreadsheet
+from config import bot_config
+from database import GoogleSheetsManager, LocalStorage, MirroredStorage, SheetsOutbox
+
+RESULTS = {"correct": 7, "total": 10, "percentage": 70.0, "level": ""}
+
+class FakeManager:
+    """Таблица для очереди: запоминает строки, а при failing отвечает ошибкой"""
+
+    def __init__(self):
+        self.rows = []
+        self.failing = False
+        self.resets = 0
+        self.ready = True
+
+    def _append_rows(self, rows):
+        if self.failing:
+            raise ConnectionError("Sheets API недоступен")
+        self.rows.extend(rows)
+
+    def reset(self):
+        self.resets += 1
+
+@pytest.fixture
+def manager():
+    return FakeManager()
+
+@pytest.fixture
+def outbox(manager, tmp_path):
+    # Без фонового потока: доставку тесты вызывают сами через flush()
+    outbox = SheetsOutbox(manager, str(tmp_path / "outbox.db"), flush_interval=60, batch_size=2)
+    yield outbox
+    outbox.close()
+
+def statuses(outbox):
+    return outbox.pool.connection().execute(
+        "SELECT status, attempts FROM sheets_outbox ORDER BY id"
+    ).fetchall()
+
+def test_rows_are_delivered_in_order_and_keys_deduplicate(manager, outbox):
+    assert outbox.put(["a"], key="lead-1")
+    assert not outbox.put(["a again"], key="lead-1")
+    assert outbox.put(["b"])
+    assert outbox.put(["c"])
+
+    assert outbox.flush() == 2
+    assert outbox.flush() == 1
+    assert manager.rows == [["a"], ["b"], ["c"]]
+    assert statuses(outbox) == [("delivered", 0)] * 3
+    assert outbox.stats()["duplicates"] == 1
+
+def test_claimed_rows_return_after_lease(outbox):
+    outbox.put(["a"])
+    # Процесс взял пакет и упал, не записав его: до конца аренды строку никто не берёт
+    outbox.LEASE = 0.05
+    claimed = outbox._claim()
+    assert len(claimed) == 1
+    assert outbox._claim() == []
+
+    time.sleep(0.1)
+    assert [row_id for row_id, _, _ in outbox._claim()] == [claimed[0][0]]
+
+def test_failed_flush_backs_off(manager, outbox):
+    outbox.put(["a"])
+    manager.failing = True
+
+    started = time.time()
+    assert outbox.flush() == 0
+
+    status, attempts, next_attempt_at, error = outbox.pool.connection().execute(
+        "SELECT status, attempts, next_attempt_at, last_error FROM sheets_outbox"
+    ).fetchone()
+    assert (status, attempts) == ("pending", 1)
+    # Первая пауза - от половины до целого OUTBOX_BACKOFF_BASE
+    assert started + bot_config.OUTBOX_BACKOFF_BASE * 0.5 <= next_attempt_at <= time.time() + bot_config.OUTBOX_BACKOFF_BASE
+    assert "недоступен" in error
+    assert outbox._wait_time() > 0
+    assert manager.resets == 1
+    assert outbox._claim() == []
+
+def test_row_goes_to_dead_letter_after_max_attempts(manager, outbox, monkeypatch):
+    monkeypatch.setattr(bot_config, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(bot_config, "OUTBOX_BACKOFF_BASE", 0.0)
+    outbox.put(["a"])
+    manager.failing = True
+
+    outbox.flush()
+    assert statuses(outbox) == [("pending", 1)]
+    outbox.flush()
+    assert statuses(outbox) == [("dead", 2)]
+    assert outbox.dead_count() == 1
+    assert outbox.dead_letters()[0]["row"] == ["a"]
+    assert outbox.flush() == 0
+
+    manager.failing = False
+    assert outbox.retry_dead() == 1
+    assert outbox.flush() == 1
+    assert manager.rows == [["a"]]
+
+def test_close_drains_the_queue(manager, outbox):
+    outbox.start()
+    for row in (["a"], ["b"], ["c"]):
+        outbox.put(row)
+
+    outbox.close()
+
+    assert manager.rows == [["a"], ["b"], ["c"]]
+    assert outbox.pending_count() == 0
+    with pytest.raises(RuntimeError):
+        outbox.put(["late"])
+
+@pytest.fixture
+def mirrored(tmp_path):
+    path = str(tmp_path / "bot.db")
+    storage = MirroredStorage(LocalStorage(path), GoogleSheetsManager(sheet=FakeSpreadsheet().sheet1, outbox_path=path))
+    yield storage
+    storage.mirror.close()
+
+def outbox_rows(storage) -> int:
+    # Строки считаются в любом статусе: фоновая доставка могла их уже отправить
+    return storage.local.pool.connection().execute("SELECT COUNT(*) FROM sheets_outbox").fetchone()[0]
+
+def test_mirrored_save_writes_lead_and_outbox_row_together(mirrored):
+    user = {"name": "Ann", "idempotency_key": "lead-1"}
+
+    mirrored.save_user_data(user, RESULTS)
+    mirrored.save_user_data(user, RESULTS)
+
+    assert mirrored.count_leads() == 1
+    assert outbox_rows(mirrored) == 1
+    assert mirrored.outbox.stats()["duplicates"] == 1
+
+def test_failed_lead_insert_rolls_back_outbox_row(mirrored, monkeypatch):
+    def broken_insert(conn, row):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(mirrored.local, "insert", broken_insert)
+    with pytest.raises(sqlite3.OperationalError):
+        mirrored.save_user_data({"name": "Ann"}, RESULTS)
+
+    assert outbox_rows(mirrored) == 0
+
+def test_storages_in_different_files_are_rejected(tmp_path):
+    manager = GoogleSheetsManager(sheet=FakeSpreadsheet().sheet1, outbox_path=str(tmp_path / "outbox.db"))
+    manager.writer.close()
+
+    with pytest.raises(ValueError):
+        MirroredStorage(LocalStorage(str(tmp_path / "leads.db")), manager)
@@ -0,0 +1,94 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from questions import Question, QuestionBank, QuestionBankRegistry
+
+# 100 вопросов пяти сложностей: 40, 30, 20, 6 и 4
+SIZES = {1: 40, 2: 30, 3: 20, 4: 6, 5: 4}
+
+@pytest.fixture
+def bank():
+    questions = [
+        Question(text=f"q{difficulty}-{i}", correct_answer="a", wrong_answers=["b", "c"], difficulty=difficulty)
+        for difficulty, size in SIZES.items() for i in range(size)
+    ]
+    return QuestionBank(questions)
+
+def test_selection_keeps_difficulty_proportions(bank):
+    ids = bank.get_question_ids(10, random.Random(1))
+
+    assert len(set(ids)) == 10
+    # Доли 4/3/2/0.6/0.4; редкие сложности всё равно получают по вопросу
+    assert Counter(bank.get_question(i).difficulty for i in ids) == {1: 3, 2: 3, 3: 2, 4: 1, 5: 1}
+
+def test_selection_is_reproducible_with_seed(bank):
+    assert bank.get_question_ids(10, random.Random(7)) == bank.get_question_ids(10, random.Random(7))
+
+def test_count_is_capped_by_bank_size(bank):
+    ids = bank.get_question_ids(500, random.Random(1))
+
+    assert sorted(ids) == list(range(100))
+
+def write_bank(path, version: int, texts=("one", "two"), extra: str = "") -> None:
+    lines = [json.dumps({"version": version})]
+    lines += [
+        json.dumps({"text": text, "correct_answer": "a", "wrong_answers": ["b"], "difficulty": 1}) for text in texts
+    ]
+    path.write_text("\n".join(lines) + "\n" + extra, encoding="utf-8")
+
+@pytest.fixture
+def bank_path(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    write_bank(path, 1)
+    return path
+
+@pytest.mark.parametrize("line", [
+    '{"text": "no difficulty", "correct_answer": "a", "wrong_answers": ["b"]}\n',
+    '{"text": "broken", "difficulty": 1, \n',
+    '{"text": "no answers", "correct_answer": "a", "difficulty": 1}\n',
+])
+def test_reload_rejects_invalid_line_and_keeps_current_bank(bank_path, line):
+    registry = QuestionBankRegistry(str(bank_path))
+    assert registry.current().version == "1"
+
+    write_bank(bank_path, 2, extra=line)
+    with pytest.raises(ValueError, match="строка 4"):
+        registry.reload()
+
+    assert registry.current().version == "1"
+    assert registry.get("2") is None
+
+def test_changed_file_without_new_version_is_rejected(bank_path):
+    registry = QuestionBankRegistry(str(bank_path))
+    bank = registry.current()
+
+    # Тот же файл перечитывается без замены банка
+    assert registry.reload() is bank
+
+    write_bank(bank_path, 1, texts=("one", "changed"))
+    with pytest.raises(ValueError, match="без смены версии"):
+        registry.reload()
+    assert registry.current() is bank
+    assert registry.get("1").get_question(1).text == "two"
+
+def test_versions_with_live_sessions_are_kept(bank_path):
+    in_use = {"1"}
+    registry = QuestionBankRegistry(str(bank_path), keep_versions=3, versions_in_use=lambda: in_use)
+    first = registry.current()
+
+    for version in (2, 3, 4):
+        write_bank(bank_path, version)
+        registry.reload()
+
+    # Версия 1 хранится ради незавершённых сессий, из остальных - последние
+    assert registry.get("1") is first
+    assert registry.get("2") is None
+    assert [registry.get(version) is not None for version in ("3", "4")] == [True, True]
+
+    in_use.clear()
+    write_bank(bank_path, 5)
+    registry.reload()
+    assert registry.get("1") is None
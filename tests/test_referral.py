@@ -0,0 +1,89 @@
+import pytest
+
+from config import bot_config
+from database import get_db_connection
+from utils.referral import ReferralSystem
+
+@pytest.fixture
+def referrals():
+    # Фоновая запись почти не просыпается сама: тесты управляют flush() явно
+    system = ReferralSystem(flush_interval=60, batch_size=100, bot_username="test_bot")
+    yield system
+    system.close()
+
+def code_of(link: str) -> str:
+    return link.rsplit("=", 1)[1]
+
+def raw_conversions(code: str) -> int:
+    return get_db_connection().execute("SELECT COUNT(*) FROM conversions WHERE code = ?", (code,)).fetchone()[0]
+
+def test_conversions_are_rolled_up_per_platform(referrals):
+    _, link = referrals.create_referral_link(601, "instagram", "ads")
+    instagram = code_of(link)
+    _, link = referrals.create_referral_link(601, "tiktok", "ads")
+    tiktok = code_of(link)
+
+    referrals.track_conversions([
+        (instagram, "click"), (instagram, "click"), (instagram, "start"), (tiktok, "complete")
+    ])
+
+    assert referrals.get_partner_stats(601) == {
+        "total_clicks": 2,
+        "total_starts": 1,
+        "total_completes": 1,
+        "by_platform": {"instagram": {"clicks": 2, "starts": 1}, "tiktok": {"completes": 1}}
+    }
+
+def test_unknown_code_is_skipped(referrals):
+    _, link = referrals.create_referral_link(602, "telegram", "ads")
+    before = referrals.get_total_stats()["total_conversions"]
+
+    assert referrals.track_conversions([("missing", "click"), (code_of(link), "click")]) == 1
+    assert not referrals.track_conversion("missing", "start")
+
+    assert referrals.unknown_codes == 2
+    assert referrals.get_total_stats()["total_conversions"] == before + 1
+
+def test_rollup_matches_raw_history(referrals):
+    _, link = referrals.create_referral_link(603, "youtube", "ads")
+    referrals.track_conversions([(code_of(link), "click")] * 3 + [(code_of(link), "start")])
+    referrals.flush()
+
+    conn = get_db_connection()
+    raw = conn.execute("SELECT COUNT(*) FROM conversions").fetchone()[0]
+    rolled = conn.execute("SELECT SUM(count) FROM conversion_stats").fetchone()[0]
+    assert raw == rolled
+    assert referrals.get_total_stats()["total_conversions"] == raw
+
+def test_conversions_are_buffered_until_flush(referrals):
+    _, link = referrals.create_referral_link(604, "instagram", "ads")
+    code = code_of(link)
+
+    referrals.track_conversions([(code, "click")] * 3)
+    assert raw_conversions(code) == 0
+
+    assert referrals.flush() == 3
+    assert raw_conversions(code) == 3
+
+def test_code_created_elsewhere_is_resolved_from_database(referrals):
+    # Ссылку создал другой экземпляр (другой процесс в режиме sharded) после прогрева кэша
+    referrals.warm_up()
+    partner_id, link = ReferralSystem(flush_interval=60, batch_size=100, bot_username="test_bot").create_referral_link(605, "tiktok", "ads")
+
+    assert referrals.resolve(code_of(link)) == (partner_id, "tiktok", "ads")
+
+def test_new_partners_get_distinct_ids(referrals):
+    first, _ = referrals.create_referral_link(None, "instagram", "ads")
+    second, _ = referrals.create_referral_link(None, "instagram", "ads")
+
+    assert second == first + 1
+
+def test_link_uses_bot_username_from_get_me(bot_api):
+    system = ReferralSystem(flush_interval=60, batch_size=100)
+    with pytest.raises(RuntimeError):
+        system.create_referral_link(None, "instagram", "ads")
+
+    assert system.resolve_bot_username(bot_config.TOKEN) == "bot"
+    _, link = system.create_referral_link(None, "instagram", "ads")
+
+    assert link.startswith("https://t.me/bot?start=")
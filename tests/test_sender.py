@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from telebot import TeleBot
+
+from utils.sender import MessageScheduler, ScheduledBot
+
+def new_scheduler(**options) -> MessageScheduler:
+    settings = {"global_rate": 100.0, "chat_rate": 100.0, "chat_burst": 100.0, "workers": 2}
+    settings.update(options)
+    return MessageScheduler(TeleBot("123456:TEST", threaded=False), **settings)
+
+@pytest.fixture
+def scheduler(bot_api):
+    scheduler = new_scheduler()
+    yield scheduler
+    scheduler.close(timeout=5)
+
+def sent_texts(bot_api, chat_id: int):
+    return [message["text"] for message in bot_api.messages if int(message["chat_id"]) == chat_id]
+
+def test_queued_messages_of_one_chat_are_merged(bot_api, scheduler):
+    # Пока очередь занята тестом, воркеры не забирают сообщения, и все три копятся в очереди чата
+    with scheduler._cond:
+        for text in ("one", "two", "three"):
+            scheduler.send(7, text)
+    scheduler.close(timeout=5)
+
+    assert sent_texts(bot_api, 7) == ["one\n\ntwo\n\nthree"]
+    assert scheduler.stats()["merged"] == 2
+    assert bot_api.calls["sendMessage"] == 1
+
+def test_message_with_keyboard_is_not_merged_into(bot_api, scheduler):
+    with scheduler._cond:
+        scheduler.send(7, "question", reply_markup='{"keyboard": [[{"text": "A"}]]}')
+        scheduler.send(7, "hint")
+    scheduler.close(timeout=5)
+
+    assert sent_texts(bot_api, 7) == ["question", "hint"]
+    assert scheduler.stats()["merged"] == 0
+
+def test_chat_order_is_kept_across_chats(bot_api):
+    scheduler = new_scheduler(chat_rate=50.0, chat_burst=1.0)
+
+    for i in range(5):
+        for chat_id in (1, 2):
+            scheduler.send(chat_id, f"{chat_id}-{i}", reply_markup='{"remove_keyboard": true}')
+    scheduler.close(timeout=10)
+
+    assert sent_texts(bot_api, 1) == [f"1-{i}" for i in range(5)]
+    assert sent_texts(bot_api, 2) == [f"2-{i}" for i in range(5)]
+
+def test_429_is_retried_after_retry_after(bot_api):
+    # Каждый второй вызов sendMessage получает 429 с retry_after = 1 с
+    bot_api.rate_limit_every = 2
+    bot_api.retry_after = 1
+    scheduler = new_scheduler(workers=1)
+
+    started = time.monotonic()
+    scheduler.send(1, "first")
+    scheduler.send(2, "second")
+    scheduler.close(timeout=10)
+    elapsed = time.monotonic() - started
+
+    assert sorted(message["text"] for message in bot_api.messages) == ["first", "second"]
+    assert bot_api.calls["429"] == 1
+    stats = scheduler.stats()
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (2, 1, 0)
+    assert elapsed >= 0.9
+
+def test_429_pauses_every_chat(bot_api):
+    bot_api.rate_limit_every = 2
+    bot_api.retry_after = 1
+    scheduler = new_scheduler(workers=1)
+
+    started = time.perf_counter()
+    with scheduler._cond:
+        for chat_id in (1, 2, 3):
+            scheduler.send(chat_id, f"to {chat_id}")
+    scheduler.close(timeout=10)
+
+    received = {chat_id: bot_api.inbox(chat_id).get_nowait()["_received"] - started for chat_id in (1, 2, 3)}
+    # 429 получил второй чат, но лимит мог быть общим: третий чат ждёт вместе с ним
+    assert received[1] < 0.5
+    assert received[3] >= 0.9
+
+def test_other_chat_calls_keep_their_place_in_the_queue(bot_api, scheduler):
+    with scheduler._cond:
+        scheduler.send(5, "caption follows")
+        scheduler.call(5, "send_photo", 5, "photo-id")
+        scheduler.send(5, "after photo")
+    scheduler.close(timeout=5)
+
+    assert [message.get("text", message.get("photo")) for message in bot_api.messages] == [
+        "caption follows", "photo-id", "after photo"
+    ]
+    assert scheduler.stats()["merged"] == 0
+
+def test_scheduled_bot_returns_the_sent_message(bot_api, scheduler):
+    bot = ScheduledBot(scheduler.bot, scheduler)
+
+    message = bot.send_message(5, "hello")
+    photo = bot.send_photo(5, "photo-id")
+    reply = bot.reply_to(message, "reply")
+
+    assert (message.message_id, message.text) == (1, "hello")
+    assert photo.message_id == 2
+    assert bot_api.messages[2]["reply_to_message_id"] == "1"
+    assert scheduler.stats()["sent"] == 3
+    assert reply.text == "reply"
+
+def test_scheduled_bot_calls_methods_without_chat_directly(bot_api, scheduler):
+    bot = ScheduledBot(scheduler.bot, scheduler)
+
+    assert bot.get_me().username == "bot"
+    assert bot.edit_message_text("inline", inline_message_id="abc") is True
+    assert scheduler.stats()["queued"] == 0
@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeUpdateSource
+from sharded import ShardSupervisor, raw_chat_id
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+def flaky_worker(index, conn, workers, api_url):
+    """Воркер, который падает при первом запуске до сигнала готовности, а затем подтверждает каждое обновление"""
+    marker = os.path.join(os.environ["SHARD_TEST_DIR"], f"started{index}")
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(3)
+    conn.send_bytes(b"")
+    while conn.recv_bytes():
+        conn.send_bytes(b"")
+
+def test_raw_chat_id_of_message_and_callback():
+    assert raw_chat_id({"update_id": 1, "message": {"chat": {"id": 5}}}) == 5
+    assert raw_chat_id({"update_id": 2, "callback_query": {"from": {"id": 6}, "message": {"chat": {"id": 7}}}}) == 7
+    assert raw_chat_id({"update_id": 3, "callback_query": {"from": {"id": 6}}}) == 6
+    assert raw_chat_id({"update_id": 4}) == 0
+
+def test_dispatch_keeps_each_chat_on_one_worker_in_order():
+    # Воркеры не запускаются: обновления остаются в очередях шардов
+    supervisor = ShardSupervisor(3, queue_size=1000)
+    source = FakeUpdateSource(chats=7, messages=4)
+
+    for update in source.updates:
+        supervisor.dispatch(update)
+
+    for index, shard in enumerate(supervisor.shards):
+        queued = [json.loads(shard.queue.get_nowait()) for _ in range(shard.queue.qsize())]
+        assert all(raw_chat_id(update) % 3 == index for update in queued)
+        by_chat = {}
+        for update in queued:
+            by_chat.setdefault(raw_chat_id(update), []).append(update["message"]["message_id"])
+        assert all(ids == sorted(ids) for ids in by_chat.values())
+    assert supervisor.dispatched == len(source.updates)
+
+def test_killed_worker_is_restarted_without_losing_queued_updates(bot_api):
+    pytest.importorskip("handlers")
+    supervisor = ShardSupervisor(2, queue_size=1000)
+    supervisor.start()
+    try:
+        assert wait_for(lambda: all(shard.ready for shard in supervisor.shards), timeout=60)
+
+        # Обновления раздаются уже мёртвому воркеру: kill() не ждёт завершения процесса
+        supervisor.shards[0].process.kill()
+        supervisor.shards[0].process.join(5)
+        source = FakeUpdateSource(chats=4, messages=3)
+        for update in source.updates:
+            supervisor.dispatch(update)
+
+        total = len(source.updates)
+        assert wait_for(lambda: supervisor.stats()["processed"] + supervisor.stats()["lost"] == total, timeout=60)
+        stats = supervisor.stats()
+        # Воркер упал без обновления в работе: все обновления дошли до нового процесса
+        assert stats["restarts"] == 1
+        assert stats["lost"] == 0
+        assert all(count > 0 for count in stats["per_worker"])
+    finally:
+        supervisor.stop(timeout=5)
+
+def test_worker_failing_at_startup_is_restarted_before_updates_are_sent(tmp_path, monkeypatch):
+    monkeypatch.setenv("SHARD_TEST_DIR", str(tmp_path))
+    supervisor = ShardSupervisor(2, queue_size=1000, target=flaky_worker)
+    source = FakeUpdateSource(chats=4, messages=3)
+    for update in source.updates:
+        supervisor.dispatch(update)
+
+    supervisor.start()
+    try:
+        total = len(source.updates)
+        assert wait_for(lambda: supervisor.stats()["processed"] == total, timeout=60)
+        stats = supervisor.stats()
+        assert stats["restarts"] == 2
+        assert stats["lost"] == 0
+        assert all(shard.process.exitcode is None for shard in supervisor.shards)
+    finally:
+        supervisor.stop(timeout=5)
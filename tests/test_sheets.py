@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks.fakes import FakeSpreadsheet
+from database import COLUMN_WIDTHS, GoogleSheetsManager, SHEET_HEADERS
+
+class FakeClient:
+    """Авторизованный клиент gspread, который открывает одну таблицу в памяти"""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open(self, name: str) -> FakeSpreadsheet:
+        return self.spreadsheet
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet()
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+def make_manager(sheet, outbox_path: str) -> GoogleSheetsManager:
+    manager = GoogleSheetsManager(sheet=sheet, outbox_path=outbox_path)
+    # Фоновая отправка не нужна: тесты вызывают _append_rows напрямую
+    manager.writer.close()
+    return manager
+
+def test_empty_sheet_gets_headers_in_one_batch_update(spreadsheet, outbox_path):
+    make_manager(spreadsheet.sheet1, outbox_path)
+
+    assert spreadsheet.calls == {"row_values": 1, "batch_update": 1}
+    assert spreadsheet.sheet1.rows[0] == SHEET_HEADERS
+    kinds = [next(iter(request)) for request in spreadsheet.requests]
+    assert kinds == ["updateCells", "repeatCell"] + ["updateDimensionProperties"] * len(COLUMN_WIDTHS)
+
+def test_existing_headers_are_only_read(spreadsheet, outbox_path):
+    spreadsheet.sheet1.rows.append(list(SHEET_HEADERS))
+
+    make_manager(spreadsheet.sheet1, outbox_path)
+
+    assert spreadsheet.calls == {"row_values": 1}
+
+def test_headers_are_checked_once_per_connection(spreadsheet, outbox_path):
+    manager = make_manager(spreadsheet.sheet1, outbox_path)
+    manager._append_rows([["a"] * len(SHEET_HEADERS)])
+    manager._append_rows([["b"] * len(SHEET_HEADERS)])
+    assert spreadsheet.calls["row_values"] == 1
+
+    # После ошибки таблица переоткрывается, и заголовки проверяются заново
+    manager.client = FakeClient(spreadsheet)
+    manager.reset()
+    manager._append_rows([["c"] * len(SHEET_HEADERS)])
+    assert spreadsheet.calls["row_values"] == 2
+    assert [row[0] for row in spreadsheet.sheet1.rows] == [SHEET_HEADERS[0], "a", "b", "c"]
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from utils.states import ChatState, MemoryStateStore, SQLiteStateStore
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SQLiteStateStore(ttl=60, path=str(tmp_path / "states.db"))
+
+def test_state_survives_json_round_trip():
+    state = ChatState(step="question", question_index=3, score=2, question_ids=[5, 1, 9], answers={"goal": "work"})
+
+    restored = ChatState.from_json(state.to_json())
+
+    assert restored == state
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStateStore(ttl=60, max_size=2)
+    store.set(1, ChatState(step="a"))
+    store.set(2, ChatState(step="b"))
+    store.set(1, ChatState(step="c"))
+
+    store.set(3, ChatState(step="d"))
+
+    assert store.get(2) is None
+    assert [store.get(1).step, store.get(3).step] == ["c", "d"]
+    assert len(store) == 2
+
+def test_memory_store_expires_idle_chats():
+    store = MemoryStateStore(ttl=0.05, max_size=10)
+    store.set(1, ChatState(step="a"))
+    store.set(2, ChatState(step="b"))
+    time.sleep(0.1)
+    store.set(3, ChatState(step="c"))
+
+    assert store.expire() == 2
+    assert store.get(1) is None
+    assert store.get(3).step == "c"
+
+def test_sqlite_store_keeps_state_and_expires_it(sqlite_store):
+    sqlite_store.set(7, ChatState(step="survey", answers={"age": "25"}))
+
+    assert sqlite_store.get(7).answers == {"age": "25"}
+    assert len(sqlite_store) == 1
+
+    sqlite_store.ttl = 0
+    time.sleep(0.01)
+    assert sqlite_store.get(7) is None
+    assert sqlite_store.expire() == 1
+    assert len(sqlite_store) == 0
+
+def test_sqlite_store_delete(sqlite_store):
+    sqlite_store.set(7, ChatState(step="survey"))
+
+    sqlite_store.delete(7)
+
+    assert sqlite_store.get(7) is None
+
+def test_stores_report_bank_versions_of_live_chats(sqlite_store):
+    memory_store = MemoryStateStore(ttl=60, max_size=10)
+    for store in (memory_store, sqlite_store):
+        store.set(1, ChatState(bank_version="3"))
+        store.set(2, ChatState(bank_version="4"))
+        store.set(3, ChatState())
+
+        assert store.bank_versions() == {"3", "4"}
+
+        store.ttl = 0
+        time.sleep(0.01)
+        assert store.bank_versions() == set()
@@ -0,0 +1,32 @@
+import pytest
+
+from database import LocalStorage, StorageBackend
+
+USER = {"name": "Ann", "username": "ann", "goal": "work", "phone": "+380000000000"}
+RESULTS = {"correct": 7, "total": 10, "percentage": 70.0, "level": ""}
+
+@pytest.fixture
+def local(tmp_path):
+    storage = LocalStorage(str(tmp_path / "leads.db"))
+    yield storage
+    storage.close()
+
+def test_backend_must_implement_reads_and_writes():
+    class WriteOnly(StorageBackend):
+        def save_user_data(self, user_data, test_results):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnly()
+
+def test_local_storage_keeps_leads_newest_first(local):
+    local.save_user_data(USER, RESULTS)
+    local.save_user_data({**USER, "name": "Bob", "username": ""}, {**RESULTS, "correct": 9, "percentage": 90.0})
+
+    assert local.count_leads() == 2
+    newest, oldest = local.get_leads()
+    assert (newest["name"], newest["telegram"], newest["result"]) == ("Bob", "Не вказано", "9/10")
+    assert (oldest["name"], oldest["telegram"], oldest["percentage"]) == ("Ann", "@ann", "70.0%")
+    # Уровень без явного значения считается по проценту
+    assert oldest["level"].startswith("B2+")
+    assert local.get_leads(limit=1, offset=1) == [oldest]
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+from telebot import TeleBot
+
+from database import get_db_connection
+from utils.states import ChatState, MemoryStateStore
+from utils.sweeper import SessionSweeper
+
+TTL = 0.1
+
+def ask_name(message):
+    pass
+
+@pytest.fixture
+def store():
+    return MemoryStateStore(ttl=60, max_size=100)
+
+@pytest.fixture
+def bot():
+    return TeleBot("123456:TEST", threaded=False)
+
+@pytest.fixture
+def sweeper(store, bot):
+    # Без фонового потока: обходы запускаются явно
+    sweeper = SessionSweeper(store, ttl=TTL, interval=0)
+    sweeper.start(bot)
+    return sweeper
+
+def dropoffs(chat_id):
+    return get_db_connection().execute(
+        "SELECT step, referral_code, session_id FROM dropoffs WHERE chat_id = ?", (chat_id,)
+    ).fetchall()
+
+def test_handler_registered_again_after_an_answer_is_not_stale(sweeper, bot):
+    bot.register_next_step_handler_by_chat_id(801, ask_name)
+    sweeper.sweep()
+    time.sleep(TTL * 1.5)
+
+    # Пользователь ответил, и обработчик той же функции зарегистрирован заново
+    bot.clear_step_handler_by_chat_id(801)
+    bot.register_next_step_handler_by_chat_id(801, ask_name)
+
+    assert sweeper.sweep() == 0
+    assert 801 in bot.next_step_backend.handlers
+
+def test_stale_handler_is_released_with_its_state(sweeper, bot, store):
+    state = ChatState(step="survey", referral_code="abc")
+    store.set(802, state)
+    bot.register_next_step_handler_by_chat_id(802, ask_name)
+    sweeper.sweep()
+    time.sleep(TTL * 1.5)
+
+    assert sweeper.sweep() == 1
+    assert 802 not in bot.next_step_backend.handlers
+    assert store.get(802) is None
+    assert dropoffs(802) == [("survey", "abc", state.session_id)]
@@ -0,0 +1,90 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+class RecordingBot:
+    """Бот, который запоминает обновления; пока gate сброшен, обработка ждёт теста"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.updates = []
+        self.started = threading.Event()
+        self.processed = threading.Event()
+
+    def process_new_updates(self, updates):
+        self.started.set()
+        self.gate.wait(5)
+        self.updates.extend(updates)
+        self.processed.set()
+
+def make_update(update_id: int, chat_id: int = 42) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+            "text": "hello"
+        }
+    }
+
+def post(server: WebhookServer, body: bytes, path: str = "/hook", secret: str = SECRET) -> int:
+    host, port = server.address
+    request = urllib.request.Request(f"http://{host}:{port}{path}", data=body, method="POST")
+    if secret:
+        request.add_header(SECRET_HEADER, secret)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+@pytest.fixture
+def bot():
+    return RecordingBot()
+
+@pytest.fixture
+def server(bot):
+    server = WebhookServer(bot, "127.0.0.1", 0, path="/hook", secret=SECRET, workers=1, queue_size=1)
+    server.start()
+    yield server
+    server.stop()
+
+def test_valid_update_is_accepted_and_processed(bot, server):
+    assert post(server, json.dumps(make_update(1)).encode()) == 200
+    assert bot.processed.wait(5)
+    assert [update.update_id for update in bot.updates] == [1]
+    assert server.stats()["accepted"] == 1
+
+def test_wrong_secret_is_forbidden(server):
+    assert post(server, json.dumps(make_update(1)).encode(), secret="") == 403
+    assert post(server, json.dumps(make_update(2)).encode(), secret="wrong") == 403
+    assert server.stats()["accepted"] == 0
+
+def test_unknown_path_is_not_found(server):
+    assert post(server, json.dumps(make_update(1)).encode(), path="/other") == 404
+
+def test_malformed_body_is_rejected(server):
+    assert post(server, b"not json") == 400
+    assert post(server, b"[]") == 400
+
+def test_full_queue_answers_503(bot, server):
+    bot.gate.clear()
+
+    # Первое обновление занимает воркер, второе - единственное место в очереди
+    assert post(server, json.dumps(make_update(1)).encode()) == 200
+    assert bot.started.wait(5)
+    assert post(server, json.dumps(make_update(2)).encode()) == 200
+    assert post(server, json.dumps(make_update(3)).encode()) == 503
+    assert server.stats()["rejected"] == 1
+
+    bot.gate.set()
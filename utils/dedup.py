@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional
+from telebot import TeleBot
+from config import bot_config
+from database import get_pool
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+class RecentKeys:
+    """Скользящее окно последних ключей: кольцевой буфер фиксированного размера и словарь сроков"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._ring: Deque[Hashable] = deque()
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, ttl: Optional[float] = None) -> bool:
+        """Запомнить ключ; False, если он уже есть в окне и его срок (ttl, с) не истёк"""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is not None and expires > now:
+                return False
+            if expires is None:
+                # Самый старый ключ вытесняется, память не растёт
+                if len(self._ring) >= self.size:
+                    self._expires.pop(self._ring.popleft(), None)
+                self._ring.append(key)
+            self._expires[key] = now + ttl if ttl else float("inf")
+            return True
+
+    def discard(self, key: Hashable) -> None:
+        """Забыть ключ раньше срока (место в буфере освободится при вытеснении)"""
+        with self._lock:
+            if key in self._expires:
+                self._expires[key] = 0.0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._expires.get(key, 0.0) > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+class ActionClaims:
+    """Занятые ключи действий в SQLite: действие не повторяется и после перезапуска бота"""
+
+    def __init__(self, path: str):
+        self.pool = get_pool(path)
+        conn = self.pool.connection()
+        # expires_at NULL - ключ занят бессрочно
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS action_claims (
+                key TEXT PRIMARY KEY,
+                expires_at REAL
+            )
+        """)
+        conn.commit()
+
+    def claim(self, key: str, ttl: Optional[float] = None) -> bool:
+        """Занять ключ; False, если он уже занят и его срок (ttl, с) не истёк"""
+        now = time.time()
+        conn = self.pool.connection()
+        with conn:
+            # Удаление истёкшего ключа и вставка в одной транзакции записи
+            conn.execute("DELETE FROM action_claims WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO action_claims (key, expires_at) VALUES (?, ?)",
+                (key, now + ttl if ttl else None)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, key: str) -> None:
+        """Освободить ключ, например если действие не удалось и его нужно повторить"""
+        conn = self.pool.connection()
+        with conn:
+            conn.execute("DELETE FROM action_claims WHERE key = ?", (key,))
+
+class UpdateDeduplicator:
+    """Отсев повторно доставленных обновлений и однократное выполнение действий по ключу идемпотентности"""
+
+    def __init__(self, size: int, claims: ActionClaims):
+        self.seen = RecentKeys(size)
+        self.claims = claims
+        self.duplicates = 0
+
+    @staticmethod
+    def update_keys(update: Any) -> List[Hashable]:
+        """Ключи обновления: update_id, а также (chat_id, message_id) или id callback-запроса"""
+        keys: List[Hashable] = [("update", update.update_id)]
+        message = update.message or update.channel_post
+        if message is not None:
+            keys.append(("message", message.chat.id, message.message_id))
+        elif update.callback_query is not None:
+            keys.append(("callback", update.callback_query.id))
+        return keys
+
+    def is_duplicate(self, update: Any) -> bool:
+        # Все ключи запоминаются, даже если первый уже встречался
+        known = [not self.seen.add(key) for key in self.update_keys(update)]
+        return any(known)
+
+    def filter(self, updates: List[Any]) -> List[Any]:
+        """Обновления без повторов"""
+        fresh = []
+        for update in updates:
+            if self.is_duplicate(update):
+                self.duplicates += 1
+                logger.info("⚠️ Повторное обновление %s пропущено", update.update_id)
+            else:
+                fresh.append(update)
+        return fresh
+
+    def claim(self, key: str, ttl: Optional[float] = None) -> bool:
+        """Занять ключ действия; False, если действие с этим ключом уже выполнялось (в пределах ttl, с)"""
+        return self.claims.claim(key, ttl)
+
+    def release(self, key: str) -> None:
+        """Освободить ключ действия"""
+        self.claims.release(key)
+
+def idempotency_key(action: str, chat_id: int, session_id: str) -> str:
+    """Ключ идемпотентности действия в сессии диалога, например завершения теста.
+
+    По нему же database.lead_key отсеивает повторную строку лида (chat_id и session_id в user_data):
+    очередь записи в Google Sheets не создаст вторую строку, даже если повтор придёт после перезапуска бота.
+    """
+    return f"{action}:{chat_id}:{session_id}"
+
+def claim_action(action: str, chat_id: int, session_id: str, ttl: Optional[float] = None) -> Optional[str]:
+    """Занять действие сессии; ключ идемпотентности или None, если действие уже выполнялось"""
+    key = idempotency_key(action, chat_id, session_id)
+    return key if update_dedup.claim(key, ttl) else None
+
+class DedupTeleBot(TeleBot):
+    """TeleBot, который отбрасывает повторно доставленные обновления до обработчиков"""
+
+    def process_new_updates(self, updates):
+        super().process_new_updates(update_dedup.filter(updates))
+        # Смещение long polling двигается только в TeleBot.process_new_updates: без этого отброшенный
+        # последним повтор запрашивался бы у Telegram снова при каждом опросе
+        if updates:
+            self.last_update_id = max(self.last_update_id, max(update.update_id for update in updates))
+
+# Создаем глобальный экземпляр фильтра повторов
+update_dedup = UpdateDeduplicator(bot_config.DEDUP_SIZE, ActionClaims(bot_config.DB_PATH))
+metrics.gauge("bot_duplicate_updates", "Отброшенные повторные обновления", lambda: update_dedup.duplicates)
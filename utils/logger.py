@@ -0,0 +1,112 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+from config import log_config
+
+# Стандартные атрибуты LogRecord: всё остальное пришло через extra и попадает в событие как поле
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Событие лога одной строкой JSON: время, уровень, логгер, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                event[key] = value
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Обработчик горячего пути: кладёт запись в очередь без форматирования и без ожидания"""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и JSON собирает поток записи; здесь только трейсбек, чтобы не держать кадры стека
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Переполненная очередь означает, что диск не успевает: теряем запись, а не время обработчика
+            self.dropped += 1
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Сжатие файла при ротации"""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def _create_file_handler(path: str) -> RotatingFileHandler:
+    handler = RotatingFileHandler(
+        path, maxBytes=log_config.MAX_BYTES, backupCount=log_config.BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def _configure_root() -> None:
+    """Настройка корневого логгера: очередь в памяти и фоновая запись событий JSONL в файл"""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if _queue_handler is not None or root.handlers:
+        return
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=log_config.QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(log_config.LEVEL)
+    _listener = QueueListener(log_queue, _create_file_handler(log_config.FILE), respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+def shutdown() -> None:
+    """Дописать накопленные события и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def redirect(path: str) -> None:
+    """Переключить запись событий в другой файл (у каждого процесса-воркера свой файл и своя ротация)"""
+    global _listener
+    _configure_root()
+    if _queue_handler is None:
+        return
+    shutdown()
+    _listener = QueueListener(_queue_handler.queue, _create_file_handler(path), respect_handler_level=True)
+    _listener.start()
+
+def dropped_records() -> int:
+    """Сколько записей потеряно из-за переполнения очереди"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+def get_logger(name: str) -> logging.Logger:
+    """Получить логгер модуля"""
+    _configure_root()
+    return logging.getLogger(name)
@@ -0,0 +1,287 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import log_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Границы корзин гистограммы задержек в секундах (последняя корзина - +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+    __slots__ = ("counts", "total", "count", "errors", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, failed: bool = False) -> None:
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+            if failed:
+                self.errors += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int, int]:
+        with self._lock:
+            return list(self.counts), self.total, self.count, self.errors
+
+    @staticmethod
+    def quantile(counts: List[int], count: int, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает квантиль q"""
+        rank = q * count
+        seen = 0
+        for bound, bucket in zip(BUCKETS, counts):
+            seen += bucket
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class MetricsRegistry:
+    """Задержки обработчиков и вызовов хранилищ, а также глубины очередей"""
+
+    # Семейства гистограмм: имя метрики Prometheus и имя метки
+    FAMILIES = {
+        "handler": ("bot_handler_seconds", "handler"),
+        "call": ("bot_call_seconds", "call")
+    }
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def histogram(self, kind: str, name: str) -> Histogram:
+        key = (kind, name)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def timed(self, kind: str, name: str) -> Callable[[Callable], Callable]:
+        """Декоратор: время выполнения функции попадает в гистограмму kind/name"""
+        def decorator(func: Callable) -> Callable:
+            histogram = self.histogram(kind, name)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    histogram.observe(time.perf_counter() - started, failed)
+            return wrapper
+        return decorator
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float]) -> None:
+        """Показатель, который вычисляется в момент чтения метрик (например, глубина очереди)"""
+        self._gauges[name] = (help_text, func)
+
+    def _read_gauges(self) -> List[Tuple[str, str, Optional[float]]]:
+        values = []
+        for name, (help_text, func) in sorted(self._gauges.items()):
+            try:
+                values.append((name, help_text, float(func())))
+            except Exception as e:
+                logger.error("❌ Ошибка чтения метрики %s: %s", name, e)
+                values.append((name, help_text, None))
+        return values
+
+    def _sorted_histograms(self) -> List[Tuple[Tuple[str, str], Histogram]]:
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        histograms = self._sorted_histograms()
+        for kind, (metric, label) in self.FAMILIES.items():
+            lines.append(f"# TYPE {metric} histogram")
+            errors = []
+            for (histogram_kind, name), histogram in histograms:
+                if histogram_kind != kind:
+                    continue
+                counts, total, count, failed = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, counts):
+                    cumulative += bucket
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {total:.6f}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {count}')
+                errors.append(f'{metric.replace("_seconds", "_errors_total")}{{{label}="{name}"}} {failed}')
+            if errors:
+                lines.append(f"# TYPE {metric.replace('_seconds', '_errors_total')} counter")
+                lines.extend(errors)
+        for name, help_text, value in self._read_gauges():
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self) -> str:
+        """Краткая сводка для админ-команды /metrics"""
+        uptime = int(time.time() - self.started)
+        response = f"📊 Метрики за {uptime // 3600} ч {uptime % 3600 // 60} мин\n"
+        titles = {"handler": "⚙️ Обработчики", "call": "💾 Вызовы"}
+        histograms = self._sorted_histograms()
+        for kind, title in titles.items():
+            rows = []
+            for (histogram_kind, name), histogram in histograms:
+                counts, total, count, failed = histogram.snapshot()
+                if histogram_kind != kind or not count:
+                    continue
+                p95 = Histogram.quantile(counts, count, 0.95)
+                rows.append(
+                    f"{name}: {count} шт, ср. {total / count * 1000:.1f} мс, "
+                    f"p95 ≤ {p95 * 1000:g} мс" + (f", ошибок {failed}" if failed else "")
+                )
+            if rows:
+                response += f"\n{title}:\n" + "\n".join(rows) + "\n"
+        gauges = [(name, value) for name, _, value in self._read_gauges() if value is not None]
+        if gauges:
+            response += "\n📥 Очереди:\n" + "\n".join(f"{name}: {value:g}" for name, value in gauges) + "\n"
+        return response
+
+class MetricsServer:
+    """Локальный HTTP-эндпоинт /metrics для Prometheus"""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        self._thread.start()
+        logger.info("✅ Метрики доступны на http://%s:%s/metrics", self.address[0], self.address[1])
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def _chat_id(update: Any) -> Optional[int]:
+    """chat_id сообщения или callback-запроса (у callback-запроса чат берётся из его сообщения)"""
+    message = getattr(update, "message", update)
+    chat = getattr(message, "chat", None)
+    return getattr(chat, "id", None)
+
+def run_handler(name: str, handler: Callable, *args, **kwargs) -> Any:
+    """Вызов обработчика с замером времени; с LOG_HANDLER_EVENTS=1 каждый вызов пишется событием в лог"""
+    histogram = metrics.histogram("handler", name)
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = handler(*args, **kwargs)
+        failed = False
+        return result
+    finally:
+        latency = time.perf_counter() - started
+        histogram.observe(latency, failed)
+        if log_config.HANDLER_EVENTS:
+            logger.info("%s %s: %.1f мс", "❌" if failed else "✅", name, latency * 1000, extra={
+                "chat_id": _chat_id(args[0]) if args else None,
+                "handler": name,
+                "latency_ms": round(latency * 1000, 3),
+                "failed": failed
+            })
+
+class TimedStep:
+    """Обработчик следующего шага с замером времени.
+
+    В отличие от замыкания объект сохраняется pickle вместе с ожидающими шагами
+    (enable_save_next_step_handlers): внутри только ссылка на исходную функцию.
+    """
+
+    def __init__(self, callback: Callable):
+        self.callback = callback
+        self.__name__ = getattr(callback, "__name__", str(callback))
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return run_handler(self.__name__, self.callback, *args, **kwargs)
+
+class InstrumentedBot:
+    """Бот, у которого каждый регистрируемый обработчик замеряется в MetricsRegistry"""
+
+    def __init__(self, bot, registry: MetricsRegistry):
+        self._bot = bot
+        self.registry = registry
+
+    def _wrap(self, handler: Callable) -> Callable:
+        name = getattr(handler, "__name__", str(handler))
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            return run_handler(name, handler, *args, **kwargs)
+        return wrapper
+
+    def message_handler(self, *args, **kwargs):
+        register = self._bot.message_handler(*args, **kwargs)
+
+        def decorator(handler: Callable) -> Callable:
+            register(self._wrap(handler))
+            return handler
+        return decorator
+
+    def callback_query_handler(self, *args, **kwargs):
+        register = self._bot.callback_query_handler(*args, **kwargs)
+
+        def decorator(handler: Callable) -> Callable:
+            register(self._wrap(handler))
+            return handler
+        return decorator
+
+    def register_next_step_handler(self, message, callback: Callable, *args, **kwargs) -> Any:
+        return self._bot.register_next_step_handler(message, TimedStep(callback), *args, **kwargs)
+
+    def register_next_step_handler_by_chat_id(self, chat_id: int, callback: Callable, *args, **kwargs) -> Any:
+        return self._bot.register_next_step_handler_by_chat_id(chat_id, TimedStep(callback), *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._bot, name)
+
+# Создаем глобальный экземпляр реестра метрик
+metrics = MetricsRegistry()
@@ -0,0 +1,243 @@
+import atexit
+import secrets
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from telebot import apihelper
+from config import bot_config
+from database import create_tables, get_db_connection
+from utils.dedup import RecentKeys
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Типы событий воронки и ключи статистики для них
+EVENT_KEYS = {
+    "click": "clicks",
+    "start": "starts",
+    "complete": "completes"
+}
+
+# Во сколько пакетов может вырасти очередь, прежде чем клики начнут записываться в потоке обработчика
+MAX_BUFFERED_BATCHES = 20
+
+# Сколько помнить, что кода нет в базе (с): повторные переходы по битой ссылке не ходят в базу
+UNKNOWN_CODE_TTL = 60.0
+
+# Запросы держим постоянными строками: SQLite переиспользует их подготовленные выражения
+INSERT_CODE_SQL = "INSERT INTO referral_codes (partner_id, code, platform, theme) VALUES (?, ?, ?, ?)"
+# Код уже разрешён через кэш, поэтому конверсия пишется без подзапроса к referral_codes
+INSERT_CONVERSION_SQL = """
+    INSERT INTO conversions (partner_id, code, platform, event_type, created_at) VALUES (?, ?, ?, ?, ?)
+"""
+SELECT_CODE_SQL = "SELECT partner_id, platform, theme FROM referral_codes WHERE code = ?"
+NEXT_PARTNER_SQL = "SELECT COALESCE(MAX(partner_id), 999) + 1 FROM referral_codes"
+
+# Статистика читается из агрегатов conversion_stats, а не из сырой истории
+PARTNER_STATS_SQL = """
+    SELECT platform, event_type, SUM(count) FROM conversion_stats
+    WHERE partner_id = ? GROUP BY platform, event_type
+"""
+TOTAL_STATS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM referral_codes),
+        (SELECT COUNT(DISTINCT partner_id) FROM referral_codes),
+        (SELECT COALESCE(SUM(count), 0) FROM conversion_stats)
+"""
+
+class ReferralSystem:
+    """Реферальные ссылки партнеров и учёт конверсий"""
+
+    def __init__(self, flush_interval: float, batch_size: int, bot_username: str = ""):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # Имя бота в ссылках t.me; без BOT_USERNAME запрашивается у Telegram при запуске
+        self.bot_username = bot_username
+        self._tables_ready = False
+        # Кэш код -> (партнер, платформа, тема): переход по ссылке не обращается к базе
+        self._codes: Dict[str, Tuple[int, str, str]] = {}
+        self._unknown = RecentKeys(10_000)
+        # Конверсии копятся в памяти и пишутся пакетами одной транзакцией
+        self._buffer: List[tuple] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.unknown_codes = 0
+        metrics.gauge("bot_referral_buffer", "Конверсии в очереди записи", lambda: len(self._buffer))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока; таблицы создаются один раз за процесс"""
+        if not self._tables_ready:
+            create_tables()
+            self._tables_ready = True
+        return get_db_connection()
+
+    def warm_up(self) -> int:
+        """Загрузка всех кодов в кэш и запуск фоновой записи конверсий; возвращает число кодов"""
+        rows = self._connection().execute("SELECT code, partner_id, platform, theme FROM referral_codes").fetchall()
+        self._codes.update((code, (partner_id, platform, theme)) for code, partner_id, platform, theme in rows)
+        self._start()
+        logger.info("✅ Реферальных кодов в кэше: %s", len(self._codes))
+        return len(rows)
+
+    def resolve_bot_username(self, token: str) -> str:
+        """Имя бота для ссылок: BOT_USERNAME или getMe (ошибка токена останавливает запуск)"""
+        if not self.bot_username:
+            self.bot_username = apihelper.get_me(token)["username"]
+            logger.info("✅ Имя бота для реферальных ссылок получено из getMe: %s", self.bot_username)
+        return self.bot_username
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="referral-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def resolve(self, code: str) -> Optional[Tuple[int, str, str]]:
+        """Партнер, платформа и тема кода или None, если такого кода нет"""
+        entry = self._codes.get(code)
+        if entry is not None or code in self._unknown:
+            return entry
+        # Код мог создать другой процесс (режим sharded) после прогрева кэша
+        row = self._connection().execute(SELECT_CODE_SQL, (code,)).fetchone()
+        if row is None:
+            self._unknown.add(code, UNKNOWN_CODE_TTL)
+            return None
+        self._codes[code] = tuple(row)
+        return self._codes[code]
+
+    def invalidate(self, code: str) -> None:
+        """Сбросить закэшированные сведения о коде (следующее обращение перечитает его из базы)"""
+        self._codes.pop(code, None)
+        self._unknown.discard(code)
+
+    def _insert_code(self, conn: sqlite3.Connection, partner_id: int, platform: str, theme: str) -> str:
+        """Вставка нового кода в текущей транзакции; код уникален по ограничению UNIQUE"""
+        while True:
+            code = secrets.token_hex(4)
+            try:
+                conn.execute("SAVEPOINT new_code")
+                conn.execute(INSERT_CODE_SQL, (partner_id, code, platform, theme))
+                conn.execute("RELEASE new_code")
+                return code
+            except sqlite3.IntegrityError:
+                # Код уже занят, пробуем другой
+                conn.execute("ROLLBACK TO new_code")
+                conn.execute("RELEASE new_code")
+
+    @metrics.timed("call", "referral.create_referral_link")
+    def create_referral_link(self, partner_id: Optional[int], platform: str, theme: str) -> Tuple[int, str]:
+        """Создание реферальной ссылки; без partner_id заводится новый партнер. Возвращает (partner_id, ссылка)"""
+        if not self.bot_username:
+            raise RuntimeError("Имя бота не известно: задайте BOT_USERNAME или вызовите resolve_bot_username")
+        conn = self._connection()
+        with conn:
+            # Новый ID выдаётся под блокировкой записи: два администратора (или процесса) не получат один ID
+            conn.execute("BEGIN IMMEDIATE")
+            if partner_id is None:
+                partner_id = conn.execute(NEXT_PARTNER_SQL).fetchone()[0]
+            code = self._insert_code(conn, partner_id, platform, theme)
+        self.invalidate(code)
+        self._codes[code] = (partner_id, platform, theme)
+
+        logger.info("✅ Создана реферальная ссылка %s для партнера %s", code, partner_id)
+        return partner_id, f"https://t.me/{self.bot_username}?start={code}"
+
+    def track_conversion(self, code: str, event_type: str) -> bool:
+        """Учёт одного события (click, start, complete) по реферальному коду; False для неизвестного кода"""
+        return self.track_conversions([(code, event_type)]) == 1
+
+    def track_conversions(self, events: List[Tuple[str, str]]) -> int:
+        """Постановка событий в очередь записи; неизвестные коды пропускаются. Возвращает число принятых"""
+        created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        rows = []
+        for code, event_type in events:
+            entry = self.resolve(code)
+            if entry is None:
+                self.unknown_codes += 1
+                continue
+            partner_id, platform, _ = entry
+            rows.append((partner_id, code, platform, event_type, created_at))
+        if rows:
+            with self._buffer_lock:
+                self._buffer.extend(rows)
+                size = len(self._buffer)
+            if size >= self.batch_size * MAX_BUFFERED_BATCHES:
+                # Запись не успевает за кликами: обработчик сам сбрасывает очередь, память не растёт
+                self.flush()
+            elif size >= self.batch_size:
+                self._wake.set()
+            self._start()
+        return len(rows)
+
+    def _run(self) -> None:
+        """Фоновый цикл записи конверсий"""
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @metrics.timed("call", "referral.flush")
+    def flush(self) -> int:
+        """Запись накопленных конверсий одной транзакцией; возвращает число записанных"""
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            conn = self._connection()
+            try:
+                with conn:
+                    conn.executemany(INSERT_CONVERSION_SQL, rows)
+            except sqlite3.Error as e:
+                # База недоступна: события возвращаются в начало очереди до следующей попытки
+                with self._buffer_lock:
+                    self._buffer[:0] = rows
+                logger.error("❌ Ошибка записи конверсий (%s шт.): %s", len(rows), e)
+                return 0
+            self.written += len(rows)
+            return len(rows)
+
+    def close(self) -> None:
+        """Остановить фоновую запись и дописать накопленные конверсии"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
+
+    @metrics.timed("call", "referral.get_partner_stats")
+    def get_partner_stats(self, partner_id: int) -> Dict[str, Any]:
+        """Статистика партнера: итоги и разбивка по платформам"""
+        self.flush()
+        stats = {"total_clicks": 0, "total_starts": 0, "total_completes": 0, "by_platform": {}}
+        for platform, event_type, count in self._connection().execute(PARTNER_STATS_SQL, (partner_id,)):
+            key = EVENT_KEYS.get(event_type)
+            if key is None:
+                continue
+            stats[f"total_{key}"] += count
+            stats["by_platform"].setdefault(platform, {})[key] = count
+        return stats
+
+    @metrics.timed("call", "referral.get_total_stats")
+    def get_total_stats(self) -> Dict[str, int]:
+        """Общая статистика по всем ссылкам"""
+        self.flush()
+        total_links, total_partners, total_conversions = self._connection().execute(TOTAL_STATS_SQL).fetchone()
+        return {
+            "total_links": total_links,
+            "total_partners": total_partners,
+            "total_conversions": total_conversions
+        }
+
+# Создаем глобальный экземпляр реферальной системы
+ref_system = ReferralSystem(
+    flush_interval=bot_config.REFERRAL_FLUSH_INTERVAL,
+    batch_size=bot_config.REFERRAL_BATCH_SIZE,
+    bot_username=bot_config.BOT_USERNAME
+)
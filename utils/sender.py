@@ -0,0 +1,302 @@
+import atexit
+import inspect
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+from config import bot_config
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Максимальная длина текста сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Методы бота, которые меняют переписку в чате: они идут через очередь чата, чтобы не обгонять сообщения.
+# answer_callback_query и чтение (get_chat и т.п.) в чат ничего не пишут и вызываются напрямую.
+CHAT_METHOD_PREFIXES = (
+    "send_", "edit_message_", "delete_message", "forward_message", "copy_message",
+    "pin_chat_message", "unpin_chat_message", "unpin_all_chat_messages", "stop_poll", "stop_message_live_location"
+)
+
+def configure_http_pool(pool_size: int) -> None:
+    """Один общий пул HTTP-соединений к Bot API для всех потоков"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    apihelper.session = session
+    # Без срока жизни сессия не пересоздаётся и соединения переиспользуются
+    apihelper.SESSION_TIME_TO_LIVE = None
+
+class TokenBucket:
+    """Ограничитель скорости: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до появления токена (0 - можно отправлять)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+class OutgoingCall:
+    """Вызов Bot API в очереди отправки и futures тех, кто ждёт его результата"""
+    __slots__ = ("chat_id", "method", "args", "kwargs", "futures")
+
+    def __init__(self, chat_id: int, method: str, args: tuple, kwargs: Dict[str, Any]):
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.futures: List[Future] = [Future()]
+
+    @property
+    def text(self) -> str:
+        return self.args[1]
+
+    def can_merge(self, other: "OutgoingCall") -> bool:
+        """Можно ли дописать other в это сообщение: оба send_message, без клавиатуры у первого и с теми же параметрами"""
+        if self.method != "send_message" or other.method != "send_message":
+            return False
+        if self.kwargs.get("reply_markup") is not None:
+            return False
+        own = {k: v for k, v in self.kwargs.items() if k != "reply_markup"}
+        new = {k: v for k, v in other.kwargs.items() if k != "reply_markup"}
+        return own == new and len(self.text) + len(other.text) + 2 <= MAX_MESSAGE_LENGTH
+
+    def merge(self, other: "OutgoingCall") -> None:
+        """Склейка текстов: оба вызывающих получат одно и то же отправленное сообщение"""
+        self.args = (self.chat_id, f"{self.text}\n\n{other.text}")
+        self.kwargs = other.kwargs
+        self.futures.extend(other.futures)
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        for future in self.futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+class MessageScheduler:
+    """Очередь исходящих вызовов с ограничением скорости, порядком внутри чата, склейкой и обработкой 429"""
+
+    def __init__(self, bot, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 workers: int = 4):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._pending: Dict[int, Deque[OutgoingCall]] = {}
+        self._ready: Deque[int] = deque()
+        self._blocked_until: Dict[int, float] = {}
+        # После 429 пауза действует на все чаты: лимит мог быть общим для бота
+        self._global_blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+
+        self.queued = 0
+        self.merged = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._send_histogram = metrics.histogram("call", "telegram.scheduled_call")
+        self._workers = [
+            threading.Thread(target=self._work, name=f"sender-{i}", daemon=True) for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        metrics.gauge("bot_send_queue_depth", "Сообщения в очереди отправки",
+                      lambda: self.stats()["queue_depth"])
+
+    def send(self, chat_id: int, text: str, **kwargs) -> Future:
+        """Поставить сообщение в очередь (не блокирует); future получит отправленный Message"""
+        return self.call(chat_id, "send_message", chat_id, text, **kwargs)
+
+    def call(self, chat_id: int, method: str, *args, **kwargs) -> Future:
+        """Поставить вызов метода бота в очередь чата chat_id (не блокирует); future получит его результат"""
+        call = OutgoingCall(chat_id, method, args, kwargs)
+        future = call.futures[0]
+        with self._cond:
+            self.queued += 1
+            pending = self._pending.get(chat_id)
+            if pending is None:
+                pending = self._pending[chat_id] = deque()
+                self._ready.append(chat_id)
+            if pending and pending[-1].can_merge(call):
+                pending[-1].merge(call)
+                self.merged += 1
+                return future
+            pending.append(call)
+            self._cond.notify()
+        return future
+
+    def _next(self) -> Optional[OutgoingCall]:
+        """Следующий вызов, который можно выполнить прямо сейчас (вызывается под блокировкой)"""
+        while True:
+            if self._stopping and not self._pending:
+                return None
+
+            now = time.monotonic()
+            wait = max(self._global_blocked_until - now, 0.0) or self.global_bucket.wait_time(now)
+            if wait == 0:
+                for _ in range(len(self._ready)):
+                    chat_id = self._ready.popleft()
+                    chat_wait = max(
+                        self._blocked_until.get(chat_id, 0) - now,
+                        self._chat_bucket(chat_id).wait_time(now)
+                    )
+                    if chat_wait <= 0:
+                        self.global_bucket.take()
+                        self._chat_buckets[chat_id].take()
+                        self._blocked_until.pop(chat_id, None)
+                        # Чат остаётся вне очереди готовых, пока вызов в полёте: порядок сохраняется
+                        return self._pending[chat_id].popleft()
+                    self._ready.append(chat_id)
+                    wait = chat_wait if wait == 0 else min(wait, chat_wait)
+            self._cond.wait(wait or None)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _done(self, call: OutgoingCall, retry_after: float = 0) -> None:
+        """Возврат чата в очередь после вызова (или повтор после 429)"""
+        with self._cond:
+            pending = self._pending[call.chat_id]
+            if retry_after:
+                pending.appendleft(call)
+                blocked_until = time.monotonic() + retry_after
+                self._blocked_until[call.chat_id] = blocked_until
+                self._global_blocked_until = max(self._global_blocked_until, blocked_until)
+            if pending:
+                self._ready.append(call.chat_id)
+            else:
+                del self._pending[call.chat_id]
+                # Корзина чата вне очереди не нужна: при следующем сообщении начнётся с полной
+                self._chat_buckets.pop(call.chat_id, None)
+            self._cond.notify_all()
+
+    def _work(self) -> None:
+        """Цикл воркера отправки"""
+        while True:
+            with self._cond:
+                call = self._next()
+            if call is None:
+                return
+
+            retry_after = 0
+            started = time.perf_counter()
+            try:
+                result = getattr(self.bot, call.method)(*call.args, **call.kwargs)
+                self._send_histogram.observe(time.perf_counter() - started)
+                self.sent += 1
+                call.resolve(result)
+            except ApiTelegramException as e:
+                self._send_histogram.observe(time.perf_counter() - started, failed=True)
+                if e.error_code == 429:
+                    retry_after = e.result_json.get("parameters", {}).get("retry_after", 1)
+                    self.retried += 1
+                    logger.warning("⚠️ Лимит Telegram для чата %s, повтор через %s с", call.chat_id, retry_after,
+                                   extra={"chat_id": call.chat_id, "retry_after": retry_after})
+                else:
+                    self.failed += 1
+                    logger.error("❌ Ошибка вызова %s в чате %s: %s", call.method, call.chat_id, e,
+                                 extra={"chat_id": call.chat_id})
+                    call.resolve(error=e)
+            except Exception as e:
+                self._send_histogram.observe(time.perf_counter() - started, failed=True)
+                self.failed += 1
+                logger.error("❌ Ошибка вызова %s в чате %s: %s", call.method, call.chat_id, e,
+                             extra={"chat_id": call.chat_id})
+                call.resolve(error=e)
+            self._done(call, retry_after)
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Дождаться отправки очереди и остановить воркеров"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики отправки и глубина очереди"""
+        with self._cond:
+            depth = sum(len(pending) for pending in self._pending.values())
+        return {
+            "queued": self.queued,
+            "merged": self.merged,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue_depth": depth
+        }
+
+class ScheduledBot:
+    """Бот, у которого все вызовы, пишущие в чат, идут через MessageScheduler и возвращают свой результат"""
+
+    def __init__(self, bot, scheduler: MessageScheduler):
+        self._bot = bot
+        self.scheduler = scheduler
+        self._signatures: Dict[str, inspect.Signature] = {}
+
+    def _call(self, chat_id: int, method: str, *args, **kwargs) -> Any:
+        # Обработчик ждёт результата, как при прямом вызове: Message нужен для next_step и правок
+        return self.scheduler.call(chat_id, method, *args, **kwargs).result()
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> Any:
+        return self._call(chat_id, "send_message", chat_id, text, **kwargs)
+
+    def reply_to(self, message, text: str, **kwargs) -> Any:
+        return self.send_message(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def _chat_method(self, name: str, method):
+        """Обёртка метода, пишущего в чат: вызов встаёт в очередь чата из аргумента chat_id"""
+        signature = self._signatures.get(name)
+        if signature is None:
+            signature = self._signatures[name] = inspect.signature(method)
+
+        def call(*args, **kwargs):
+            chat_id = signature.bind(*args, **kwargs).arguments.get("chat_id")
+            if chat_id is None:
+                # Например, правка inline-сообщения: чата нет, очередь не нужна
+                return method(*args, **kwargs)
+            return self._call(chat_id, name, *args, **kwargs)
+
+        return call
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._bot, name)
+        if name.startswith(CHAT_METHOD_PREFIXES) and callable(attr):
+            return self._chat_method(name, attr)
+        return attr
+
+def schedule_outbound(bot) -> ScheduledBot:
+    """Обёртка бота с отправкой через MessageScheduler по настройкам BotConfig"""
+    scheduler = MessageScheduler(
+        bot,
+        global_rate=bot_config.SEND_GLOBAL_RATE,
+        chat_rate=bot_config.SEND_CHAT_RATE,
+        chat_burst=bot_config.SEND_CHAT_BURST,
+        workers=bot_config.SEND_WORKERS
+    )
+    atexit.register(scheduler.close)
+    return ScheduledBot(bot, scheduler)
@@ -0,0 +1,194 @@
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Optional, Set, Tuple
+from config import bot_config
+from database import get_pool
+
+@dataclass
+class ChatState:
+    """Состояние диалога с пользователем"""
+    step: str = ""
+    question_index: int = 0
+    score: int = 0
+    question_ids: List[int] = field(default_factory=list)
+    answers: Dict[str, str] = field(default_factory=dict)
+    # Реферальный код из /start <code>, с которым пришёл пользователь
+    referral_code: str = ""
+    # Идентификатор прохождения: из него строятся ключи идемпотентности (см. utils.dedup.idempotency_key)
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    # Версия банка вопросов, на которой начат тест: question_ids - номера в ней (questions.question_bank.get)
+    bank_version: str = ""
+    updated_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        """Компактная сериализация для внешнего хранилища"""
+        return json.dumps(asdict(self), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "ChatState":
+        return cls(**json.loads(data))
+
+class StateStore:
+    """Базовый интерфейс хранилища состояний диалогов"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    def get(self, chat_id: int) -> Optional[ChatState]:
+        """Состояние чата или None, если его нет или оно устарело"""
+        raise NotImplementedError
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        """Сохранение состояния чата (обновляет время последней активности)"""
+        raise NotImplementedError
+
+    def delete(self, chat_id: int) -> None:
+        """Удаление состояния чата"""
+        raise NotImplementedError
+
+    def pop_expired(self) -> List[Tuple[int, ChatState]]:
+        """Удаление устаревших состояний; возвращает удалённые пары (chat_id, состояние)"""
+        raise NotImplementedError
+
+    def expire(self) -> int:
+        """Удаление устаревших состояний; возвращает их количество"""
+        return len(self.pop_expired())
+
+    def bank_versions(self) -> Set[str]:
+        """Версии банка вопросов, на которых идут неустаревшие диалоги"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class MemoryStateStore(StateStore):
+    """Хранилище состояний в памяти процесса с вытеснением LRU и TTL"""
+
+    def __init__(self, ttl: float, max_size: int):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._states: "OrderedDict[int, ChatState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> Optional[ChatState]:
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                return None
+            if time.time() - state.updated_at > self.ttl:
+                del self._states[chat_id]
+                return None
+            # Чтение не двигает чат в конец: порядок остаётся порядком updated_at, на нём держится pop_expired
+            return state
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        state.updated_at = time.time()
+        with self._lock:
+            self._states[chat_id] = state
+            self._states.move_to_end(chat_id)
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._states.pop(chat_id, None)
+
+    def pop_expired(self) -> List[Tuple[int, ChatState]]:
+        deadline = time.time() - self.ttl
+        expired = []
+        with self._lock:
+            # Порядок LRU совпадает с порядком активности: устаревшие в начале
+            while self._states:
+                chat_id, state = next(iter(self._states.items()))
+                if state.updated_at > deadline:
+                    break
+                del self._states[chat_id]
+                expired.append((chat_id, state))
+        return expired
+
+    def bank_versions(self) -> Set[str]:
+        deadline = time.time() - self.ttl
+        with self._lock:
+            return {state.bank_version for state in self._states.values()
+                    if state.bank_version and state.updated_at >= deadline}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+class SQLiteStateStore(StateStore):
+    """Постоянное хранилище состояний в локальной базе SQLite"""
+
+    def __init__(self, ttl: float, path: str):
+        super().__init__(ttl)
+        self.pool = get_pool(path)
+        conn = self.pool.connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chat_states (
+                chat_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_states_updated ON chat_states (updated_at)")
+        conn.commit()
+
+    def get(self, chat_id: int) -> Optional[ChatState]:
+        row = self.pool.connection().execute(
+            "SELECT data, updated_at FROM chat_states WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return ChatState.from_json(row[0])
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        state.updated_at = time.time()
+        conn = self.pool.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_states (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                (chat_id, state.to_json(), state.updated_at)
+            )
+
+    def delete(self, chat_id: int) -> None:
+        conn = self.pool.connection()
+        with conn:
+            conn.execute("DELETE FROM chat_states WHERE chat_id = ?", (chat_id,))
+
+    def pop_expired(self) -> List[Tuple[int, ChatState]]:
+        deadline = time.time() - self.ttl
+        conn = self.pool.connection()
+        with conn:
+            # Выборка и удаление под одной блокировкой записи: состояние, обновлённое в этот момент,
+            # не удалится невыбранным (DELETE ... RETURNING есть только с SQLite 3.35)
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT chat_id, data FROM chat_states WHERE updated_at < ?", (deadline,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM chat_states WHERE updated_at < ?", (deadline,))
+        return [(chat_id, ChatState.from_json(data)) for chat_id, data in rows]
+
+    def bank_versions(self) -> Set[str]:
+        # Вызывается только при перезагрузке банка, поэтому состояния разбираются здесь, а не в SQL
+        rows = self.pool.connection().execute(
+            "SELECT data FROM chat_states WHERE updated_at >= ?", (time.time() - self.ttl,)
+        )
+        return {version for version in (json.loads(data).get("bank_version") for data, in rows) if version}
+
+    def __len__(self) -> int:
+        return self.pool.connection().execute("SELECT COUNT(*) FROM chat_states").fetchone()[0]
+
+def create_state_store(mode: str) -> StateStore:
+    """Создание хранилища состояний по режиму: memory или sqlite"""
+    if mode == "memory":
+        return MemoryStateStore(ttl=bot_config.STATE_TTL, max_size=bot_config.STATE_MAX_CHATS)
+    if mode == "sqlite":
+        return SQLiteStateStore(ttl=bot_config.STATE_TTL, path=bot_config.DB_PATH)
+    raise ValueError(f"Неизвестный режим хранилища состояний: {mode}")
+
+# Создаем глобальный экземпляр хранилища состояний
+state_store = create_state_store(bot_config.STATE_STORE)
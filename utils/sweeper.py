@@ -0,0 +1,144 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from telebot import Handler
+from config import bot_config
+from database import create_tables, get_db_connection
+from utils.logger import get_logger
+from utils.metrics import metrics
+from utils.states import ChatState, StateStore, state_store
+
+logger = get_logger(__name__)
+
+INSERT_DROPOFF_SQL = """
+    INSERT INTO dropoffs (chat_id, step, question_index, referral_code, session_id, last_active_at, expired_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _callback_name(handler: Handler) -> str:
+    return getattr(handler.callback, "__name__", str(handler.callback))
+
+def pending_next_steps(bot) -> Dict[int, List[Handler]]:
+    """Ожидающие обработчики следующего шага бота по чатам"""
+    backend = getattr(bot, "next_step_backend", None)
+    if backend is not None:
+        # Копия словаря: обработчики снимаются потоками бота параллельно с обходом
+        return {chat_id: list(handlers) for chat_id, handlers in list(backend.handlers.items())}
+    return bot.pending_next_steps()
+
+def _dropoff(chat_id: int, state: Optional[ChatState], step: str, since: float, now: float) -> tuple:
+    """Строка события ухода; без состояния известны только шаг и время начала ожидания"""
+    if state is None:
+        return (chat_id, step, 0, "", "", since, now)
+    return (chat_id, state.step or step, state.question_index, state.referral_code,
+            state.session_id, state.updated_at, now)
+
+class SessionSweeper:
+    """Фоновая очистка брошенных диалогов: состояние, обработчики следующего шага и событие ухода"""
+
+    def __init__(self, store: StateStore, ttl: float, interval: float):
+        self.store = store
+        self.ttl = ttl
+        self.interval = interval
+        self.bots: List[Any] = []
+        # Ожидающие обработчики чата и время, когда они впервые встретились при обходе
+        self._pending_since: Dict[int, Tuple[Tuple[Handler, ...], float]] = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._tables_ready = False
+        self.expired = 0
+        self.released = 0
+        metrics.gauge("bot_expired_sessions", "Диалоги, закрытые по бездействию", lambda: self.expired)
+
+    def start(self, bot) -> None:
+        """Подключить бота, чьи обработчики следующего шага тоже очищаются, и запустить фоновый поток"""
+        self.bots.append(bot)
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("❌ Ошибка очистки брошенных диалогов: %s", e, exc_info=True)
+
+    def _release(self, chat_id: int, snapshot: List[Tuple[Any, Dict[int, List[Handler]]]]) -> str:
+        """Снять ожидающие обработчики чата по снимку обхода; возвращает имя последнего из них"""
+        self._pending_since.pop(chat_id, None)
+        step = ""
+        for bot, pending in snapshot:
+            # Снятый чат убирается и из снимка, чтобы не попасть в обход повторно
+            handlers = pending.pop(chat_id, None)
+            if handlers:
+                step = _callback_name(handlers[-1])
+                bot.clear_step_handler_by_chat_id(chat_id)
+                self.released += 1
+        return step
+
+    def _stale_steps(self, snapshot: List[Tuple[Any, Dict[int, List[Handler]]]],
+                     now: float) -> List[Tuple[int, str, float]]:
+        """Чаты, чьи обработчики следующего шага не менялись дольше TTL"""
+        pending: Dict[int, List[Handler]] = {}
+        for _, bot_pending in snapshot:
+            pending.update(bot_pending)
+
+        stale = []
+        tracked = {}
+        for chat_id, handlers in pending.items():
+            # Сравниваются сами регистрации: повторная регистрация той же функции после ответа - новый Handler,
+            # а ссылки на отслеживаемые объекты не дают их id достаться новым
+            registered = tuple(handlers)
+            seen = self._pending_since.get(chat_id)
+            unchanged = seen is not None and len(seen[0]) == len(registered) and all(
+                old is new for old, new in zip(seen[0], registered))
+            since = seen[1] if unchanged else now
+            if now - since > self.ttl:
+                stale.append((chat_id, _callback_name(handlers[-1]), since))
+            else:
+                tracked[chat_id] = (registered, since)
+        # Чаты, ответившие с прошлого обхода, больше не отслеживаются
+        self._pending_since = tracked
+        return stale
+
+    def sweep(self) -> int:
+        """Один обход: закрыть брошенные диалоги и записать события ухода; возвращает их число"""
+        now = time.time()
+        # Один снимок ожидающих обработчиков на весь обход, а не на каждый закрываемый чат
+        snapshot = [(bot, pending_next_steps(bot)) for bot in self.bots]
+        events = []
+        for chat_id, state in self.store.pop_expired():
+            step = self._release(chat_id, snapshot)
+            events.append(_dropoff(chat_id, state, step, state.updated_at, now))
+        # Обработчики следующего шага, которые ждут дольше TTL (например, ввод имени в анкете):
+        # состояние чата, если оно ещё есть, закрывается вместе с ними
+        for chat_id, step, since in self._stale_steps(snapshot, now):
+            self._release(chat_id, snapshot)
+            state = self.store.get(chat_id)
+            self.store.delete(chat_id)
+            events.append(_dropoff(chat_id, state, step, since, now))
+
+        if events:
+            self._write(events)
+            self.expired += len(events)
+            logger.info("✅ Закрыто брошенных диалогов: %s", len(events))
+        return len(events)
+
+    def _write(self, events: List[tuple]) -> None:
+        if not self._tables_ready:
+            create_tables()
+            self._tables_ready = True
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.executemany(INSERT_DROPOFF_SQL, events)
+        except sqlite3.Error as e:
+            logger.error("❌ Ошибка записи событий ухода (%s шт.): %s", len(events), e)
+
+# Создаем глобальный экземпляр очистки диалогов
+session_sweeper = SessionSweeper(state_store, ttl=bot_config.STATE_TTL, interval=bot_config.SESSION_SWEEP_INTERVAL)
@@ -0,0 +1,152 @@
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from telebot.types import Update
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def update_chat_id(update: Update) -> int:
+    """Идентификатор чата, к которому относится обновление (0, если чата нет)"""
+    for name in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+    callback_query = getattr(update, "callback_query", None)
+    if callback_query is not None:
+        if callback_query.message is not None:
+            return callback_query.message.chat.id
+        return callback_query.from_user.id
+    return 0
+
+class WebhookServer:
+    """HTTP-сервер для приёма обновлений Telegram через webhook"""
+
+    def __init__(self, bot, host: str, port: int, path: str = "/", secret: str = "",
+                 workers: int = 8, queue_size: int = 1000):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        # Очередь на воркер: обновления одного чата всегда попадают к одному воркеру по порядку,
+        # а при заполненной очереди отвечаем 503, и Telegram повторит доставку позже
+        self.queues: List["queue.Queue[Optional[Update]]"] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+        self._workers = [
+            threading.Thread(target=self._work, args=(q,), name=f"webhook-worker-{i}", daemon=True)
+            for i, q in enumerate(self.queues)
+        ]
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        metrics.gauge("bot_webhook_queue_depth", "Обновления в очередях воркеров webhook",
+                      lambda: sum(q.qsize() for q in self.queues))
+
+    @property
+    def address(self):
+        """Фактический адрес сервера (удобно при порте 0)"""
+        return self._server.server_address
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._respond(404)
+                    return
+                if server.secret and self.headers.get(SECRET_HEADER) != server.secret:
+                    self._respond(403)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(server.submit(self.rfile.read(length)))
+
+            def _respond(self, status: int) -> None:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                # Ленивое форматирование: на уровне INFO строка доступа не собирается
+                logger.debug("webhook: " + format, *args)
+
+        return Handler
+
+    def submit(self, body: bytes) -> int:
+        """Разбор обновления и постановка в очередь воркера; возвращает HTTP-статус"""
+        try:
+            update = Update.de_json(json.loads(body))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("❌ Некорректное обновление в webhook: %s", e)
+            return 400
+
+        worker_queue = self.queues[update_chat_id(update) % len(self.queues)]
+        try:
+            worker_queue.put_nowait(update)
+        except queue.Full:
+            self.rejected += 1
+            return 503
+        self.accepted += 1
+        return 200
+
+    def _work(self, worker_queue: "queue.Queue[Optional[Update]]") -> None:
+        """Цикл воркера: обработка обновлений своей очереди"""
+        while True:
+            update = worker_queue.get()
+            if update is None:
+                return
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                self.failed += 1
+                logger.error("❌ Ошибка обработки обновления %s: %s", update.update_id, e,
+                             exc_info=True, extra={"chat_id": update_chat_id(update)})
+
+    def start(self) -> None:
+        """Запуск воркеров и HTTP-сервера в фоновом потоке"""
+        for worker in self._workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="webhook-server", daemon=True)
+        self._thread.start()
+        logger.info("✅ Webhook-сервер слушает %s:%s%s", self.address[0], self.address[1], self.path)
+
+    def serve_forever(self) -> None:
+        """Запуск с блокировкой текущего потока до остановки"""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Остановка приёма и завершение воркеров после обработки очередей"""
+        self._server.shutdown()
+        self._server.server_close()
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self) -> dict:
+        """Счётчики приёма и глубина очередей"""
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "queue_depth": sum(q.qsize() for q in self.queues)
+        }
+
+def run_webhook(bot, url: str, host: str, port: int, path: str, secret: str, workers: int, queue_size: int) -> None:
+    """Регистрация webhook в Telegram и запуск сервера"""
+    server = WebhookServer(bot, host, port, path=path, secret=secret, workers=workers, queue_size=queue_size)
+    bot.remove_webhook()
+    bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret or None)
+    server.serve_forever()